@@ -1,7 +1,26 @@
-from app.clients.bedrock import BedrockClient
-from app.clients.s3 import S3Client
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from app.clients.bedrock import BedrockClient
+    from app.clients.s3 import S3Client
 
 __all__ = [
     "S3Client",
     "BedrockClient",
 ]
+
+# The clients pull in botocore; only import them when they are first used
+_LAZY_IMPORTS = {
+    "S3Client": "app.clients.s3",
+    "BedrockClient": "app.clients.bedrock",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_IMPORTS:
+        import importlib
+
+        value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,12 +1,17 @@
+import asyncio
 from abc import ABC, abstractmethod
-from contextlib import asynccontextmanager
-from typing import Any, AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
 
-import aioboto3
+from fastapi import FastAPI
 
 from app.core.settings import AWSSettings
+from app.core.task_pool import CoroutineType
 from app.schemas.aws import Credentials, ServiceName
 
+if TYPE_CHECKING:
+    from aiobotocore.config import AioConfig
+
 
 class AWSBase(ABC):
     def __init__(
@@ -23,9 +28,23 @@ class AWSBase(ABC):
             "region_name": self.settings.REGION_NAME,
             **self.kwargs,  # type: ignore
         }
+        if self.settings.ENDPOINT_URL and "endpoint_url" not in self.kwargs:
+            aws_credentials["endpoint_url"] = self.settings.ENDPOINT_URL
 
         return aws_credentials
 
+    @property
+    def config(self) -> "AioConfig":
+        # aioboto3/botocore are slow to import; load them on first use
+        from aiobotocore.config import AioConfig
+
+        return AioConfig(
+            max_pool_connections=self.settings.MAX_POOL_CONNECTIONS,
+            tcp_keepalive=self.settings.TCP_KEEPALIVE,
+            connect_timeout=self.settings.CONNECT_TIMEOUT,
+            read_timeout=self.settings.READ_TIMEOUT,
+        )
+
     @abstractmethod  # type: ignore
     @asynccontextmanager
     async def session(
@@ -37,8 +56,78 @@ class AWSBase(ABC):
 class AWSClient(AWSBase):
     @asynccontextmanager
     async def session(self) -> AsyncIterator[Any]:  # type: ignore
+        import aioboto3
+
         session = aioboto3.Session()
         async with session.client(  # type: ignore
-            **self.credentials
+            **self.credentials, config=self.config
         ) as client:
             yield client
+
+
+class SharedAWSClient(AWSBase):
+    """
+    A client opened once for the lifetime of the app.
+    The underlying connection pool, resolved credentials and TLS sessions
+    are reused by every request instead of being rebuilt per call.
+    It is opened on first use, so deployments that never call AWS do not
+    pay for importing and configuring the SDK.
+    """
+    def __init__(
+        self, service_name: ServiceName, settings: AWSSettings, **kwargs: Any
+    ) -> None:
+        super().__init__(service_name=service_name, settings=settings, **kwargs)
+        self._stack: Optional[AsyncExitStack] = None
+        self._client: Any = None
+        self._lock = asyncio.Lock()
+
+    async def open(self) -> Any:
+        if self._client is not None:
+            return self._client
+        async with self._lock:
+            if self._client is None:
+                import aioboto3
+
+                stack = AsyncExitStack()
+                self._client = await stack.enter_async_context(
+                    aioboto3.Session().client(  # type: ignore
+                        **self.credentials, config=self.config
+                    )
+                )
+                self._stack = stack
+        return self._client
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            raise RuntimeError(f"{self.service_name} client is not open")
+        return self._client
+
+    async def close(self) -> None:
+        if self._stack is not None:
+            stack, self._stack, self._client = self._stack, None, None
+            await stack.aclose()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[Any]:  # type: ignore
+        # The client outlives the request; nothing to close here.
+        yield await self.open()
+
+
+def init_aws_clients(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        # Opened lazily by the first dependency that needs it
+        app.state.aws_clients = {
+            "s3": SharedAWSClient(service_name="s3", settings=app.state.settings.aws),
+        }
+
+    return _init
+
+
+def close_aws_clients(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        for client in getattr(app.state, "aws_clients", {}).values():
+            await client.close()
+        app.state.aws_clients = {}
+
+    return _close
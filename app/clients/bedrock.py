@@ -1,10 +1,12 @@
 import json
 import logging
 import time
-from typing import Any, List
+from typing import Any, List, Optional
 
 from botocore.exceptions import BotoCoreError, ClientError
 
+from app.clients.llm_cache import LLMResponseCache
+from app.core.metrics import InstrumentedClient
 from app.core.settings import BedrockClientSettings
 from app.schemas.sync import IngestionJobResponse, IngestionStatus
 
@@ -22,11 +24,13 @@ class BedrockClient:
         client_agent_runtime: Any,
         client_runtime: Any,
         bedrock_settings: BedrockClientSettings,
+        response_cache: Optional[LLMResponseCache] = None,
     ) -> None:
-        self._client_agent = client_agent
-        self._client_agent_runtime = client_agent_runtime
-        self._client_runtime = client_runtime
+        self._client_agent = InstrumentedClient(client_agent, "bedrock-agent")
+        self._client_agent_runtime = InstrumentedClient(client_agent_runtime, "bedrock-agent-runtime")
+        self._client_runtime = InstrumentedClient(client_runtime, "bedrock-runtime")
         self._bedrock_settings = bedrock_settings
+        self._response_cache = response_cache
 
 
     def sync_knowledge_base(self) -> IngestionJobResponse:
@@ -43,12 +47,22 @@ class BedrockClient:
 
     def ask_llm(self, input_text: str) -> str:
 
+        model_id = self._bedrock_settings.MODEL_ID
+        params = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": 100000,
+            # "temperature": 0,
+        }
+
+        if self._response_cache is not None:
+            cached = self._response_cache.get(model_id, input_text, params)
+            if cached is not None:
+                return cached
+
         body = json.dumps(
             {
                 # "prompt": input_text,
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 100000,
-                # "temperature": 0,
+                **params,
                 "messages": [
                     {"role": "user", "content": input_text}
                 ]
@@ -56,14 +70,22 @@ class BedrockClient:
         )
 
         response = self._client_runtime.invoke_model(
-            modelId=self._bedrock_settings.MODEL_ID, 
+            modelId=model_id,
             body=body,
         )
 
         raw_result = response.get("body").read().decode('utf-8')
         result = json.loads(raw_result)
-        print(result)
-        return result["content"][0]["text"]
+        log.debug(
+            "LLM response received",
+            extra={"model_id": model_id, "usage": result.get("usage"), "stop_reason": result.get("stop_reason")},
+        )
+        text = result["content"][0]["text"]
+
+        if self._response_cache is not None:
+            self._response_cache.set(model_id, input_text, params, text)
+
+        return text
     
 
     def format_retrieval_response(self, retrieval_response: dict, tag: str):
@@ -0,0 +1,62 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI
+
+from app.core.disk_cache import DiskLRUCache
+from app.core.metrics import register_cache_stats
+from app.core.settings import BedrockClientSettings
+from app.core.task_pool import CoroutineType
+
+
+class LLMResponseCache:
+    """
+    Response cache for deterministic LLM prompts.
+    Entries are keyed by model id, a hash of the prompt and the generation parameters,
+    so any change to one of them is a miss rather than a stale answer.
+    """
+    def __init__(self, store: DiskLRUCache):
+        self._store = store
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, params: Dict[str, Any]) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return json.dumps(
+            {"model_id": model_id, "prompt": prompt_hash, "params": params},
+            sort_keys=True,
+        )
+
+    def get(self, model_id: str, prompt: str, params: Dict[str, Any]) -> Optional[str]:
+        entry = self._store.get(self.make_key(model_id, prompt, params))
+        if entry is None:
+            return None
+        value, _ = entry
+        return value.decode("utf-8")
+
+    def set(self, model_id: str, prompt: str, params: Dict[str, Any], response: str) -> None:
+        self._store.set(
+            self.make_key(model_id, prompt, params),
+            response.encode("utf-8"),
+            {"model_id": model_id},
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return self._store.stats()
+
+
+def init_llm_cache(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        settings: BedrockClientSettings = app.state.settings.bedrock
+        if not settings.RESPONSE_CACHE_ENABLED:
+            app.state.llm_cache = None
+            return
+        app.state.llm_cache = LLMResponseCache(
+            DiskLRUCache(
+                directory=settings.RESPONSE_CACHE_DIRECTORY,
+                max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+            )
+        )
+        register_cache_stats("llm", app.state.llm_cache.stats)
+
+    return _init
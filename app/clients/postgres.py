@@ -0,0 +1,172 @@
+import asyncio
+import datetime
+import decimal
+import json
+import logging
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI
+
+from app.core.exceptions import AsyncDBPoolProvisionError, DatabaseNotFoundException
+from app.core.settings import DatabasePoolSettings
+from app.core.task_pool import CoroutineType
+from app.service.executor import ExecutorService
+
+if TYPE_CHECKING:
+    import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Suffix of a config var (`example_db_host`) -> asyncpg.connect() argument
+CONNECT_ARGS = {
+    "host": "host",
+    "port": "port",
+    "user": "user",
+    "password": "password",
+    "name": "database",
+    "database": "database",
+    "dbname": "database",
+}
+
+
+def connect_args(database: Dict[str, Any]) -> Dict[str, Any]:
+    """asyncpg connection arguments from a `databases` entry of the config."""
+    args: Dict[str, Any] = {}
+    for kv in database.get("vars") or []:
+        key = next(iter(kv))
+        suffix = key.rsplit("_", 1)[-1]
+        if suffix in CONNECT_ARGS:
+            args[CONNECT_ARGS[suffix]] = kv[key]
+    if "port" in args:
+        args["port"] = int(args["port"])
+    return args
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return str(value)
+
+
+class DatabasePools:
+    """
+    One asyncpg pool per PostgreSQL database of the config, keyed by its `name`.
+    - Pools are opened on first use, so an unreachable database does not hold
+      up startup and unused ones cost no connections.
+    - At most `MAX_SIZE` connections per database per worker.
+    """
+    def __init__(self, databases: List[Dict[str, Any]], settings: DatabasePoolSettings):
+        self._databases = {
+            db["name"]: db for db in databases if str(db.get("tech", "PostgreSQL")).lower() == "postgresql"
+        }
+        self._settings = settings
+        self._pools: Dict[str, "asyncpg.Pool"] = {}
+        self._lock = asyncio.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._databases
+
+    def names(self) -> List[str]:
+        return list(self._databases)
+
+    @property
+    def query_timeout_seconds(self) -> float:
+        return self._settings.QUERY_TIMEOUT_SECONDS
+
+    async def pool(self, name: str) -> "asyncpg.Pool":
+        pool = self._pools.get(name)
+        if pool is not None:
+            return pool
+        if name not in self._databases:
+            raise DatabaseNotFoundException(name)
+        async with self._lock:
+            if name not in self._pools:
+                # Loaded on first use; most agents never run SQL jobs
+                import asyncpg
+
+                try:
+                    self._pools[name] = await asyncpg.create_pool(
+                        **connect_args(self._databases[name]),
+                        min_size=self._settings.MIN_SIZE,
+                        max_size=self._settings.MAX_SIZE,
+                        max_inactive_connection_lifetime=self._settings.MAX_INACTIVE_SECONDS,
+                        command_timeout=self._settings.QUERY_TIMEOUT_SECONDS,
+                    )
+                except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+                    raise AsyncDBPoolProvisionError(f"Could not connect to database {name!r}: {e}") from e
+                logger.info("Database pool opened", extra={"database": name})
+        return self._pools[name]
+
+    @property
+    def fetch_rows(self) -> int:
+        return self._settings.FETCH_ROWS
+
+    @asynccontextmanager
+    async def acquire(self, name: str, timeout: Optional[float] = None) -> AsyncIterator["asyncpg.Connection"]:
+        pool = await self.pool(name)
+        async with pool.acquire(timeout=timeout) as connection:
+            yield connection
+
+    async def query_to_json(self, name: str, sql: str, path: str) -> int:
+        """
+        Run `sql` on database `name` and write the rows to `path` as a JSON
+        array of objects, `FETCH_ROWS` at a time from a server-side cursor, so
+        memory stays flat whatever the result size. The file only appears once
+        the query has finished. Returns the number of rows.
+        """
+        tmp_path = f"{path}.tmp"
+        rows = 0
+        f = await asyncio.to_thread(open, tmp_path, "w", encoding="utf-8")
+        try:
+            async with self.acquire(name) as connection:
+                # Cursors live in a transaction; jobs only read
+                async with connection.transaction(readonly=True):
+                    cursor = await connection.cursor(sql)
+                    await asyncio.to_thread(f.write, "[")
+                    while True:
+                        batch = await cursor.fetch(self._settings.FETCH_ROWS)
+                        if not batch:
+                            break
+                        chunk = ",\n".join(json.dumps(dict(record), default=json_default) for record in batch)
+                        await asyncio.to_thread(f.write, ("," if rows else "") + "\n" + chunk)
+                        rows += len(batch)
+                    await asyncio.to_thread(f.write, "\n]\n")
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(os.replace, tmp_path, path)
+        except BaseException:
+            f.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return rows
+
+    async def close(self) -> None:
+        pools, self._pools = list(self._pools.values()), {}
+        await asyncio.gather(*(pool.close() for pool in pools), return_exceptions=True)
+
+
+def init_database_pools(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        executor = ExecutorService(agent_config=app.state.settings.agent_config)
+        app.state.database_pools = DatabasePools(executor.get_databases(), app.state.settings.database_pool)
+
+    return _init
+
+
+def close_database_pools(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        if getattr(app.state, "database_pools", None) is not None:
+            await app.state.database_pools.close()
+
+    return _close
@@ -1,24 +1,54 @@
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional
 import asyncio
 import json
 import logging
+import os
 from typing import TYPE_CHECKING
 
+from app.clients.s3_cache import S3ObjectCache
+from app.core.metrics import InstrumentedClient
 from app.core.settings import S3Settings
+from app.schemas.aws import S3KeyResult, S3PutItem
 
 if TYPE_CHECKING:
+    from botocore.exceptions import ClientError
     from types_aiobotocore_s3.client import S3Client as S3ClientBoto
 
 
 logger = logging.getLogger(__name__)
 
+# Hard limit of the DeleteObjects API
+DELETE_BATCH_SIZE = 1000
+
+
+def _is_not_modified(e: "ClientError") -> bool:
+    code = e.response.get("Error", {}).get("Code")
+    http_status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("304", "NotModified") or http_status == 304
+
 
 class S3Client:
     def __init__(
-        self, s3_client: "S3ClientBoto", settings: S3Settings
+        self,
+        s3_client: "S3ClientBoto",
+        settings: S3Settings,
+        cache: Optional[S3ObjectCache] = None,
     ) -> None:
-        self._s3_client = s3_client
+        self._s3_client = InstrumentedClient(s3_client, "s3")
         self._bucket = settings.S3_BUCKET
+        self._cache = cache
+        self._max_concurrency = settings.S3_MAX_CONCURRENCY
+        self._multipart_threshold = settings.S3_MULTIPART_THRESHOLD
+        self._multipart_chunk_size = settings.S3_MULTIPART_CHUNK_SIZE
+        self._presigned_url_expires = settings.S3_PRESIGNED_URL_EXPIRES_SECONDS
+        self._job_artifacts_prefix = settings.S3_JOB_ARTIFACTS_PREFIX
+
+    def _cache_key(self, key: str) -> str:
+        return f'{self._bucket}/{key}'
+
+    async def _invalidate(self, key: str):
+        if self._cache is not None:
+            await self._cache.invalidate(self._cache_key(key))
 
     def get_db_schema_key(self, account_id: str, database_id: str) -> str :
         return f'schemas/{account_id}/{database_id}.md'
@@ -32,7 +62,19 @@ class S3Client:
     def get_dashboard_script_key(self, account_id: str, dashboard_id: str) -> str :
         return f'dashboards/{account_id}/{dashboard_id}/script.py'
 
-    async def put(self, key: str, data: str, content_type: str = None):
+    def get_job_artifact_key(self, job_id: str, name: str) -> str :
+        return f'{self._job_artifacts_prefix}/{job_id}/{name}'
+
+    def get_account_schemas_prefix(self, account_id: str) -> str :
+        return f'schemas/{account_id}/'
+
+    def get_account_dashboards_prefix(self, account_id: str) -> str :
+        return f'dashboards/{account_id}/'
+
+    def get_dashboard_prefix(self, account_id: str, dashboard_id: str) -> str :
+        return f'dashboards/{account_id}/{dashboard_id}/'
+
+    async def put(self, key: str, data: str, content_type: str = None) -> S3KeyResult:
         try:
             if content_type is None:
                 await self._s3_client.put_object(
@@ -47,34 +89,263 @@ class S3Client:
                     Body=data,
                     ContentType=content_type
                 )
+            return S3KeyResult(key=key, success=True)
         except Exception as e:
-            print(f'Failed to upload {key}: {e}')
+            logger.error(f'Failed to upload {key}: {e}')
+            return S3KeyResult(key=key, success=False, error=str(e))
+        finally:
+            await self._invalidate(key)
 
 
-    async def delete(self, key: str):
+    async def delete(self, key: str) -> S3KeyResult:
         try:
             await self._s3_client.delete_object(
                 Bucket=self._bucket,
                 Key=key,
             )
+            return S3KeyResult(key=key, success=True)
+        except Exception as e:
+            logger.error(f'Failed to delete {key}: {e}')
+            return S3KeyResult(key=key, success=False, error=str(e))
+        finally:
+            await self._invalidate(key)
+
+
+    #############################
+    ## Files
+
+    @staticmethod
+    def _read_chunk(path: str, offset: int, size: int) -> bytes:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    async def _upload_multipart(self, key: str, path: str, size: int, content_type: Optional[str], concurrency: int):
+        extra = {} if content_type is None else {"ContentType": content_type}
+        upload = await self._s3_client.create_multipart_upload(
+            Bucket=self._bucket,
+            Key=key,
+            **extra
+        )
+        upload_id = upload["UploadId"]
+        chunk_size = self._multipart_chunk_size
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _upload_part(part_number: int, offset: int) -> dict:
+            # At most `concurrency` chunks are held in memory at any time
+            async with semaphore:
+                body = await asyncio.to_thread(self._read_chunk, path, offset, chunk_size)
+                response = await self._s3_client.upload_part(
+                    Bucket=self._bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body,
+                )
+                return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+        tasks = [
+            asyncio.ensure_future(_upload_part(number, offset))
+            for number, offset in enumerate(range(0, size, chunk_size), start=1)
+        ]
+        try:
+            parts = await asyncio.gather(*tasks)
+            await self._s3_client.complete_multipart_upload(
+                Bucket=self._bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": list(parts)},
+            )
+        except BaseException:
+            # A failed part leaves the others running; stop them first, or they
+            # would upload parts after the abort and keep storage billed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._s3_client.abort_multipart_upload(
+                Bucket=self._bucket,
+                Key=key,
+                UploadId=upload_id,
+            )
+            raise
+
+    async def upload_file(
+        self, key: str, path: str, content_type: Optional[str] = None, concurrency: Optional[int] = None
+    ) -> S3KeyResult:
+        """
+        Stream a file from disk to S3.
+        Files above the multipart threshold are uploaded as concurrent parts
+        and are never loaded into memory as a whole.
+        """
+        try:
+            size = os.path.getsize(path)
+            if size <= self._multipart_threshold:
+                body = await asyncio.to_thread(self._read_chunk, path, 0, size)
+                extra = {} if content_type is None else {"ContentType": content_type}
+                await self._s3_client.put_object(
+                    Bucket=self._bucket,
+                    Key=key,
+                    Body=body,
+                    **extra
+                )
+            else:
+                await self._upload_multipart(
+                    key=key,
+                    path=path,
+                    size=size,
+                    content_type=content_type,
+                    concurrency=concurrency or self._max_concurrency,
+                )
+            return S3KeyResult(key=key, success=True)
         except Exception as e:
-            print(f'Failed to delete {key}: {e}')
+            logger.error(f'Failed to upload {path} to {key}: {e}')
+            return S3KeyResult(key=key, success=False, error=str(e))
+        finally:
+            await self._invalidate(key)
+
+    async def get_size(self, key: str) -> Optional[int]:
+        """Size of the object in bytes, or None when it does not exist."""
+        from botocore.exceptions import ClientError
+
+        try:
+            response = await self._s3_client.head_object(Bucket=self._bucket, Key=key)
+            return response["ContentLength"]
+        except ClientError as e:
+            if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") != 404:
+                logger.error(f'Failed to stat {key}: {e}')
+            return None
+
+    async def iter_chunks(self, key: str, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+        """
+        Stream an object in chunks of at most `chunk_size` bytes without loading
+        it whole. Not cached. The body is closed when the iteration ends.
+        """
+        response = await self._s3_client.get_object(Bucket=self._bucket, Key=key)
+        async with response['Body'] as stream:
+            async for chunk in stream.iter_chunks(chunk_size):
+                yield chunk
+
+    async def get_presigned_url(self, key: str, expires_in: Optional[int] = None, content_type: Optional[str] = None) -> str:
+        params = {"Bucket": self._bucket, "Key": key}
+        if content_type is not None:
+            params["ResponseContentType"] = content_type
+        return await self._s3_client.generate_presigned_url(
+            "get_object",
+            Params=params,
+            ExpiresIn=expires_in or self._presigned_url_expires,
+        )
+
+
+    #############################
+    ## Bulk operations
+
+    async def put_many(self, items: List[S3PutItem], concurrency: Optional[int] = None) -> List[S3KeyResult]:
+        """
+        Upload all items concurrently, at most `concurrency` requests in flight.
+        Results are returned in the order of `items`.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self._max_concurrency)
+
+        async def _put(item: S3PutItem) -> S3KeyResult:
+            async with semaphore:
+                return await self.put(
+                    key=item["key"],
+                    data=item["data"],
+                    content_type=item.get("content_type"),
+                )
+
+        return list(await asyncio.gather(*[_put(item) for item in items]))
+
+    async def _delete_batch(self, keys: List[str]) -> List[S3KeyResult]:
+        try:
+            response = await self._s3_client.delete_objects(
+                Bucket=self._bucket,
+                Delete={
+                    "Objects": [{"Key": key} for key in keys],
+                    "Quiet": False,
+                },
+            )
+        except Exception as e:
+            logger.error(f'Failed to delete batch of {len(keys)} keys: {e}')
+            return [S3KeyResult(key=key, success=False, error=str(e)) for key in keys]
+        finally:
+            for key in keys:
+                await self._invalidate(key)
+
+        errors = {
+            err["Key"]: f'{err.get("Code")}: {err.get("Message")}'
+            for err in response.get("Errors", [])
+        }
+        for key, error in errors.items():
+            logger.error(f'Failed to delete {key}: {error}')
+        return [
+            S3KeyResult(key=key, success=key not in errors, error=errors.get(key))
+            for key in keys
+        ]
+
+    async def delete_many(self, keys: List[str], concurrency: Optional[int] = None) -> List[S3KeyResult]:
+        """
+        Delete keys with DeleteObjects, up to 1000 keys per request.
+        Batches run concurrently; results are returned in the order of `keys`.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self._max_concurrency)
+
+        async def _delete(batch: List[str]) -> List[S3KeyResult]:
+            async with semaphore:
+                return await self._delete_batch(batch)
+
+        batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+        results = await asyncio.gather(*[_delete(batch) for batch in batches])
+        return [result for batch_results in results for result in batch_results]
+
+    async def list_prefix(self, prefix: str) -> List[str]:
+        keys: List[str] = []
+        paginator = self._s3_client.get_paginator("list_objects_v2")
+        async for page in paginator.paginate(Bucket=self._bucket, Prefix=prefix):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        return keys
+
+    async def delete_prefix(self, prefix: str) -> List[S3KeyResult]:
+        if not prefix:
+            raise ValueError("Refusing to delete the whole bucket: prefix is empty")
+        keys = await self.list_prefix(prefix)
+        return await self.delete_many(keys)
 
 
     async def get_text(self, key: str) -> str:
+        # Already loaded by the boto client; kept local so importing this module stays cheap
+        from botocore.exceptions import ClientError
+
+        cached = None
+        if self._cache is not None:
+            cached = await self._cache.get(self._cache_key(key))
+            if cached is not None and cached.is_fresh(self._cache.freshness_seconds):
+                return cached.data.decode("utf-8")
+
         try:
+            conditions = {}
+            if cached is not None and cached.etag:
+                conditions["IfNoneMatch"] = cached.etag
             response = await self._s3_client.get_object(
                 Bucket=self._bucket,
-                Key=key
+                Key=key,
+                **conditions
             )
             async with response['Body'] as stream:
                 data = await stream.read()
+            if self._cache is not None:
+                await self._cache.set(self._cache_key(key), data, response.get('ETag'))
             return data.decode("utf-8")
+        except ClientError as e:
+            if cached is not None and _is_not_modified(e):
+                self._cache.mark_validated(self._cache_key(key), cached)
+                return cached.data.decode("utf-8")
+            logger.error(f'Failed to retrieve {key}: {e}')
         except Exception as e:
             logger.error(f'Failed to retrieve {key}: {e}')
 
-    async def put_db_schema_metadata(self, account_id: str, database_id: str): 
-        
+    def get_db_schema_metadata(self, account_id: str) -> str:
+
         attributes = {
             "account_id" : account_id
         }
@@ -83,29 +354,49 @@ class S3Client:
             "metadataAttributes" : attributes
         }
 
+        return json.dumps(metadata)
+
+    def get_db_schema_items(self, account_id: str, database_id: str, data: str, content_type: str) -> List[S3PutItem]:
         key = self.get_db_schema_key(account_id=account_id, database_id=database_id)
-        await self.put(key=f'{key}.metadata.json', data=json.dumps(metadata), content_type='application/json')
+        return [
+            {"key": key, "data": data, "content_type": content_type},
+            {"key": f'{key}.metadata.json', "data": self.get_db_schema_metadata(account_id), "content_type": 'application/json'},
+        ]
 
-    async def put_db_schema(self, account_id: str, database_id: str, data: str, content_type: str): 
+    async def put_db_schema_metadata(self, account_id: str, database_id: str) -> S3KeyResult:
         key = self.get_db_schema_key(account_id=account_id, database_id=database_id)
-        await self.put(key=key, data=data, content_type=content_type)
-        await self.put_db_schema_metadata(account_id=account_id, database_id=database_id)
+        return await self.put(key=f'{key}.metadata.json', data=self.get_db_schema_metadata(account_id), content_type='application/json')
+
+    async def put_db_schema(self, account_id: str, database_id: str, data: str, content_type: str) -> List[S3KeyResult]:
+        items = self.get_db_schema_items(account_id=account_id, database_id=database_id, data=data, content_type=content_type)
+        return await self.put_many(items)
+
+    async def put_db_schemas(self, account_id: str, schemas: Dict[str, str], content_type: str) -> List[S3KeyResult]:
+        """Upload the schemas of many databases (database_id -> text) at once."""
+        items = [
+            item
+            for database_id, data in schemas.items()
+            for item in self.get_db_schema_items(account_id=account_id, database_id=database_id, data=data, content_type=content_type)
+        ]
+        return await self.put_many(items)
 
     async def get_db_schema(self, account_id: str, database_id: str): 
         key = self.get_db_schema_key(account_id=account_id, database_id=database_id)
         return await self.get_text(key=key)
 
-    async def delete_db_schema(self, account_id: str, database_id: str): 
+    async def delete_db_schema(self, account_id: str, database_id: str) -> List[S3KeyResult]:
         key = self.get_db_schema_key(account_id=account_id, database_id=database_id)
-        await self.delete(key=key)
-        await self.delete(key=f'{key}.metadata.json')
+        return await self.delete_many([key, f'{key}.metadata.json'])
+
+    async def delete_db_schemas(self, account_id: str) -> List[S3KeyResult]:
+        return await self.delete_prefix(self.get_account_schemas_prefix(account_id))
 
     #############################
     ## Dashboard HTML
 
     async def put_dashboard_html(self, account_id: str, dashboard_id: str, data: str): 
         key = self.get_dashboard_html_key(account_id=account_id, dashboard_id=dashboard_id)
-        await self.put(key=key, data=data, content_type="text/html")
+        return await self.put(key=key, data=data, content_type="text/html")
 
     async def get_dashboard_html(self, account_id: str, dashboard_id: str): 
         key = self.get_dashboard_html_key(account_id=account_id, dashboard_id=dashboard_id)
@@ -113,14 +404,14 @@ class S3Client:
 
     async def delete_dashboard_html(self, account_id: str, dashboard_id: str): 
         key = self.get_dashboard_html_key(account_id=account_id, dashboard_id=dashboard_id)
-        await self.delete(key=key)
+        return await self.delete(key=key)
 
     #############################
     ## Dashboard data.json
 
     async def put_dashboard_data(self, account_id: str, dashboard_id: str, data: str): 
         key = self.get_dashboard_data_key(account_id=account_id, dashboard_id=dashboard_id)
-        await self.put(key=key, data=data, content_type="application/json")
+        return await self.put(key=key, data=data, content_type="application/json")
 
     async def get_dashboard_data(self, account_id: str, dashboard_id: str): 
         key = self.get_dashboard_data_key(account_id=account_id, dashboard_id=dashboard_id)
@@ -128,14 +419,14 @@ class S3Client:
 
     async def delete_dashboard_data(self, account_id: str, dashboard_id: str): 
         key = self.get_dashboard_data_key(account_id=account_id, dashboard_id=dashboard_id)
-        await self.delete(key=key)
+        return await self.delete(key=key)
 
     #############################
     ## Dashboard script.py
 
     async def put_dashboard_script(self, account_id: str, dashboard_id: str, data: str): 
         key = self.get_dashboard_script_key(account_id=account_id, dashboard_id=dashboard_id)
-        await self.put(key=key, data=data, content_type="text/plain")
+        return await self.put(key=key, data=data, content_type="text/plain")
 
     async def get_dashboard_script(self, account_id: str, dashboard_id: str): 
         key = self.get_dashboard_script_key(account_id=account_id, dashboard_id=dashboard_id)
@@ -143,4 +434,23 @@ class S3Client:
 
     async def delete_dashboard_script(self, account_id: str, dashboard_id: str): 
         key = self.get_dashboard_script_key(account_id=account_id, dashboard_id=dashboard_id)
-        await self.delete(key=key)
+        return await self.delete(key=key)
+
+    #############################
+    ## Dashboard lifecycle
+
+    async def delete_dashboard(self, account_id: str, dashboard_id: str) -> List[S3KeyResult]:
+        return await self.delete_prefix(self.get_dashboard_prefix(account_id=account_id, dashboard_id=dashboard_id))
+
+    async def list_dashboard_keys(self, account_id: str) -> List[str]:
+        return await self.list_prefix(self.get_account_dashboards_prefix(account_id))
+
+    #############################
+    ## Account lifecycle
+
+    async def delete_account(self, account_id: str) -> List[S3KeyResult]:
+        schemas, dashboards = await asyncio.gather(
+            self.delete_db_schemas(account_id),
+            self.delete_prefix(self.get_account_dashboards_prefix(account_id)),
+        )
+        return schemas + dashboards
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from fastapi import FastAPI
+
+from app.core.disk_cache import DiskLRUCache
+from app.core.metrics import register_cache_stats
+from app.core.settings import S3Settings
+from app.core.task_pool import CoroutineType
+
+
+@dataclass(frozen=True)
+class CachedObject:
+    data: bytes
+    etag: Optional[str]
+    validated_at: float
+
+    def is_fresh(self, freshness_seconds: float) -> bool:
+        return time.monotonic() - self.validated_at < freshness_seconds
+
+
+class S3ObjectCache:
+    """
+    Two-tier read-through cache for S3 objects: a small in-memory LRU in front of a disk LRU.
+    - Entries carry the object ETag so stale copies are revalidated with If-None-Match.
+    - Writers must call invalidate() for every key they put or delete.
+    """
+    def __init__(self, store: DiskLRUCache, memory_max_bytes: int, freshness_seconds: float):
+        self._store = store
+        self._memory: "OrderedDict[str, CachedObject]" = OrderedDict()
+        self._memory_bytes = 0
+        self._memory_max_bytes = memory_max_bytes
+        self.freshness_seconds = freshness_seconds
+
+    def _remember(self, key: str, obj: CachedObject) -> None:
+        self._forget(key)
+        if len(obj.data) > self._memory_max_bytes:
+            return
+        self._memory[key] = obj
+        self._memory_bytes += len(obj.data)
+        while self._memory_bytes > self._memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.data)
+
+    def _forget(self, key: str) -> None:
+        obj = self._memory.pop(key, None)
+        if obj is not None:
+            self._memory_bytes -= len(obj.data)
+
+    async def get(self, key: str) -> Optional[CachedObject]:
+        obj = self._memory.get(key)
+        if obj is not None:
+            self._memory.move_to_end(key)
+            return obj
+
+        entry = await asyncio.to_thread(self._store.get, key)
+        if entry is None:
+            return None
+        data, meta = entry
+        # Disk entries were validated by a previous process; force a revalidation
+        obj = CachedObject(data=data, etag=meta.get("etag"), validated_at=0.0)
+        self._remember(key, obj)
+        return obj
+
+    async def set(self, key: str, data: bytes, etag: Optional[str]) -> None:
+        self._remember(key, CachedObject(data=data, etag=etag, validated_at=time.monotonic()))
+        await asyncio.to_thread(self._store.set, key, data, {"etag": etag})
+
+    def mark_validated(self, key: str, obj: CachedObject) -> None:
+        self._remember(key, replace(obj, validated_at=time.monotonic()))
+
+    async def invalidate(self, key: str) -> None:
+        self._forget(key)
+        await asyncio.to_thread(self._store.delete, key)
+
+    def stats(self) -> dict:
+        return {
+            **self._store.stats(),
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+
+def init_s3_cache(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        settings: S3Settings = app.state.settings.s3
+        if not settings.S3_CACHE_ENABLED:
+            app.state.s3_cache = None
+            return
+        store = await asyncio.to_thread(
+            DiskLRUCache,
+            directory=settings.S3_CACHE_DIRECTORY,
+            max_bytes=settings.S3_CACHE_MAX_BYTES,
+        )
+        app.state.s3_cache = S3ObjectCache(
+            store=store,
+            memory_max_bytes=settings.S3_CACHE_MEMORY_MAX_BYTES,
+            freshness_seconds=settings.S3_CACHE_FRESHNESS_SECONDS,
+        )
+        register_cache_stats("s3", app.state.s3_cache.stats)
+
+    return _init
@@ -1,18 +1,39 @@
-import json
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from schemas.agent import StatusSchema
+from app.core.job_store import (
+    DATA_FILE,
+    ERROR_FILE,
+    PROFILE_FILES,
+    SPANS_FILE,
+    STD_OUTPUT_FILE,
+    Artifact,
+    JobStore,
+    local_artifact_paths,
+)
+from app.core.tracing import traced
 
 
 class AgentJob:
+    """
+    A job's status and artifacts, kept in a JobStore.
+    The script runs in `work_dir`, a local directory whatever the store;
+    `commit()` hands what it left there to the store.
+    """
 
-    def __init__(self, base_dir: str, id: str):
-        self._base_dir = base_dir
+    PROFILE_FILES = PROFILE_FILES
+
+    def __init__(self, store: JobStore, id: str):
+        self._store = store
         self._id = id
 
     @property
-    def job_dir(self) -> Path:
-        return Path(self._base_dir) / self._id
+    def work_dir(self) -> Path:
+        return self._store.work_dir(self._id)
+
+    @property
+    def artifacts_in_s3(self) -> bool:
+        return self._store.artifacts_in_s3
 
     def get_id(self) -> str:
         return self._id
@@ -21,92 +42,88 @@ class AgentJob:
     # Status
     # -------------------------
 
-    def get_status(self) -> Optional[StatusSchema]:
-        path = self.job_dir / "status.json"
-        if not path.exists():
-            return None
+    async def get_status(self) -> Optional[StatusSchema]:
+        return await self._store.get_status(self._id)
 
-        with path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+    @traced("agent_job.set_status")
+    async def set_status(self, status: StatusSchema) -> None:
+        await self._store.set_status(self._id, status)
 
-        # Pydantic v2
-        return StatusSchema.model_validate(data)
-
-    def set_status(self, status: StatusSchema) -> None:
-        path = self.job_dir / "status.json"
-        path.parent.mkdir(parents=True, exist_ok=True)
-
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(status.model_dump(), f, indent=2)
+    async def release(self) -> None:
+        """Stop caching this job's status here; another process runs it."""
+        await self._store.forget(self._id)
 
     # -------------------------
     # std_io
     # -------------------------
 
-    def get_std_output(self) -> Optional[str]:
-        path = self.job_dir / "std_output.txt"
-        if not path.exists():
-            return None
+    async def get_std_output(self) -> Optional[str]:
+        return await self._store.read_text(self._id, STD_OUTPUT_FILE)
+
+    @traced("agent_job.set_std_output")
+    async def set_std_output(self, content: str) -> None:
+        await self._store.put_text(self._id, STD_OUTPUT_FILE, content)
 
-        return path.read_text(encoding="utf-8")
-    
-    def get_std_output_path(self) -> Optional[Path]:
-        path = self.job_dir / "std_output.txt"
-        if not path.exists():
-            return None
+    # -------------------------
+    # error
+    # -------------------------
 
-        return path
+    async def get_error(self) -> Optional[str]:
+        return await self._store.read_text(self._id, ERROR_FILE)
 
-    def set_std_output(self, content: str) -> None:
-        path = self.job_dir / "std_output.txt"
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(content, encoding="utf-8")
+    @traced("agent_job.set_error")
+    async def set_error(self, content: str) -> None:
+        await self._store.put_text(self._id, ERROR_FILE, content)
 
     # -------------------------
-    # error
+    # data
     # -------------------------
 
-    def get_error(self) -> Optional[str]:
-        path = self.job_dir / "error.txt"
-        if not path.exists():
-            return None
+    async def get_data(self) -> Optional[str]:
+        return await self._store.read_text(self._id, DATA_FILE)
+
+    def get_data_path_str(self) -> str:
+        return str(self.work_dir / DATA_FILE)
 
-        return path.read_text(encoding="utf-8")
-    
-    def get_error_path(self) -> Optional[Path]:
-        path = self.job_dir / "error.txt"
-        if not path.exists():
-            return None
+    @traced("agent_job.set_data")
+    async def set_data(self, content: str) -> None:
+        await self._store.put_text(self._id, DATA_FILE, content)
 
-        return path
+    # -------------------------
+    # trace spans written by the script
+    # -------------------------
 
-    def set_error(self, content: str) -> None:
-        path = self.job_dir / "error.txt"
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(content, encoding="utf-8")
+    def get_spans_path_str(self) -> str:
+        return str(self.work_dir / SPANS_FILE)
 
     # -------------------------
-    # data
+    # profile
     # -------------------------
 
-    def get_data(self) -> Optional[str]:
-        path = self.job_dir / "data.json"
-        if not path.exists():
-            return None
+    def get_profile_path_strs(self) -> Tuple[str, str]:
+        return (
+            str(self.work_dir / self.PROFILE_FILES["pstats"]),
+            str(self.work_dir / self.PROFILE_FILES["collapsed"]),
+        )
 
-        return path.read_text(encoding="utf-8")
-    
-    def get_data_path_str(self) -> str:
-        path = self.job_dir / "data.json"
-        return str(path)
-
-    def get_data_path(self) -> Optional[Path]:
-        path = self.job_dir / "data.json"
-        if not path.exists():
-            return None
-        return path
-
-    def set_data(self, content: str) -> None:
-        path = self.job_dir / "data.json"
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(content, encoding="utf-8")
+    # -------------------------
+    # artifacts
+    # -------------------------
+
+    def prepare_work_dir(self) -> None:
+        """Create the work directory before the script writes to it. Blocking."""
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_local_artifact_paths(self) -> Dict[str, Path]:
+        """Artifacts in the work directory, before `commit()`. Blocking."""
+        return local_artifact_paths(self.work_dir)
+
+    @traced("agent_job.commit")
+    async def commit(self) -> None:
+        await self._store.commit(self._id)
+
+    async def get_artifact_size(self, name: str) -> Optional[int]:
+        return await self._store.artifact_size(self._id, name)
+
+    async def open_artifact(self, name: str) -> Optional[Artifact]:
+        return await self._store.open_artifact(self._id, name)
@@ -1,23 +1,27 @@
+import functools
 from typing import (
     TYPE_CHECKING,
     Any,
     AsyncGenerator,
     Callable,
+    Optional,
     Type,
     TypeVar,
 )
 
-import boto3
 from fastapi import Depends, HTTPException, Security, FastAPI, status
 from fastapi.requests import Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from starlette.requests import HTTPConnection
 import yaml
 
-from app.clients import BedrockClient, S3Client
+from app.clients import S3Client
 from app.clients.aws import AWSClient
+from app.clients.llm_cache import LLMResponseCache
+from app.clients.s3_cache import S3ObjectCache
 
+from app.core.job_store import JobStore
+from app.core.metrics import AUTH_FAILURES
 from app.core.exceptions import (
     BadCredentialsException,
     RequiresAuthenticationException,
@@ -27,21 +31,23 @@ from app.core.settings import (
     AWSSettings,
     BedrockClientSettings,
     S3Settings,
+    SchedulerSettings,
     AgentConfig
 )
 from app.schemas.aws import ServiceName
 from app.service.executor import ExecutorService
 
-import jwt
-from jwt.exceptions import InvalidTokenError
-
-from passlib.context import CryptContext
-
-from core.task_pool import AsyncTaskPool
+from app.core.task_pool import DEFAULT_TENANT, AsyncTaskPool
 
 if TYPE_CHECKING:
+    from passlib.context import CryptContext
     from types_aiobotocore_s3 import S3Client as S3ClientBoto
 
+    from app.clients import BedrockClient
+    from app.clients.postgres import DatabasePools
+    from app.service.job_scheduler import JobScheduler
+    from app.service.retention import RetentionEngine
+
 T = TypeVar("T")
 
 
@@ -67,8 +73,25 @@ def get_executor(
 def get_task_pool(request: HTTPConnection) -> AsyncTaskPool:
     return request.app.state.task_pool
 
+def get_job_scheduler(request: HTTPConnection) -> "JobScheduler":
+    return request.app.state.job_scheduler
+
+def get_job_store(request: HTTPConnection) -> JobStore:
+    return request.app.state.job_store
+
+def get_retention(request: HTTPConnection) -> Optional["RetentionEngine"]:
+    return getattr(request.app.state, "retention", None)
+
+def get_database_pools(request: HTTPConnection) -> Optional["DatabasePools"]:
+    return getattr(request.app.state, "database_pools", None)
+
 def get_aws_client(service_name: ServiceName, **kwargs: Any) -> Callable:
     async def _get_client(request: Request) -> AsyncGenerator:
+        shared = getattr(request.app.state, "aws_clients", {}).get(service_name)
+        if shared is not None and not kwargs:
+            yield await shared.open()
+            return
+
         async with AWSClient(
             service_name=service_name,
             settings=request.app.state.settings.aws,
@@ -78,18 +101,50 @@ def get_aws_client(service_name: ServiceName, **kwargs: Any) -> Callable:
 
     return _get_client
 
+def get_s3_cache(request: HTTPConnection) -> Optional[S3ObjectCache]:
+    return getattr(request.app.state, "s3_cache", None)
+
+
 def get_s3_client(
     settings: S3Settings = Depends(get_settings(S3Settings)),
     s3_client: "S3ClientBoto" = Depends(get_aws_client(service_name="s3")),
+    s3_cache: Optional[S3ObjectCache] = Depends(get_s3_cache),
 ) -> S3Client:
-    return S3Client(s3_client=s3_client, settings=settings)
+    return S3Client(s3_client=s3_client, settings=settings, cache=s3_cache)
+
+
+def get_llm_cache(request: HTTPConnection) -> Optional[LLMResponseCache]:
+    return getattr(request.app.state, "llm_cache", None)
+
+
+async def get_artifact_s3_client(
+    request: HTTPConnection,
+    settings: S3Settings = Depends(get_settings(S3Settings)),
+) -> Optional[S3Client]:
+    """
+    S3 client for job artifacts, or None when offloading is disabled.
+    Jobs outlive the request, so only the app-wide shared client is used.
+    """
+    shared = getattr(request.app.state, "aws_clients", {}).get("s3")
+    if not settings.S3_JOB_ARTIFACTS_OFFLOAD or shared is None:
+        return None
+    return S3Client(
+        s3_client=await shared.open(),
+        settings=settings,
+        cache=getattr(request.app.state, "s3_cache", None),
+    )
 
 
 def get_bedrock_client(
     settings: BedrockClientSettings = Depends(
         get_settings(BedrockClientSettings)
     ),
-) -> BedrockClient:
+    llm_cache: Optional[LLMResponseCache] = Depends(get_llm_cache),
+) -> "BedrockClient":
+    import boto3
+
+    from app.clients import BedrockClient
+
     boto_client_agent = boto3.client(
         "bedrock-agent", region_name=settings.REGION_NAME
     )
@@ -104,13 +159,16 @@ def get_bedrock_client(
         client_agent_runtime=boto_client_agent_runtime,
         client_runtime=boto_client_runtime,
         bedrock_settings=settings,
+        response_cache=llm_cache,
     )
 
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@functools.lru_cache(maxsize=None)
+def get_password_context() -> "CryptContext":
+    # passlib/bcrypt are only needed when a password is checked
+    from passlib.context import CryptContext
 
-def get_password_context():
-    return password_context
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 bearer_auth = HTTPBearer()
@@ -142,10 +200,27 @@ async def get_auth_access(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    import jwt
+    from jwt.exceptions import InvalidTokenError
+
     try:
-        jwt.decode(token.credentials, secret, algorithms=[settings.ALGORITHM])
+        claims = jwt.decode(token.credentials, secret, algorithms=[settings.ALGORITHM])
     except InvalidTokenError:
+        AUTH_FAILURES.inc(endpoint="access")
         raise credentials_exception
     return {
-        "access": config_yaml["secrets"]["access"]
+        "access": config_yaml["secrets"]["access"],
+        "claims": claims,
     }
+
+
+def get_tenant(
+        request: Request,
+        auth: dict = Depends(get_auth_access),
+        settings: SchedulerSettings = Depends(get_settings(SchedulerSettings)),
+) -> str:
+    """Whom a job is queued for: a token claim, else a request header."""
+    tenant = auth["claims"].get(settings.TENANT_CLAIM)
+    if tenant is None and settings.TENANT_HEADER:
+        tenant = request.headers.get(settings.TENANT_HEADER)
+    return str(tenant) if tenant else DEFAULT_TENANT
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+class DiskLRUCache:
+    """
+    A size-bounded key/value store on local disk with LRU eviction.
+    - Every entry is a single file: one JSON metadata line followed by the raw value bytes.
+    - Writes go to a temp file and are renamed into place, so readers never see partial entries.
+    - Recency survives restarts: hits touch the file mtime and the index is rebuilt from mtimes.
+    - All methods are blocking and thread-safe; call them via a thread from async code.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be >= 1")
+        self._dir = Path(directory)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def _digest(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _path(self, digest: str) -> Path:
+        return self._dir / digest[:2] / digest
+
+    def _load_index(self) -> None:
+        found = []
+        for path in self._dir.glob("*/*"):
+            if path.name.startswith(".") or not path.is_file():
+                continue
+            st = path.stat()
+            found.append((st.st_mtime, path.name, st.st_size))
+
+        for _, digest, size in sorted(found):
+            self._entries[digest] = size
+            self._total_bytes += size
+
+        with self._lock:
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self._max_bytes and self._entries:
+            digest, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                self._path(digest).unlink()
+            except FileNotFoundError:
+                pass
+
+    # -------------------------
+    # Public API
+    # -------------------------
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """Return (value, metadata) for the key, or None on a miss."""
+        digest = self._digest(key)
+        with self._lock:
+            if digest not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(digest)
+            try:
+                with path.open("rb") as f:
+                    meta = json.loads(f.readline())
+                    value = f.read()
+                os.utime(path)
+            except (OSError, ValueError):
+                self._total_bytes -= self._entries.pop(digest)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return value, meta
+
+    def set(self, key: str, value: bytes, meta: Optional[Dict[str, Any]] = None) -> None:
+        digest = self._digest(key)
+        header = json.dumps(meta or {}).encode("utf-8") + b"\n"
+        size = len(header) + len(value)
+        if size > self._max_bytes:
+            # Never let a single oversized value flush the whole cache
+            self.delete(key)
+            return
+
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(value)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(digest, 0)
+            self._entries[digest] = size
+            self._total_bytes += size
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        digest = self._digest(key)
+        with self._lock:
+            size = self._entries.pop(digest, None)
+            if size is None:
+                return
+            self._total_bytes -= size
+            try:
+                self._path(digest).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self._max_bytes,
+            }
@@ -72,6 +72,32 @@ class UnableCredentialsException(HTTPException):
         )
 
 
+class JobQueueFullException(HTTPException):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Job queue is full",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class UnknownDatabaseException(HTTPException):
+    def __init__(self, name: str) -> None:
+        super().__init__(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"No PostgreSQL database named {name!r} in the config",
+        )
+
+
+class StorageFullException(HTTPException):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_507_INSUFFICIENT_STORAGE,
+            detail="Job output volume is full",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
 class HTTPStatusError(Exception):
     pass
 
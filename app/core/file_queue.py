@@ -0,0 +1,269 @@
+import fcntl
+import json
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class SlotLease:
+    """One of the queue's global slots, held through an flock until released."""
+    def __init__(self, index: int, fd: int):
+        self.index = index
+        self._fd: Optional[int] = fd
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class ClaimedEntry(NamedTuple):
+    name: str
+    job_id: str
+    payload: Dict[str, Any]
+    rank_ns: int
+    fd: Optional[int] = None
+    # Leased claims: tells this claim apart from later claims of the same entry
+    token: Optional[str] = None
+
+
+class FileJobQueue:
+    """
+    A job queue shared by every process on the host, kept in a directory:
+    - pending/<rank_ns>-<job_id>.json: waiting entries, lowest rank first. The
+      rank defaults to the enqueue time (FIFO); callers may pass their own
+    - claimed/: entries being run; the runner holds an flock on the entry file
+    - slots/<n>.lock: one file per global slot; a runner holds an flock on one per job
+    - slots/count: the number of slots, when changed at runtime; every process
+      of the host reads it, so they agree on it
+
+    flock()s are dropped by the kernel when their process dies, so a crashed
+    worker frees its slots, and `recover()` puts its claimed entries back in pending.
+    All methods block on file I/O; call them off the event loop.
+    """
+    # Claims held by flock need no heartbeat
+    lease_seconds: Optional[float] = None
+
+    def __init__(self, directory: str, slots: int, slots_directory: Optional[str] = None):
+        if slots < 1:
+            raise ValueError("slots must be >= 1")
+        self.directory = Path(directory)
+        self._configured_slots = slots
+        self._pending = self.directory / "pending"
+        self._claimed = self.directory / "claimed"
+        self._slots = Path(slots_directory) if slots_directory else self.directory / "slots"
+        for path in (self._pending, self._claimed, self._slots):
+            path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def slots_directory(self) -> Path:
+        return self._slots
+
+    @property
+    def slots(self) -> int:
+        # A few bytes on a local filesystem; cheap enough to read on every use
+        try:
+            return max(1, int((self._slots / "count").read_text(encoding="utf-8")))
+        except (FileNotFoundError, ValueError):
+            return self._configured_slots
+
+    @slots.setter
+    def slots(self, slots: int) -> None:
+        if slots < 1:
+            raise ValueError("slots must be >= 1")
+        fd, tmp_path = tempfile.mkstemp(dir=self._slots, prefix=".count-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(str(slots))
+            os.replace(tmp_path, self._slots / "count")
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _parse_name(name: str) -> Optional[tuple]:
+        stem, _, suffix = name.rpartition(".")
+        rank_ns, sep, job_id = stem.partition("-")
+        if suffix != "json" or not sep or not rank_ns.isdigit():
+            return None
+        return int(rank_ns), job_id
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any], rank_ns: Optional[int] = None) -> str:
+        name = f"{rank_ns if rank_ns is not None else time.time_ns():020d}-{job_id}.json"
+        # Written next to pending/ and renamed in, so a reader never sees a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".enqueue-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self._pending / name)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+    def pending(self) -> List[str]:
+        return sorted(n for n in os.listdir(self._pending) if self._parse_name(n) is not None)
+
+    def pending_count(self) -> int:
+        return len(self.pending())
+
+    def claimed_count(self) -> int:
+        return len(os.listdir(self._claimed))
+
+    def busy_slots(self) -> int:
+        """Slots of this host held by a running job, whichever process runs it."""
+        busy = 0
+        for index in range(self.slots):
+            try:
+                fd = os.open(self._slots / f"{index}.lock", os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                busy += 1
+            finally:
+                # Also drops the flock if it was taken here
+                os.close(fd)
+        return busy
+
+    def acquire_slot(self) -> Optional[SlotLease]:
+        """A free global slot, or None when all of them are taken."""
+        for index in range(self.slots):
+            fd = os.open(self._slots / f"{index}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return SlotLease(index, fd)
+        return None
+
+    def claim(self) -> Optional[ClaimedEntry]:
+        """Take the lowest-ranked pending entry that no other process is taking."""
+        for name in self.pending():
+            try:
+                fd = os.open(self._pending / name, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                # The lock follows the inode through the rename below
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.rename(self._pending / name, self._claimed / name)
+            except (BlockingIOError, FileNotFoundError):
+                # Another process claimed (or already finished) it first
+                os.close(fd)
+                continue
+
+            with os.fdopen(os.dup(fd), "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            rank_ns, job_id = self._parse_name(name)
+            return ClaimedEntry(name=name, job_id=job_id, payload=payload, rank_ns=rank_ns, fd=fd)
+        return None
+
+    def complete(self, entry: ClaimedEntry) -> None:
+        try:
+            os.remove(self._claimed / entry.name)
+        except FileNotFoundError:
+            pass
+        if entry.fd is not None:
+            fcntl.flock(entry.fd, fcntl.LOCK_UN)
+            os.close(entry.fd)
+
+    def heartbeat(self, entry: ClaimedEntry) -> bool:
+        return True
+
+    def recover(self) -> int:
+        """Put entries claimed by dead processes back in pending, keeping their place in line."""
+        recovered = 0
+        for name in os.listdir(self._claimed):
+            try:
+                fd = os.open(self._claimed / name, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.rename(self._claimed / name, self._pending / name)
+                recovered += 1
+            except (BlockingIOError, FileNotFoundError):
+                pass
+            finally:
+                os.close(fd)
+        return recovered
+
+
+class LeasedFileJobQueue(FileJobQueue):
+    """
+    FileJobQueue for a directory shared by several hosts (NFS, EFS, SMB, ...),
+    where flock() is not reliable across machines.
+    - A claim is a lease: claimed/<name>.<token>, where the token is new for
+      every claim, and its mtime, renewed by `heartbeat()`.
+    - `recover()` returns entries whose lease expired to pending, so any idle
+      node picks them up when their node stopped. The next claim gets another
+      token, so the old owner's `heartbeat()` fails from then on, and its
+      `complete()` cannot remove the new owner's claim.
+    - Slots stay flock()ed files in `slots_directory`, which should be local to
+      each node: every node runs up to `slots` jobs of the shared queue.
+    """
+    def __init__(self, directory: str, slots: int, slots_directory: str, lease_seconds: float):
+        super().__init__(directory, slots, slots_directory=slots_directory)
+        self.lease_seconds = lease_seconds
+
+    def _lease_path(self, entry: ClaimedEntry) -> Path:
+        return self._claimed / f"{entry.name}.{entry.token}"
+
+    def claim(self) -> Optional[ClaimedEntry]:
+        for name in self.pending():
+            source = self._pending / name
+            token = uuid.uuid4().hex
+            try:
+                # Start the lease before the entry becomes visible in claimed/
+                os.utime(source)
+                os.rename(source, self._claimed / f"{name}.{token}")
+            except FileNotFoundError:
+                continue
+            rank_ns, job_id = self._parse_name(name)
+            entry = ClaimedEntry(name=name, job_id=job_id, payload={}, rank_ns=rank_ns, token=token)
+            try:
+                with open(self._lease_path(entry), "r", encoding="utf-8") as f:
+                    payload = json.load(f)
+            except FileNotFoundError:
+                # Lease already taken over
+                continue
+            return entry._replace(payload=payload)
+        return None
+
+    def heartbeat(self, entry: ClaimedEntry) -> bool:
+        """Renew the lease. False when it expired and was taken over."""
+        try:
+            os.utime(self._lease_path(entry))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, entry: ClaimedEntry) -> None:
+        try:
+            os.remove(self._lease_path(entry))
+        except FileNotFoundError:
+            pass
+
+    def recover(self) -> int:
+        recovered = 0
+        expired_before = time.time() - self.lease_seconds
+        for name in os.listdir(self._claimed):
+            # Drop the claim token; entries claimed before tokens have none
+            pending_name = name if name.endswith(".json") else name.rpartition(".")[0]
+            try:
+                if os.stat(self._claimed / name).st_mtime >= expired_before:
+                    continue
+                os.rename(self._claimed / name, self._pending / pending_name)
+                recovered += 1
+            except FileNotFoundError:
+                continue
+        return recovered
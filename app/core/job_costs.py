@@ -0,0 +1,54 @@
+import hashlib
+from typing import Dict, List, Optional
+
+from app.schemas.agent import ScriptCostSchema, StatusSchema
+
+
+def get_script_hash(script: str) -> str:
+    """Identify a script by its unconfigured text, so every run of a dashboard shares one hash."""
+    return hashlib.sha256(script.encode("utf-8")).hexdigest()[:16]
+
+
+class JobCostLedger:
+    """
+    Aggregates the resource usage of finished jobs per script hash.
+    Kept in memory for the lifetime of the process.
+    """
+    def __init__(self) -> None:
+        self._costs: Dict[str, ScriptCostSchema] = {}
+
+    def record(self, status: StatusSchema) -> None:
+        if status.script_hash is None:
+            return
+        cost = self._costs.get(status.script_hash)
+        if cost is None:
+            cost = ScriptCostSchema(script_hash=status.script_hash)
+            self._costs[status.script_hash] = cost
+
+        cost.jobs += 1
+        cost.errors += int(status.error)
+        cost.total_run_seconds += status.run_seconds or 0
+        cost.total_queue_wait_seconds += status.queue_wait_seconds or 0
+        if status.usage is not None:
+            cost.total_cpu_seconds += status.usage.cpu_seconds
+            cost.peak_rss_bytes = max(cost.peak_rss_bytes, status.usage.max_rss_bytes)
+            cost.total_block_input_ops += status.usage.block_input_ops
+            cost.total_block_output_ops += status.usage.block_output_ops
+
+    def mean_run_seconds(self, script_hash: Optional[str]) -> Optional[float]:
+        cost = self._costs.get(script_hash) if script_hash is not None else None
+        if cost is None or not cost.jobs:
+            return None
+        return cost.total_run_seconds / cost.jobs
+
+    def report(self, limit: int = 100) -> List[ScriptCostSchema]:
+        """Most expensive scripts first, by total CPU time then total run time."""
+        costs = sorted(
+            self._costs.values(),
+            key=lambda cost: (cost.total_cpu_seconds, cost.total_run_seconds),
+            reverse=True,
+        )
+        return costs[:limit]
+
+
+COST_LEDGER = JobCostLedger()
@@ -0,0 +1,146 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+COLUMNS = {
+    "id": "TEXT PRIMARY KEY",
+    "state": "TEXT",
+    "time_submitted": "TEXT",
+    "time_started": "TEXT",
+    "time_completed": "TEXT",
+    "size_bytes": "INTEGER",
+    # Only kept by the sqlite job store
+    "status": "TEXT",
+}
+
+
+class JobIndexEntry(NamedTuple):
+    id: str
+    state: str
+    time_submitted: Optional[str]
+    time_started: Optional[str]
+    time_completed: Optional[str]
+    size_bytes: Optional[int]
+
+
+def job_state(fields: Dict[str, Any]) -> str:
+    if fields.get("time_completed"):
+        if fields.get("expired"):
+            return "expired"
+        return "failed" if fields.get("error") else "completed"
+    return "running" if fields.get("time_started") else "queued"
+
+
+class JobIndex:
+    """
+    One SQLite row per job (id, state, timestamps, artifact size), so jobs are
+    listed and paged without walking the job directories.
+    - Rows are written with the job's status, on the job store's writer thread.
+    - WAL journal: workers on the same host read while one writes. Not for
+      network filesystems.
+    - Can hold the status JSON as well, for stores without status files.
+    All methods block on SQLite; call them off the event loop.
+    """
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit; shared by the writer thread and to_thread() callers
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS jobs ({', '.join(f'{k} {v}' for k, v in COLUMNS.items())})")
+            existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            for name, kind in COLUMNS.items():
+                if name not in existing:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_time_submitted ON jobs (time_submitted)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, time_submitted)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_time_completed ON jobs (time_completed, id)")
+
+    @staticmethod
+    def _row(job_id: str, content: str, size_bytes: Optional[int], keep_status: bool) -> tuple:
+        fields = json.loads(content)
+        return (
+            job_id,
+            job_state(fields),
+            fields.get("time_submitted"),
+            fields.get("time_started"),
+            fields.get("time_completed"),
+            size_bytes,
+            content if keep_status else None,
+        )
+
+    def record_many(self, rows: Iterable[Tuple[str, str, Optional[int], bool]]) -> None:
+        """Upsert (job_id, status json, size_bytes, keep_status) rows in one transaction."""
+        values = [self._row(*row) for row in rows]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO jobs (id, state, time_submitted, time_started, time_completed, size_bytes, status)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (id) DO UPDATE SET state = excluded.state,"
+                    " time_submitted = excluded.time_submitted, time_started = excluded.time_started,"
+                    " time_completed = excluded.time_completed, size_bytes = excluded.size_bytes,"
+                    " status = excluded.status",
+                    values,
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def record(self, job_id: str, content: str, size_bytes: Optional[int] = None, keep_status: bool = False) -> None:
+        self.record_many([(job_id, content, size_bytes, keep_status)])
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM jobs LIMIT 1").fetchone() is None
+
+    def load_status(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def page(self, offset: int, limit: int, state: Optional[str] = None) -> Tuple[int, List[JobIndexEntry]]:
+        """Total matching jobs and one page of them, newest first."""
+        where, params = ("WHERE state = ?", (state,)) if state is not None else ("", ())
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM jobs {where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT {', '.join(JobIndexEntry._fields)} FROM jobs {where}"
+                " ORDER BY time_submitted DESC, id LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return total, [JobIndexEntry(*row) for row in rows]
+
+    def totals(self) -> Tuple[int, int]:
+        """Number of jobs and bytes of artifacts of the finished ones."""
+        with self._lock:
+            jobs, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM jobs").fetchone()
+        return jobs, size
+
+    def oldest_finished(self, after: Optional[JobIndexEntry], limit: int) -> List[JobIndexEntry]:
+        """Finished jobs by completion time, oldest first, continuing after `after`."""
+        where, params = "time_completed IS NOT NULL", ()
+        if after is not None:
+            where += " AND (time_completed, id) > (?, ?)"
+            params = (after.time_completed, after.id)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(JobIndexEntry._fields)} FROM jobs WHERE {where}"
+                " ORDER BY time_completed, id LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [JobIndexEntry(*row) for row in rows]
+
+    def delete_many(self, job_ids: List[str]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
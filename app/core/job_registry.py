@@ -0,0 +1,172 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from app.schemas.agent import StatusSchema
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept in memory after their last write; older ones are read from disk
+MAX_FINISHED_JOBS = 1024
+# Pause of the writer after a failed write, e.g. while the disk is full
+RETRY_SECONDS = 1.0
+
+
+def write_atomic(path: Path, content: str) -> None:
+    """Write via a temp file in the same directory and rename it over `path`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JobRegistry:
+    """
+    In-memory source of truth for the status of jobs run by this process.
+    - Status reads of live jobs are served from memory.
+    - Writes are persisted behind the caller by `persist(key, json)` on a
+      background thread; when updates of one job pile up only the latest is written.
+    - A failed write is logged and retried, unless a newer status of the job
+      replaced it meanwhile; the writer keeps going for the other jobs.
+    - Without a running writer (scripts, benchmarks) writes happen inline.
+    """
+    def __init__(self, persist: Callable[[str, str], None], max_finished: int = MAX_FINISHED_JOBS) -> None:
+        self._persist = persist
+        self._max_finished = max_finished
+        self._live: Dict[str, StatusSchema] = {}
+        self._finished: "OrderedDict[str, StatusSchema]" = OrderedDict()
+        self._dirty: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Taken while still holding _lock, so statuses reach the disk in the order they were popped
+        self._write_lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._writer: Optional[threading.Thread] = None
+        self._stopping = False
+        # Key the writer is persisting; cleared by forget()/discard() so a failed write is not retried
+        self._writing: Optional[str] = None
+
+    def get(self, key: str) -> Optional[StatusSchema]:
+        """The cached status, or None when the caller has to load it from storage."""
+        with self._lock:
+            status = self._live.get(key)
+            if status is None:
+                status = self._finished.get(key)
+                if status is not None:
+                    self._finished.move_to_end(key)
+        # Callers mutate what they get back before setting it again
+        return status.model_copy(deep=True) if status is not None else None
+
+    def set(self, key: str, status: StatusSchema) -> None:
+        status = status.model_copy(deep=True)
+        content = status.model_dump_json()
+        with self._lock:
+            if status.time_completed is None:
+                self._live[key] = status
+            else:
+                self._live.pop(key, None)
+                self._finished[key] = status
+                self._finished.move_to_end(key)
+                while len(self._finished) > self._max_finished:
+                    self._finished.popitem(last=False)
+
+            if self._writer is not None:
+                self._dirty[key] = content
+                self._dirty.move_to_end(key)
+                self._changed.notify()
+                return
+        self._persist(key, content)
+
+    def forget(self, key: str) -> None:
+        """
+        Write any pending status of the job now and stop caching it, for jobs
+        another process takes over. Blocking.
+        """
+        with self._lock:
+            self._live.pop(key, None)
+            self._finished.pop(key, None)
+            content = self._dirty.pop(key, None)
+            if self._writing == key:
+                self._writing = None
+            self._write_lock.acquire()
+        try:
+            if content is not None:
+                self._persist(key, content)
+        finally:
+            self._write_lock.release()
+
+    def discard(self, key: str) -> None:
+        """
+        Drop the job's status, cached and pending, without writing it, for jobs
+        being deleted. Waits for a write of it already in progress. Blocking.
+        """
+        with self._lock:
+            self._live.pop(key, None)
+            self._finished.pop(key, None)
+            self._dirty.pop(key, None)
+            if self._writing == key:
+                self._writing = None
+            self._write_lock.acquire()
+        self._write_lock.release()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._dirty and not self._stopping:
+                    self._changed.wait()
+                if not self._dirty and self._stopping:
+                    return
+                key, content = self._dirty.popitem(last=False)
+                self._writing = key
+                self._write_lock.acquire()
+            failed = False
+            try:
+                self._persist(key, content)
+            except Exception:
+                failed = True
+                logger.exception("Failed to persist job status", extra={"job_id": key})
+            finally:
+                self._write_lock.release()
+
+            with self._lock:
+                retry = failed and self._writing == key and key not in self._dirty and not self._stopping
+                if retry:
+                    self._dirty[key] = content
+                self._writing = None
+            if retry:
+                time.sleep(RETRY_SECONDS)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                return
+            self._stopping = False
+            self._writer = threading.Thread(target=self._write_loop, name="job-registry-writer", daemon=True)
+            self._writer.start()
+
+    def stop(self) -> None:
+        """Write everything still pending, then stop the writer. Blocking."""
+        with self._lock:
+            writer, self._stopping = self._writer, True
+            self._changed.notify()
+        if writer is not None:
+            writer.join()
+        with self._lock:
+            self._writer = None
+            leftover, self._dirty = self._dirty, OrderedDict()
+        # Set while the writer was exiting
+        for key, content in leftover.items():
+            try:
+                self._persist(key, content)
+            except Exception:
+                logger.exception("Failed to persist job status", extra={"job_id": key})
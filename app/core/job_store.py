@@ -0,0 +1,545 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, BinaryIO, Callable, Coroutine, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+
+from app.core.job_index import JobIndex, JobIndexEntry
+from app.core.job_registry import JobRegistry, write_atomic
+from app.core.settings import JobStoreSettings
+from app.schemas.agent import StatusSchema
+from app.service.executor import ExecutorService
+
+if TYPE_CHECKING:
+    from app.clients.s3 import S3Client
+
+CoroutineType = Callable[[], Coroutine]
+
+logger = logging.getLogger(__name__)
+
+STATUS_FILE = "status.json"
+DATA_FILE = "data.json"
+STD_OUTPUT_FILE = "std_output.txt"
+ERROR_FILE = "error.txt"
+# Written by the script for the tracer; never served
+SPANS_FILE = "spans.jsonl"
+PROFILE_FILES = {
+    "pstats": "profile.pstats",
+    "collapsed": "profile.collapsed.txt",
+}
+
+# <root>/<2 hex>/<2 hex>/<job_id>: 65536 leaf directories
+SHARD_WIDTH = 2
+MIGRATION_BATCH_SIZE = 500
+
+ARTIFACT_CONTENT_TYPES = {
+    DATA_FILE: "application/json",
+    STD_OUTPUT_FILE: "text/plain",
+    ERROR_FILE: "text/plain",
+    PROFILE_FILES["pstats"]: "application/octet-stream",
+    PROFILE_FILES["collapsed"]: "text/plain",
+}
+
+
+@dataclass
+class Artifact:
+    name: str
+    size: int
+    chunks: AsyncIterator[bytes]
+
+
+async def iter_file(f: BinaryIO, chunk_size: int) -> AsyncIterator[bytes]:
+    """Read an open file in chunks off the event loop, closing it at the end."""
+    try:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        f.close()
+
+
+def local_artifact_paths(work_dir: Path) -> Dict[str, Path]:
+    """Artifacts a job left in its work directory, by name. Blocking."""
+    paths = {name: work_dir / name for name in ARTIFACT_CONTENT_TYPES}
+    return {name: path for name, path in paths.items() if path.is_file()}
+
+
+def artifacts_size(work_dir: Path) -> int:
+    return sum(path.stat().st_size for path in local_artifact_paths(work_dir).values())
+
+
+class JobStore(ABC):
+    """
+    Where jobs keep their status and artifacts.
+    - A job runs in a local work directory; its script writes the artifacts
+      there and `commit()` makes them readable through the store.
+    - Nothing here blocks the event loop.
+    - Artifacts are read as a stream of chunks, never loaded whole.
+    - With a JobIndex, jobs are listed from the index.
+    """
+    # Artifacts end up at S3Client.get_job_artifact_key(), where offloading would put them
+    artifacts_in_s3 = False
+
+    def __init__(self, chunk_size: int, index: Optional[JobIndex] = None):
+        self.chunk_size = chunk_size
+        self.index = index
+        # Cluster mode: the index is node-local and lists the jobs this node ran.
+        # A job handed over to the shared queue leaves it; its runner indexes it
+        self.index_per_node = False
+
+    async def _unindex_handed_over(self, job_id: str) -> None:
+        if self.index is not None and self.index_per_node:
+            await asyncio.to_thread(self.index.delete_many, [job_id])
+
+    @abstractmethod
+    def work_dir(self, job_id: str) -> Path:
+        pass
+
+    @abstractmethod
+    async def get_status(self, job_id: str) -> Optional[StatusSchema]:
+        pass
+
+    @abstractmethod
+    async def set_status(self, job_id: str, status: StatusSchema) -> None:
+        pass
+
+    async def forget(self, job_id: str) -> None:
+        """Stop caching the job's status, for jobs another process takes over."""
+
+    async def put_text(self, job_id: str, name: str, content: str) -> None:
+        await asyncio.to_thread(write_atomic, self.work_dir(job_id) / name, content)
+
+    @abstractmethod
+    async def commit(self, job_id: str) -> None:
+        pass
+
+    @abstractmethod
+    async def artifact_size(self, job_id: str, name: str) -> Optional[int]:
+        pass
+
+    @abstractmethod
+    async def open_artifact(self, job_id: str, name: str) -> Optional[Artifact]:
+        pass
+
+    async def read_text(self, job_id: str, name: str) -> Optional[str]:
+        artifact = await self.open_artifact(job_id, name)
+        if artifact is None:
+            return None
+        return b"".join([chunk async for chunk in artifact.chunks]).decode("utf-8")
+
+    @abstractmethod
+    async def delete(self, job_ids: List[str]) -> None:
+        """Remove finished jobs: status, artifacts and index rows."""
+
+    async def list_jobs(
+        self, offset: int, limit: int, state: Optional[str] = None
+    ) -> Tuple[int, List[JobIndexEntry]]:
+        """Total and one page of indexed jobs, newest first."""
+        if self.index is None:
+            return 0, []
+        return await asyncio.to_thread(self.index.page, offset, limit, state)
+
+    def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        if self.index is not None:
+            await asyncio.to_thread(self.index.close)
+
+
+class FilesystemJobStore(JobStore):
+    """
+    Jobs as directories under `root`, sharded by a hash of the job id:
+    <root>/<h[0:2]>/<h[2:4]>/<job_id>/ holds status.json next to the artifact
+    files, and is the job's work directory too.
+    - Statuses go through a JobRegistry: served from memory for jobs this
+      process runs and written to disk, and to the index, behind the caller.
+    - Directories of the flat layout (<root>/<job_id>) are still read, and
+      are moved into their shard and indexed in the background by `start()`.
+    """
+    # Statuses as status.json files, or only in the index (SQLiteJobStore)
+    statuses_in_index = False
+
+    def __init__(self, root: str, chunk_size: int, index: Optional[JobIndex] = None):
+        super().__init__(chunk_size, index)
+        self.root = Path(root)
+        self._registry = JobRegistry(persist=self._persist_status)
+        self._stop_migration = threading.Event()
+        self._migration: Optional[asyncio.Task] = None
+
+    def job_dir(self, job_id: str) -> Path:
+        digest = hashlib.sha1(job_id.encode("utf-8")).hexdigest()
+        return self.root / digest[0:SHARD_WIDTH] / digest[SHARD_WIDTH:2 * SHARD_WIDTH] / job_id
+
+    def work_dir(self, job_id: str) -> Path:
+        return self.job_dir(job_id)
+
+    def _existing_dir(self, job_id: str) -> Path:
+        """The job's directory, falling back to the flat layout until it is migrated."""
+        job_dir = self.job_dir(job_id)
+        if not job_dir.exists():
+            legacy_dir = self.root / job_id
+            if legacy_dir.is_dir():
+                return legacy_dir
+        return job_dir
+
+    def _persist_status(self, job_id: str, content: str) -> None:
+        if not self.statuses_in_index:
+            write_atomic(self.job_dir(job_id) / STATUS_FILE, content)
+        if self.index is not None:
+            # Completed jobs have committed their artifacts; count them once, here
+            completed = json.loads(content).get("time_completed") is not None
+            size = artifacts_size(self.job_dir(job_id)) if completed else None
+            self.index.record(job_id, content, size, keep_status=self.statuses_in_index)
+
+    def _load_status(self, job_id: str) -> Optional[str]:
+        try:
+            return (self._existing_dir(job_id) / STATUS_FILE).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    async def get_status(self, job_id: str) -> Optional[StatusSchema]:
+        status = self._registry.get(job_id)
+        if status is not None:
+            return status
+        content = await asyncio.to_thread(self._load_status, job_id)
+        return StatusSchema.model_validate_json(content) if content is not None else None
+
+    async def set_status(self, job_id: str, status: StatusSchema) -> None:
+        self._registry.set(job_id, status)
+
+    async def forget(self, job_id: str) -> None:
+        await asyncio.to_thread(self._registry.forget, job_id)
+        await self._unindex_handed_over(job_id)
+
+    async def commit(self, job_id: str) -> None:
+        # Artifacts are already where they are served from
+        pass
+
+    def _open(self, job_id: str, name: str) -> Optional[BinaryIO]:
+        try:
+            return open(self._existing_dir(job_id) / name, "rb")
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def _size(self, job_id: str, name: str) -> Optional[int]:
+        path = self._existing_dir(job_id) / name
+        return path.stat().st_size if path.is_file() else None
+
+    async def artifact_size(self, job_id: str, name: str) -> Optional[int]:
+        return await asyncio.to_thread(self._size, job_id, name)
+
+    async def open_artifact(self, job_id: str, name: str) -> Optional[Artifact]:
+        f = await asyncio.to_thread(self._open, job_id, name)
+        if f is None:
+            return None
+        return Artifact(name=name, size=os.fstat(f.fileno()).st_size, chunks=iter_file(f, self.chunk_size))
+
+    def _delete_dirs(self, job_ids: List[str]) -> None:
+        for job_id in job_ids:
+            self._registry.discard(job_id)
+            for job_dir in (self.job_dir(job_id), self.root / job_id):
+                shutil.rmtree(job_dir, ignore_errors=True)
+        if self.index is not None:
+            self.index.delete_many(job_ids)
+
+    async def delete(self, job_ids: List[str]) -> None:
+        await asyncio.to_thread(self._delete_dirs, job_ids)
+
+    # -------------------------
+    # Migration from the flat layout
+    # -------------------------
+
+    def _index_row(self, job_id: str) -> Optional[tuple]:
+        """Index row for a job found on disk, or None when it has no status file."""
+        try:
+            content = (self.job_dir(job_id) / STATUS_FILE).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        completed = json.loads(content).get("time_completed") is not None
+        size = artifacts_size(self.job_dir(job_id)) if completed else None
+        return job_id, content, size, self.statuses_in_index
+
+    def _move_to_shard(self, source: Path, target: Path) -> None:
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(source, target)
+            return
+        # Written to again since the upgrade; the sharded copy is the newer one
+        for path in source.iterdir():
+            if not (target / path.name).exists():
+                os.rename(path, target / path.name)
+        shutil.rmtree(source)
+
+    def migrate(self, stop: threading.Event, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+        """
+        Move flat-layout job directories into their shards and index them, in
+        one pass over `root`; a fresh index also gets every sharded job.
+        Only one process migrates at a time; returns early when `stop` is set.
+        Returns the number of directories moved. Blocking.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".migrate.lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            moved = 0
+            batch: List[tuple] = []
+            # A new or lost index is rebuilt from the sharded directories too,
+            # unless it only lists this node's jobs
+            backfill = self.index is not None and not self.index_per_node and self.index.is_empty()
+
+            def _add(job_id: str) -> None:
+                row = self._index_row(job_id) if self.index is not None else None
+                if row is not None:
+                    batch.append(row)
+                if len(batch) >= batch_size:
+                    self.index.record_many(batch)
+                    batch.clear()
+
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if stop.is_set():
+                        break
+                    # Shards have SHARD_WIDTH-long names; scheduler and scratch directories start with "."
+                    if len(entry.name) == SHARD_WIDTH or entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                        continue
+                    try:
+                        self._move_to_shard(Path(entry.path), self.job_dir(entry.name))
+                    except OSError:
+                        logger.exception("Failed to move a job directory into its shard", extra={"job_id": entry.name})
+                        continue
+                    moved += 1
+                    _add(entry.name)
+
+            if backfill and not stop.is_set():
+                pattern = "/".join(["[0-9a-f]" * SHARD_WIDTH] * 2 + ["*"])
+                for job_dir in self.root.glob(pattern):
+                    if stop.is_set():
+                        break
+                    _add(job_dir.name)
+            if batch:
+                self.index.record_many(batch)
+        return moved
+
+    async def _migrate(self) -> None:
+        try:
+            moved = await asyncio.to_thread(self.migrate, self._stop_migration)
+        except Exception:
+            logger.exception("Job directory migration failed")
+            return
+        if moved:
+            logger.info("Moved job directories into shards", extra={"jobs": moved})
+
+    def start(self) -> None:
+        self._registry.start()
+        self._migration = asyncio.create_task(self._migrate())
+
+    async def close(self) -> None:
+        if self._migration is not None:
+            self._stop_migration.set()
+            await self._migration
+            self._migration = None
+        await asyncio.to_thread(self._registry.stop)
+        await super().close()
+
+
+class SQLiteJobStore(FilesystemJobStore):
+    """
+    FilesystemJobStore with the statuses in the job index instead of a
+    status.json per job directory; artifacts stay files in the job directory.
+    A status lookup is one indexed row instead of a directory entry plus a file.
+    """
+    statuses_in_index = True
+
+    def __init__(self, root: str, chunk_size: int, index: JobIndex):
+        super().__init__(root, chunk_size, index)
+
+    def _load_status(self, job_id: str) -> Optional[str]:
+        content = self.index.load_status(job_id)
+        if content is not None:
+            return content
+        # Jobs from before the switch to this backend
+        return super()._load_status(job_id)
+
+
+class S3JobStore(JobStore):
+    """
+    Jobs as objects under S3_JOB_ARTIFACTS_PREFIX/<job_id>/, so results outlive
+    the host and any node can serve any job.
+    - Jobs run in a local scratch directory; `commit()` uploads the artifacts
+      and removes it.
+    - Statuses are written through to S3. The statuses of jobs this process
+      runs are also kept in memory until they complete.
+    - The index is local: it lists the jobs this host submitted or ran.
+    """
+    artifacts_in_s3 = True
+
+    def __init__(self, s3_client: "S3Client", scratch_root: str, chunk_size: int, index: Optional[JobIndex] = None):
+        super().__init__(chunk_size, index)
+        self._s3_client = s3_client
+        self._scratch_root = Path(scratch_root)
+        self._live: Dict[str, StatusSchema] = {}
+        # Bytes uploaded by commit(), indexed with the final status
+        self._committed_sizes: Dict[str, int] = {}
+
+    def work_dir(self, job_id: str) -> Path:
+        return self._scratch_root / job_id
+
+    def _key(self, job_id: str, name: str) -> str:
+        return self._s3_client.get_job_artifact_key(job_id, name)
+
+    async def get_status(self, job_id: str) -> Optional[StatusSchema]:
+        status = self._live.get(job_id)
+        if status is not None:
+            return status.model_copy(deep=True)
+        content = await self._s3_client.get_text(self._key(job_id, STATUS_FILE))
+        return StatusSchema.model_validate_json(content) if content is not None else None
+
+    async def set_status(self, job_id: str, status: StatusSchema) -> None:
+        size = None
+        if status.time_completed is None:
+            self._live[job_id] = status.model_copy(deep=True)
+        else:
+            self._live.pop(job_id, None)
+            size = self._committed_sizes.pop(job_id, None)
+        content = status.model_dump_json()
+        result = await self._s3_client.put(
+            key=self._key(job_id, STATUS_FILE),
+            data=content,
+            content_type="application/json",
+        )
+        if not result.success:
+            raise OSError(f"Failed to store the status of job {job_id}: {result.error}")
+        if self.index is not None:
+            await asyncio.to_thread(self.index.record, job_id, content, size)
+
+    async def forget(self, job_id: str) -> None:
+        self._live.pop(job_id, None)
+        await self._unindex_handed_over(job_id)
+
+    async def commit(self, job_id: str) -> None:
+        work_dir = self.work_dir(job_id)
+        paths = await asyncio.to_thread(local_artifact_paths, work_dir)
+        results = await asyncio.gather(*[
+            self._s3_client.upload_file(
+                key=self._key(job_id, name),
+                path=str(path),
+                content_type=ARTIFACT_CONTENT_TYPES[name],
+            )
+            for name, path in paths.items()
+        ])
+        failed = [result.key for result in results if not result.success]
+        if failed:
+            # Scratch is kept so nothing is lost
+            raise OSError(f"Failed to upload {', '.join(failed)}")
+        self._committed_sizes[job_id] = await asyncio.to_thread(artifacts_size, work_dir)
+        await asyncio.to_thread(shutil.rmtree, work_dir, True)
+
+    async def artifact_size(self, job_id: str, name: str) -> Optional[int]:
+        return await self._s3_client.get_size(self._key(job_id, name))
+
+    def _delete_local(self, job_ids: List[str]) -> None:
+        for job_id in job_ids:
+            # Left behind when an upload failed
+            shutil.rmtree(self.work_dir(job_id), ignore_errors=True)
+        if self.index is not None:
+            self.index.delete_many(job_ids)
+
+    async def delete(self, job_ids: List[str]) -> None:
+        for job_id in job_ids:
+            self._live.pop(job_id, None)
+            self._committed_sizes.pop(job_id, None)
+        names = [STATUS_FILE, *ARTIFACT_CONTENT_TYPES]
+        results = await self._s3_client.delete_many(
+            [self._key(job_id, name) for job_id in job_ids for name in names]
+        )
+        failed = [result.key for result in results if not result.success]
+        if failed:
+            raise OSError(f"Failed to delete {', '.join(failed)}")
+        await asyncio.to_thread(self._delete_local, job_ids)
+
+    async def open_artifact(self, job_id: str, name: str) -> Optional[Artifact]:
+        key = self._key(job_id, name)
+        size = await self._s3_client.get_size(key)
+        if size is None:
+            return None
+        return Artifact(name=name, size=size, chunks=self._s3_client.iter_chunks(key, self.chunk_size))
+
+
+# Default index of cluster nodes: SQLite's locking does not hold on network filesystems
+NODE_LOCAL_INDEX_PATH = "/tmp/highkick-agent/jobs.sqlite3"
+
+
+def index_path(settings: JobStoreSettings, output_dir: str, cluster: bool) -> str:
+    """
+    Where the job index lives. In cluster mode output.directory is shared by
+    the nodes, so the index defaults to a node-local path and may not be put
+    on the output directory.
+    """
+    if not cluster:
+        return settings.SQLITE_PATH or f"{output_dir}/jobs.sqlite3"
+    if settings.BACKEND == "sqlite":
+        raise RuntimeError("JOB_STORE_BACKEND=sqlite keeps statuses on one node; use filesystem or s3 in cluster mode")
+    path = settings.SQLITE_PATH or NODE_LOCAL_INDEX_PATH
+    shared = os.path.realpath(output_dir)
+    if os.path.commonpath([shared, os.path.realpath(path)]) == shared:
+        raise RuntimeError(f"JOB_STORE_SQLITE_PATH must be node-local in cluster mode, not under {output_dir}")
+    return path
+
+
+async def make_job_store(settings: JobStoreSettings, output_dir: str, app: FastAPI) -> JobStore:
+    cluster = app.state.settings.scheduler.MODE == "cluster"
+    index = await asyncio.to_thread(JobIndex, index_path(settings, output_dir, cluster))
+
+    store: JobStore
+    if settings.BACKEND == "sqlite":
+        store = SQLiteJobStore(root=output_dir, chunk_size=settings.ARTIFACT_CHUNK_SIZE, index=index)
+    elif settings.BACKEND == "s3":
+        from app.clients.s3 import S3Client
+
+        shared = getattr(app.state, "aws_clients", {}).get("s3")
+        if shared is None:
+            raise RuntimeError("JOB_STORE_BACKEND=s3 needs the shared S3 client")
+        store = S3JobStore(
+            # Statuses change; keep them out of the object cache
+            s3_client=S3Client(s3_client=await shared.open(), settings=app.state.settings.s3),
+            scratch_root=settings.SCRATCH_DIRECTORY or f"{output_dir}/.scratch",
+            chunk_size=settings.ARTIFACT_CHUNK_SIZE,
+            index=index,
+        )
+    else:
+        store = FilesystemJobStore(root=output_dir, chunk_size=settings.ARTIFACT_CHUNK_SIZE, index=index)
+    store.index_per_node = cluster
+    return store
+
+
+def init_job_store(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        executor = ExecutorService(agent_config=app.state.settings.agent_config)
+        store = await make_job_store(app.state.settings.job_store, executor.get_output_dir(), app)
+        store.start()
+        app.state.job_store = store
+
+    return _init
+
+
+def close_job_store(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        if getattr(app.state, "job_store", None) is not None:
+            await app.state.job_store.close()
+
+    return _close
@@ -0,0 +1,117 @@
+import fcntl
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+
+class HostLock:
+    """
+    An flock()ed file, held by at most one process of the host; the kernel
+    drops it when that process dies. The path should be on a local filesystem.
+    All methods block on file I/O; call them off the event loop.
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._fd: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        """Take the lock if it is free. True while this process holds it."""
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class SharedLease:
+    """
+    Held by at most one host of a cluster, through a file on their shared
+    directory (NFS, EFS, ...), where flock() is not reliable across machines.
+    - The file holds the owner's token; its mtime is the lease, renewed by
+      every `try_acquire()` of the owner.
+    - A lease not renewed for `lease_seconds` is taken over by the next host
+      that tries. When two hosts take over at once, the one whose token is not
+      in the file finds out at its next renewal.
+    All methods block on file I/O; call them off the event loop.
+    """
+    def __init__(self, path: str, lease_seconds: float):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self._token: Optional[str] = None
+
+    def _owner(self) -> Optional[str]:
+        try:
+            return self.path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def _renew(self) -> bool:
+        if self._owner() != self._token:
+            self._token = None
+            return False
+        os.utime(self.path)
+        return True
+
+    def try_acquire(self) -> bool:
+        """Take the lease if it is free or expired, or renew it. True while this host holds it."""
+        if self._token is not None:
+            return self._renew()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if time.time() - os.stat(self.path).st_mtime > self.lease_seconds:
+                # Set the expired lease aside; of several hosts doing this only one renames it
+                expired = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex}")
+                os.rename(self.path, expired)
+                os.remove(expired)
+        except FileNotFoundError:
+            pass
+
+        token = uuid.uuid4().hex
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(token)
+        self._token = token
+        return True
+
+    def release(self) -> None:
+        if self._token is not None and self._owner() == self._token:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self._token = None
+
+
+class Leadership:
+    """All of `locks` (HostLock / SharedLease), taken and kept together."""
+    def __init__(self, locks: List):
+        self._locks = locks
+
+    def try_acquire(self) -> bool:
+        """Take or renew every lock; on a miss, let go of all of them. Blocking."""
+        for lock in self._locks:
+            if not lock.try_acquire():
+                self.release()
+                return False
+        return True
+
+    def release(self) -> None:
+        for lock in reversed(self._locks):
+            lock.release()
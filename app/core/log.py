@@ -0,0 +1,191 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Any, Callable, Coroutine, Iterable, Optional, Set
+
+import yaml
+from fastapi import FastAPI
+
+from app.core.metrics import LOG_RECORDS_DROPPED
+from app.core.settings import LoggingSettings
+
+CoroutineType = Callable[[], Coroutine]
+
+REDACTED = "***"
+
+# Config keys whose values are treated as secrets: the whole key or its last
+# _/- separated part, so `access_token` matches but `input_tokens` or `passed` do not
+SECRET_KEY_PATTERN = re.compile(
+    r"(^|[_-])(pass(word|wd)?|secret([_-]?key)?|token|private[_-]?key|credentials?|(api|access)[_-]?key)$",
+    re.IGNORECASE,
+)
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class RedactionFilter(logging.Filter):
+    """Masks known secret values in the message and in `extra` fields."""
+    def __init__(self) -> None:
+        super().__init__()
+        self._secrets: Set[str] = set()
+        self._pattern: Optional[re.Pattern] = None
+
+    def add_secrets(self, values: Iterable[Any]) -> None:
+        # Very short values would mask unrelated text
+        self._secrets.update(str(v) for v in values if v is not None and len(str(v)) >= 4)
+        if self._secrets:
+            ordered = sorted(self._secrets, key=len, reverse=True)
+            self._pattern = re.compile("|".join(re.escape(s) for s in ordered))
+
+    def redact(self, value: Any) -> Any:
+        if isinstance(value, str):
+            return self._pattern.sub(REDACTED, value) if self._pattern else value
+        if isinstance(value, dict):
+            return {
+                k: REDACTED if SECRET_KEY_PATTERN.search(str(k)) else self.redact(v)
+                for k, v in value.items()
+            }
+        if isinstance(value, (list, tuple)):
+            return [self.redact(v) for v in value]
+        return value
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = self.redact(record.getMessage())
+        record.args = None
+        for key, value in list(vars(record).items()):
+            if key not in _RECORD_ATTRS:
+                setattr(record, key, REDACTED if SECRET_KEY_PATTERN.search(key) else self.redact(value))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.redact(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a `rate` fraction of records below WARNING; warnings and errors are never dropped."""
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without ever waiting:
+    when the bounded queue is full the record is dropped and counted.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting and redaction happen on the writer thread; only freeze
+        # the message here so later mutation of the args cannot change it.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class LoggingSubsystem:
+    def __init__(self) -> None:
+        self.redaction = RedactionFilter()
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._queue_handler: Optional[NonBlockingQueueHandler] = None
+
+    def configure(self, settings: LoggingSettings) -> None:
+        self.shutdown()
+
+        output = logging.StreamHandler(sys.stdout)
+        output.addFilter(self.redaction)
+        output.setFormatter(
+            JsonFormatter()
+            if settings.FORMAT == "json"
+            else logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+
+        record_queue: queue.Queue = queue.Queue(maxsize=settings.QUEUE_SIZE)
+        self._queue_handler = NonBlockingQueueHandler(record_queue)
+        self._queue_handler.addFilter(SamplingFilter(settings.SAMPLE_RATE))
+        self._listener = logging.handlers.QueueListener(record_queue, output)
+        self._listener.start()
+
+        root = logging.getLogger()
+        root.setLevel(settings.LEVEL.upper())
+        root.addHandler(self._queue_handler)
+
+    def shutdown(self) -> None:
+        if self._queue_handler is not None:
+            logging.getLogger().removeHandler(self._queue_handler)
+            self._queue_handler = None
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+
+LOGGING = LoggingSubsystem()
+
+
+def collect_config_secrets(config: Any) -> Set[str]:
+    """Values of secret-looking keys anywhere in the agent config, plus everything under `secrets`."""
+    found: Set[str] = set()
+
+    def _walk(node: Any, secret: bool) -> None:
+        if isinstance(node, dict):
+            for key, value in node.items():
+                _walk(value, secret or bool(SECRET_KEY_PATTERN.search(str(key))))
+        elif isinstance(node, list):
+            for value in node:
+                _walk(value, secret)
+        elif secret and node is not None:
+            found.add(str(node))
+
+    if isinstance(config, dict):
+        _walk(config.get("secrets"), True)
+        _walk({k: v for k, v in config.items() if k != "secrets"}, False)
+    return found
+
+
+def init_logging(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        LOGGING.configure(app.state.settings.logging)
+        try:
+            with open(app.state.settings.agent_config.CONFIG_PATH, "r") as f:
+                config = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError):
+            return
+        LOGGING.redaction.add_secrets(collect_config_secrets(config))
+
+    return _init
+
+
+def close_logging(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        LOGGING.shutdown()
+
+    return _close
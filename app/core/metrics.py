@@ -0,0 +1,422 @@
+import functools
+import inspect
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.tracing import start_span
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _ShardOwner:
+    """Weak-referenceable stand-in for a thread, kept in its thread-local."""
+    __slots__ = ("__weakref__",)
+
+
+class _Metric:
+    """
+    Base for metrics recorded on hot paths.
+    Every thread writes into its own shard, so recording needs no lock and
+    never races; shards are only merged when the metrics are rendered.
+    The shard of a thread that exits is folded into a base shard, so
+    short-lived threads do not pile up shards.
+    """
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._base: dict = {}
+        self._shards: List[dict] = [self._base]
+        self._shards_lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: dict = {}
+            # Taken once per thread, never on the recording path
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            # The thread's locals are dropped when it exits, and the owner with them
+            self._local.owner = owner = _ShardOwner()
+            weakref.finalize(owner, self._retire, shard)
+            return shard
+
+    def _retire(self, shard: dict) -> None:
+        with self._shards_lock:
+            for key, value in shard.items():
+                self._base[key] = self._combine(self._base[key], value) if key in self._base else self._copy(value)
+            # By identity: list.remove() would match any shard with equal contents
+            self._shards = [other for other in self._shards if other is not shard]
+
+    def _combine(self, total: Any, value: Any) -> Any:
+        raise NotImplementedError
+
+    def _copy(self, value: Any) -> Any:
+        return value
+
+    def _snapshots(self) -> List[dict]:
+        with self._shards_lock:
+            return [dict(shard) for shard in self._shards]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _combine(self, total: float, value: float) -> float:
+        return total + value
+
+    def value(self, **labels: str) -> float:
+        key = self._key(labels)
+        return sum(shard.get(key, 0) for shard in self._snapshots())
+
+    def render(self) -> List[str]:
+        totals: Dict[LabelValues, float] = {}
+        for shard in self._snapshots():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(totals.items())
+        ]
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. Gauges are either set directly or
+    computed on scrape from a registered function.
+    """
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels: str) -> None:
+        self._functions[self._key(labels)] = fn
+
+    def render(self) -> List[str]:
+        values = dict(self._values)
+        for key, fn in list(self._functions.items()):
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # [bucket counts..., +Inf count, sum]
+            state = [0] * (len(self.buckets) + 1) + [0.0]
+            shard[key] = state
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _combine(self, total: List[float], value: List[float]) -> List[float]:
+        return [a + b for a, b in zip(total, value)]
+
+    def _copy(self, value: List[float]) -> List[float]:
+        return list(value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        merged: Dict[LabelValues, List[float]] = {}
+        for shard in self._snapshots():
+            for key, state in shard.items():
+                total = merged.setdefault(key, [0] * len(state))
+                for i, value in enumerate(list(state)):
+                    total[i] += value
+
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for key, state in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))  # type: ignore
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))  # type: ignore
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None,
+    ) -> Histogram:
+        return self._register(
+            Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS)
+        )  # type: ignore
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# -------------------------
+# Task pool
+# -------------------------
+
+TASK_POOL_QUEUE_DEPTH = REGISTRY.gauge(
+    "highkick_task_pool_queue_depth", "Tasks waiting in the task pool queue"
+)
+TASK_POOL_ACTIVE = REGISTRY.gauge(
+    "highkick_task_pool_active_tasks", "Tasks currently executing in the task pool"
+)
+TASK_POOL_SIZE = REGISTRY.gauge(
+    "highkick_task_pool_size", "Number of task pool workers"
+)
+TASK_POOL_QUEUE_WAIT = REGISTRY.histogram(
+    "highkick_task_pool_queue_wait_seconds", "Time tasks spend queued before starting"
+)
+TASK_POOL_TASKS = REGISTRY.counter(
+    "highkick_task_pool_tasks_total", "Tasks finished by the task pool", ["outcome"]
+)
+
+# -------------------------
+# Jobs
+# -------------------------
+
+JOB_QUEUE_DEPTH = REGISTRY.gauge(
+    "highkick_job_queue_depth", "Jobs waiting in the host-wide job queue"
+)
+JOB_QUEUE_RUNNING = REGISTRY.gauge(
+    "highkick_job_queue_running", "Jobs claimed from the host-wide job queue and running"
+)
+JOB_QUEUE_RECOVERED = REGISTRY.counter(
+    "highkick_job_queue_recovered_total", "Claimed jobs put back in the queue after their runner stopped"
+)
+
+JOBS = REGISTRY.counter(
+    "highkick_jobs_total", "Jobs finished by run_job", ["outcome"]
+)
+JOB_RUN_TIME = REGISTRY.histogram(
+    "highkick_job_run_seconds", "Wall time of run_job from start to final status"
+)
+JOB_OUTPUT_BYTES = REGISTRY.counter(
+    "highkick_job_output_bytes_total", "Bytes of job artifacts written", ["artifact"]
+)
+JOBS_REJECTED = REGISTRY.counter(
+    "highkick_jobs_rejected_total", "Job submissions refused", ["reason"]
+)
+JOBS_EVICTED = REGISTRY.counter(
+    "highkick_jobs_evicted_total", "Finished jobs deleted by retention", ["reason"]
+)
+JOB_RECLAIMED_BYTES = REGISTRY.counter(
+    "highkick_job_reclaimed_bytes_total", "Bytes of job artifacts deleted by retention", ["reason"]
+)
+JOB_STORED_BYTES = REGISTRY.gauge(
+    "highkick_job_stored_bytes", "Bytes of artifacts of finished jobs in the job index"
+)
+JOB_DISK_USAGE = REGISTRY.gauge(
+    "highkick_job_disk_usage_ratio", "Fraction of the output volume in use"
+)
+JOB_CONCURRENCY = REGISTRY.gauge(
+    "highkick_job_concurrency", "Jobs this worker may run at once, as set by the concurrency controller"
+)
+JOB_CONCURRENCY_CHANGES = REGISTRY.counter(
+    "highkick_job_concurrency_changes_total", "Adjustments of the job concurrency", ["direction", "reason"]
+)
+DB_BROKER_REQUESTS = REGISTRY.counter(
+    "highkick_db_broker_requests_total", "Statements run for job scripts by the database broker", ["database", "outcome"]
+)
+SCRIPT_EXECUTION_TIME = REGISTRY.histogram(
+    "highkick_script_execution_seconds", "Subprocess runtime of ExecutorService.execute_script"
+)
+
+# -------------------------
+# HTTP
+# -------------------------
+
+ARTIFACT_REQUESTS = REGISTRY.counter(
+    "highkick_artifact_requests_total", "Artifact download requests", ["artifact", "mode"]
+)
+ARTIFACT_BYTES = REGISTRY.counter(
+    "highkick_artifact_bytes_total", "Bytes of artifacts streamed by the agent", ["artifact"]
+)
+AUTH_FAILURES = REGISTRY.counter(
+    "highkick_auth_failures_total", "Rejected credentials", ["endpoint"]
+)
+
+# -------------------------
+# Clients
+# -------------------------
+
+CLIENT_LATENCY = REGISTRY.histogram(
+    "highkick_client_request_seconds", "Latency of S3 and Bedrock calls", ["client", "operation"]
+)
+CLIENT_ERRORS = REGISTRY.counter(
+    "highkick_client_errors_total", "Failed S3 and Bedrock calls", ["client", "operation"]
+)
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "highkick_log_records_dropped_total", "Log records dropped because the log queue was full"
+)
+CACHE_STATS = REGISTRY.gauge(
+    "highkick_cache", "Local cache statistics", ["cache", "stat"]
+)
+
+
+def _is_not_modified(exc: BaseException) -> bool:
+    # botocore raises ClientError for a 304 answer to a conditional GET, which
+    # is a successful revalidation (the S3 cache relies on it), not a failure
+    response = getattr(exc, "response", None)
+    if not isinstance(response, dict):
+        return False
+    code = response.get("Error", {}).get("Code")
+    return code in ("304", "NotModified") or response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304
+
+
+@contextmanager
+def track_client_call(client: str, operation: str) -> Iterator[None]:
+    """Record latency of a client call and count it as an error if it raises (304s excepted)."""
+    started = time.perf_counter()
+    try:
+        with start_span(f"{client}.{operation}"):
+            yield
+    except BaseException as exc:
+        if not _is_not_modified(exc):
+            CLIENT_ERRORS.inc(client=client, operation=operation)
+        raise
+    finally:
+        CLIENT_LATENCY.observe(time.perf_counter() - started, client=client, operation=operation)
+
+
+def register_cache_stats(name: str, stats: Callable[[], Dict[str, int]]) -> None:
+    for stat in ("hits", "misses", "evictions", "entries", "bytes"):
+        CACHE_STATS.set_function(lambda stat=stat: stats()[stat], cache=name, stat=stat)
+
+
+class InstrumentedClient:
+    """
+    Proxy around a boto/aioboto client that records latency and errors
+    of every API call under the method name.
+    """
+    def __init__(self, client: Any, name: str):
+        self._client = client
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        target = getattr(self._client, attr)
+        if attr.startswith("_") or attr in ("get_paginator", "get_waiter", "can_paginate") or not callable(target):
+            return target
+
+        if inspect.iscoroutinefunction(target):
+            @functools.wraps(target)
+            async def _async_call(*args: Any, **kwargs: Any) -> Any:
+                with track_client_call(self._name, attr):
+                    return await target(*args, **kwargs)
+            return _async_call
+
+        @functools.wraps(target)
+        def _call(*args: Any, **kwargs: Any) -> Any:
+            with track_client_call(self._name, attr):
+                return target(*args, **kwargs)
+        return _call
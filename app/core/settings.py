@@ -1,8 +1,7 @@
 from functools import cached_property
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from sqlalchemy import URL
 
 class AuthSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="AUTH_")
@@ -20,16 +19,190 @@ class GitSettings(BaseSettings):
 class AWSSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="AWS_")
     REGION_NAME: str = "us-east-1"
+    # Point at a local S3 stand-in (MinIO, moto server, ...) when set
+    ENDPOINT_URL: Optional[str] = None
+
+    MAX_POOL_CONNECTIONS: int = 50
+    TCP_KEEPALIVE: bool = True
+    CONNECT_TIMEOUT: float = 5
+    READ_TIMEOUT: float = 60
 
 
 class S3Settings(AWSSettings):
     S3_BUCKET: str = "highkick-heap"
+    S3_MAX_CONCURRENCY: int = 16
+
+    S3_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024
+    S3_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024
+    S3_PRESIGNED_URL_EXPIRES_SECONDS: int = 300
+
+    # Upload finished job artifacts to S3 and redirect downloads to presigned URLs
+    S3_JOB_ARTIFACTS_OFFLOAD: bool = False
+    S3_JOB_ARTIFACTS_PREFIX: str = "jobs"
+
+    S3_CACHE_ENABLED: bool = False
+    S3_CACHE_DIRECTORY: str = "/tmp/highkick-agent/s3-cache"
+    S3_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    S3_CACHE_MEMORY_MAX_BYTES: int = 32 * 1024 * 1024
+    # Entries younger than this are served without revalidating the ETag
+    S3_CACHE_FRESHNESS_SECONDS: float = 5
 
 
 class AgentConfig(BaseSettings):
     CONFIG_PATH: str = "./"
 
 
+class LoggingSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="LOG_")
+
+    LEVEL: str = "INFO"
+    FORMAT: Literal["json", "text"] = "json"
+    # Fraction of DEBUG/INFO records kept; warnings and errors are always kept
+    SAMPLE_RATE: float = 1.0
+    QUEUE_SIZE: int = 10000
+
+
+class TracingSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="TRACING_")
+
+    ENABLED: bool = False
+    FILE: str = "/tmp/highkick-agent/traces/spans.jsonl"
+    MAX_BYTES: int = 50 * 1024 * 1024
+    BACKUP_COUNT: int = 5
+
+
+class SchedulerSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="SCHEDULER_")
+
+    # local: each worker runs its own jobs; shared: one file-locked queue for all
+    # workers on the host; cluster: one leased queue for all hosts on a shared
+    # directory; auto: shared when NUMBER_OF_WORKERS > 1
+    MODE: Literal["auto", "local", "shared", "cluster"] = "auto"
+    # Jobs running at once across all workers (per host in cluster mode)
+    SLOTS: int = 1
+    # Queue directory; defaults to <output.directory>/.scheduler
+    DIRECTORY: Optional[str] = None
+    POLL_INTERVAL_SECONDS: float = 0.25
+    RECOVER_INTERVAL_SECONDS: float = 10
+
+    # Cluster mode: host-local slot files and the lease of a claimed job,
+    # renewed every LEASE_SECONDS / 3 while it runs
+    SLOTS_DIRECTORY: str = "/tmp/highkick-agent/scheduler-slots"
+    LEASE_SECONDS: float = 30
+
+    # Admission: at most MAX_QUEUED jobs wait to start (None: unbounded). When
+    # full, POST /jobs answers 429 with Retry-After from the observed drain rate
+    # (reject) or waits up to BLOCK_SECONDS for room first (block)
+    MAX_QUEUED: Optional[int] = 1000
+    OVERFLOW: Literal["reject", "block"] = "reject"
+    BLOCK_SECONDS: float = 10
+    # Jobs not started within this many seconds of submission are dropped;
+    # POST /jobs?deadline_seconds= overrides it per job
+    DEFAULT_DEADLINE_SECONDS: Optional[float] = None
+
+    # Queued jobs start by weighted fair queuing over (priority, tenant) flows
+    # rather than FIFO. The tenant is the TENANT_CLAIM of the access token,
+    # else the TENANT_HEADER request header, else "default"
+    PRIORITY_WEIGHTS: Dict[str, float] = {"interactive": 8.0, "batch": 1.0}
+    TENANT_WEIGHTS: Dict[str, float] = {}
+    TENANT_CLAIM: str = "sub"
+    TENANT_HEADER: Optional[str] = "X-Tenant"
+
+
+class JobStoreSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="JOB_STORE_")
+
+    # filesystem: status and artifacts as files under output.directory;
+    # sqlite: status in the SQLite job index, artifacts as files;
+    # s3: status and artifacts as objects under S3_JOB_ARTIFACTS_PREFIX
+    BACKEND: Literal["filesystem", "sqlite", "s3"] = "filesystem"
+    # SQLite job index behind GET /jobs; defaults to <output.directory>/jobs.sqlite3,
+    # or /tmp/highkick-agent/jobs.sqlite3 in cluster mode, where it must be node-local
+    SQLITE_PATH: Optional[str] = None
+    # Where s3-backed jobs run before their artifacts are uploaded;
+    # defaults to <output.directory>/.scratch
+    SCRATCH_DIRECTORY: Optional[str] = None
+    ARTIFACT_CHUNK_SIZE: int = 1024 * 1024
+
+
+class RetentionSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="RETENTION_")
+
+    # Evict finished jobs, oldest first, while any limit below is exceeded
+    ENABLED: bool = False
+    MAX_AGE_SECONDS: Optional[float] = None
+    MAX_TOTAL_BYTES: Optional[int] = None
+    MAX_JOBS: Optional[int] = None
+    # Fraction of the output volume in use above which finished jobs are evicted
+    MAX_DISK_USAGE: Optional[float] = None
+    INTERVAL_SECONDS: float = 60
+    BATCH_SIZE: int = 500
+    # One worker per host evicts at a time; keep this on a local filesystem
+    LOCK_FILE: str = "/tmp/highkick-agent/retention.lock"
+
+    # New jobs are refused with 507 while the output volume is fuller than
+    # this, retention enabled or not; off by default
+    REJECT_DISK_USAGE: Optional[float] = None
+
+
+class ConcurrencySettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="CONCURRENCY_")
+
+    # Adjust the number of job slots at runtime (AIMD), starting from
+    # SCHEDULER_SLOTS: +INCREASE per interval while jobs are waiting, times
+    # DECREASE_FACTOR when jobs slow down, the host is loaded or memory is short
+    ENABLED: bool = False
+    MIN_SLOTS: int = 1
+    # Default: 4 x CPUs
+    MAX_SLOTS: Optional[int] = None
+    INTERVAL_SECONDS: float = 5
+    INCREASE: int = 1
+    DECREASE_FACTOR: float = 0.75
+    # Median run time of recent jobs over their script's mean run time
+    MAX_SLOWDOWN: float = 1.5
+    # 1-minute load average per CPU
+    MAX_LOAD_PER_CPU: float = 1.0
+    # Fraction of memory not available (MemAvailable in /proc/meminfo)
+    MAX_MEMORY_USAGE: float = 0.9
+
+
+class DatabasePoolSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="DATABASE_POOL_")
+
+    # asyncpg pools for SQL jobs, one per database of the config, opened on
+    # first use
+    MIN_SIZE: int = 1
+    MAX_SIZE: int = 5
+    MAX_INACTIVE_SECONDS: float = 300
+    # Rows fetched from the server-side cursor per round trip
+    FETCH_ROWS: int = 1000
+    # Same limit as scripts
+    QUERY_TIMEOUT_SECONDS: float = 600
+
+
+class DatabaseBrokerSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="DATABASE_BROKER_")
+
+    # Serve the database pools to job scripts on one Unix socket per database,
+    # in DIRECTORY/<pid>/, with the highkick_db helper module next to them
+    ENABLED: bool = False
+    DIRECTORY: str = "/tmp/highkick-agent/db-broker"
+    # Wait for a free pooled connection at most this long
+    ACQUIRE_TIMEOUT_SECONDS: float = 30
+
+
+class DashboardRefreshSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="DASHBOARD_REFRESH_")
+
+    ENABLED: bool = False
+    DEFAULT_INTERVAL_SECONDS: float = 15 * 60
+    JITTER_SECONDS: float = 30
+    # One worker per host schedules the refreshes, the one holding this flock;
+    # in cluster mode it also needs a lease in the shared queue directory
+    LOCK_FILE: str = "/tmp/highkick-agent/dashboard-refresh.lock"
+    LEADER_CHECK_SECONDS: float = 10
+
+
 class BedrockClientSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="BEDROCK_")
 
@@ -46,6 +219,10 @@ class BedrockClientSettings(BaseSettings):
     ADMIN_MODEL_ARN: str = "arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-sonnet-20240229-v1:0"
     ADMIN_RETRIEVAL_RESULTS: int = 10
 
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_DIRECTORY: str = "/tmp/highkick-agent/llm-cache"
+    RESPONSE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
@@ -70,6 +247,15 @@ class Settings(BaseSettings):
     bedrock: BedrockClientSettings = BedrockClientSettings()
     s3: S3Settings = S3Settings()
     agent_config: AgentConfig = AgentConfig()
+    scheduler: SchedulerSettings = SchedulerSettings()
+    job_store: JobStoreSettings = JobStoreSettings()
+    retention: RetentionSettings = RetentionSettings()
+    concurrency: ConcurrencySettings = ConcurrencySettings()
+    database_pool: DatabasePoolSettings = DatabasePoolSettings()
+    database_broker: DatabaseBrokerSettings = DatabaseBrokerSettings()
+    dashboard_refresh: DashboardRefreshSettings = DashboardRefreshSettings()
+    tracing: TracingSettings = TracingSettings()
+    logging: LoggingSettings = LoggingSettings()
 
 
 settings = Settings()
@@ -1,5 +1,11 @@
 import asyncio
-from typing import Any, Awaitable, Callable, Optional, Tuple
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
 
 import asyncio
 from contextlib import asynccontextmanager
@@ -7,66 +13,306 @@ from typing import AsyncGenerator, Callable, Coroutine
 
 from fastapi import FastAPI
 
+from app.core.metrics import (
+    TASK_POOL_ACTIVE,
+    TASK_POOL_QUEUE_DEPTH,
+    TASK_POOL_QUEUE_WAIT,
+    TASK_POOL_SIZE,
+    TASK_POOL_TASKS,
+)
+from app.core.tracing import SpanContext, current_span_context, start_span
+
 TaskFn = Callable[..., Awaitable[Any]]
 CoroutineType = Callable[[], Coroutine]
 
+logger = logging.getLogger(__name__)
+
+
+# Retry-After bounds when the drain rate is unknown or very slow
+MIN_RETRY_AFTER_SECONDS = 1
+MAX_RETRY_AFTER_SECONDS = 300
+
+
+class QueueFullError(Exception):
+    """No room for another job; `retry_after` is the estimated wait in seconds."""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DrainRate:
+    """Rate at which queued work starts, over a sliding window."""
+    def __init__(self, window_seconds: float = 60.0):
+        self._window = window_seconds
+        self._starts: Deque[float] = deque()
+
+    def record(self) -> None:
+        self._starts.append(time.monotonic())
+
+    def per_second(self) -> float:
+        cutoff = time.monotonic() - self._window
+        while self._starts and self._starts[0] < cutoff:
+            self._starts.popleft()
+        return len(self._starts) / self._window
+
+    def retry_after(self, queued: int) -> int:
+        """Seconds until `queued` tasks ahead have started at the current rate."""
+        rate = self.per_second()
+        if rate <= 0:
+            return MAX_RETRY_AFTER_SECONDS
+        return min(MAX_RETRY_AFTER_SECONDS, max(MIN_RETRY_AFTER_SECONDS, math.ceil(queued / rate)))
+
+
+DEFAULT_TENANT = "default"
+DEFAULT_PRIORITY_WEIGHTS = {"interactive": 8.0, "batch": 1.0}
+
+
+class Flow(NamedTuple):
+    """Who a task is queued for; each flow gets its weighted share of the pool."""
+    priority: str = "interactive"
+    tenant: str = DEFAULT_TENANT
+
+
+def flow_weight(flow: Flow, priority_weights: Dict[str, float], tenant_weights: Dict[str, float]) -> float:
+    """A flow's share: its priority weight times its tenant weight, each 1 when not listed."""
+    return priority_weights.get(flow.priority, 1.0) * tenant_weights.get(flow.tenant, 1.0)
+
+
+class QueuePosition(NamedTuple):
+    # Tasks that start before this one, as things stand
+    position: int
+    # None until the pool has started something in the last minute
+    eta_seconds: Optional[float]
+
+
+class QueuedTask(NamedTuple):
+    fn: TaskFn
+    args: tuple
+    kwargs: dict
+    future: asyncio.Future
+    enqueued_at: float
+    enqueued_ns: int
+    span_context: Optional[SpanContext]
+    flow: Flow = Flow()
+    key: Optional[str] = None
+
+
+class FairQueue(asyncio.Queue):
+    """
+    An asyncio.Queue that hands out tasks by weighted fair queuing over flows
+    (priority class, tenant) instead of arrival order.
+    - A task is tagged max(virtual time, its flow's last tag) + 1 / weight and
+      the smallest tag goes first (self-clocked fair queuing). Virtual time is
+      the tag of the last task handed out.
+    - A flow's weight is its priority weight times its tenant weight (default
+      1), so 500 batch jobs from one tenant get that flow's share of the pool,
+      not all of it, and a flow that was idle does not bank credit.
+    - Tasks of one flow keep their arrival order.
+    """
+    def __init__(
+        self,
+        priority_weights: Optional[Dict[str, float]] = None,
+        tenant_weights: Optional[Dict[str, float]] = None,
+    ):
+        # Set before Queue.__init__, which calls _init()
+        self._priority_weights = priority_weights or DEFAULT_PRIORITY_WEIGHTS
+        self._tenant_weights = tenant_weights or {}
+        super().__init__()
+
+    def weight(self, flow: Flow) -> float:
+        return flow_weight(flow, self._priority_weights, self._tenant_weights)
+
+    def _init(self, maxsize: int) -> None:
+        # Named as in asyncio.PriorityQueue; Queue.empty() reads it
+        self._queue: List[Tuple[float, int, QueuedTask]] = []
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        # Last tag per flow with tasks queued
+        self._last_tags: Dict[Flow, float] = {}
+
+    def _qsize(self) -> int:
+        return len(self._queue)
+
+    def _put(self, task: QueuedTask) -> None:
+        tag = max(self._vtime, self._last_tags.get(task.flow, 0.0)) + 1.0 / self.weight(task.flow)
+        self._last_tags[task.flow] = tag
+        heapq.heappush(self._queue, (tag, next(self._seq), task))
+
+    def _get(self) -> QueuedTask:
+        tag, _, task = heapq.heappop(self._queue)
+        self._vtime = tag
+        if self._last_tags.get(task.flow) == tag:
+            # That was the flow's last queued task
+            del self._last_tags[task.flow]
+        return task
+
+    def position(self, key: str) -> Optional[int]:
+        """Tasks ahead of the one added with `key`; None if it is not queued. O(n)."""
+        mine = next((entry[:2] for entry in self._queue if entry[2].key == key), None)
+        if mine is None:
+            return None
+        return sum(1 for entry in self._queue if entry[:2] < mine)
+
+
 class AsyncTaskPool:
     """
-    A FIFO async task pool with bounded concurrency.
-    - add_task(fn, *args, **kwargs) enqueues a coroutine function call.
-    - The first added tasks are the first to start executing (up to `pool_size` in parallel).
+    An async task pool with bounded concurrency.
+    - add_task(fn, *args, **kwargs) enqueues a coroutine function call;
+      enqueue(..., flow=Flow(priority, tenant), key=...) queues it for a flow.
+    - Up to `pool_size` tasks run in parallel. Waiting tasks start in weighted
+      fair order across flows (see FairQueue), in arrival order within one.
+    - resize(n) changes `pool_size` at runtime; running tasks are never
+      interrupted, surplus workers stop once their current task is done.
     - Each add_task() returns an awaitable Future for that task's result.
+    - With `max_queued`, callers check `has_room()` / `wait_for_room()` before
+      adding; add_task() itself never refuses, so internal work is not dropped.
     - Use `await pool.aclose()` (or async context manager) for graceful shutdown.
     """
-    def __init__(self, pool_size: int):
+    def __init__(
+        self,
+        pool_size: int,
+        max_queued: Optional[int] = None,
+        priority_weights: Optional[Dict[str, float]] = None,
+        tenant_weights: Optional[Dict[str, float]] = None,
+    ):
         if pool_size < 1:
             raise ValueError("pool_size must be >= 1")
         self._pool_size = pool_size
-        self._queue: asyncio.Queue[
-            Tuple[TaskFn, tuple, dict, asyncio.Future]
-        ] = asyncio.Queue()
-        self._workers: list[asyncio.Task] = []
+        self._max_queued = max_queued
+        self._queue = FairQueue(priority_weights, tenant_weights)
+        self._dequeued = asyncio.Condition()
+        self.drain_rate = DrainRate()
+        self._workers: Dict[int, asyncio.Task] = {}
+        # Workers waiting in get(), with no task in hand
+        self._idle: Set[int] = set()
         self._closed = False
         self._start_workers()
-        print("AsyncTaskPool created")
+        logger.info("AsyncTaskPool created", extra={"pool_size": pool_size})
 
     def _start_workers(self) -> None:
-        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self._pool_size)]
+        for wid in range(self._pool_size):
+            if wid not in self._workers:
+                self._workers[wid] = asyncio.create_task(self._worker(wid))
 
     async def _worker(self, wid: int) -> None:
         try:
-            while True:
-                fn, args, kwargs, fut = await self._queue.get()
+            while wid < self._pool_size:
+                self._idle.add(wid)
+                task = await self._queue.get()
+                self._idle.discard(wid)
+                self.drain_rate.record()
+                async with self._dequeued:
+                    self._dequeued.notify_all()
+                fut = task.future
                 if fut.cancelled():
+                    TASK_POOL_TASKS.inc(outcome="cancelled")
                     self._queue.task_done()
                     continue
+                TASK_POOL_QUEUE_WAIT.observe(time.monotonic() - task.enqueued_at)
+                TASK_POOL_ACTIVE.inc()
+                # Spans of the task continue the trace of the caller that enqueued it
+                with start_span("task_pool.queued", parent=task.span_context, start_ns=task.enqueued_ns):
+                    pass
                 try:
-                    # Run the user coroutine
-                    result = await fn(*args, **kwargs)
+                    with start_span("task_pool.run", parent=task.span_context, attributes={"worker": wid}):
+                        # Run the user coroutine
+                        result = await task.fn(*task.args, **task.kwargs)
                 except Exception as exc:
+                    TASK_POOL_TASKS.inc(outcome="error")
                     if not fut.done():
                         fut.set_exception(exc)
                 else:
+                    TASK_POOL_TASKS.inc(outcome="success")
                     if not fut.done():
                         fut.set_result(result)
                 finally:
+                    TASK_POOL_ACTIVE.dec()
                     self._queue.task_done()
         except asyncio.CancelledError:
             # Drain: if canceled, just exit
             pass
+        finally:
+            self._idle.discard(wid)
+            if self._workers.get(wid) is asyncio.current_task():
+                del self._workers[wid]
 
     def add_task(self, fn: TaskFn, *args, **kwargs) -> "asyncio.Future[Any]":
         """
-        Enqueue a coroutine function (not a coroutine object).
+        Enqueue a coroutine function (not a coroutine object) in the default flow.
         Returns a Future that resolves/rejects with the task's result/exception.
         """
+        return self.enqueue(fn, args, kwargs)
+
+    def enqueue(
+        self,
+        fn: TaskFn,
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        flow: Flow = Flow(),
+        key: Optional[str] = None,
+    ) -> "asyncio.Future[Any]":
+        """
+        Enqueue fn(*args, **kwargs) for `flow`. `key` (a job id) lets
+        `queue_position()` find it while it waits.
+        """
         if self._closed:
             raise RuntimeError("Pool is closed; cannot add new tasks.")
         fut: asyncio.Future = asyncio.get_event_loop().create_future()
-        # FIFO: asyncio.Queue preserves put() order; workers consume in that order
-        self._queue.put_nowait((fn, args, kwargs, fut))
+        self._queue.put_nowait(QueuedTask(
+            fn=fn,
+            args=args,
+            kwargs=kwargs or {},
+            future=fut,
+            enqueued_at=time.monotonic(),
+            enqueued_ns=time.time_ns(),
+            span_context=current_span_context(),
+            flow=flow,
+            key=key,
+        ))
         return fut
 
+    def qsize(self) -> int:
+        """Number of tasks waiting to start."""
+        return self._queue.qsize()
+
+    def has_room(self) -> bool:
+        return self._max_queued is None or self._queue.qsize() < self._max_queued
+
+    async def wait_for_room(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the queue to have room. False on timeout."""
+        async with self._dequeued:
+            try:
+                await asyncio.wait_for(self._dequeued.wait_for(self.has_room), timeout=timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def retry_after(self) -> int:
+        return self.drain_rate.retry_after(self._queue.qsize())
+
+    def queue_position(self, key: str) -> Optional[QueuePosition]:
+        position = self._queue.position(key)
+        if position is None:
+            return None
+        rate = self.drain_rate.per_second()
+        return QueuePosition(position, (position + 1) / rate if rate > 0 else None)
+
+    @property
+    def pool_size(self) -> int:
+        return self._pool_size
+
+    def resize(self, pool_size: int) -> None:
+        """Run up to `pool_size` tasks at once from now on."""
+        if pool_size < 1:
+            raise ValueError("pool_size must be >= 1")
+        self._pool_size = pool_size
+        # Idle surplus workers hold nothing; a task handed to one that has not
+        # resumed yet stays in the queue for the next getter
+        for wid in [wid for wid in self._idle if wid >= pool_size]:
+            self._workers.pop(wid).cancel()
+        if not self._closed:
+            self._start_workers()
+
     async def join(self) -> None:
         """Wait until all currently enqueued tasks are processed."""
         await self._queue.join()
@@ -78,15 +324,16 @@ class AsyncTaskPool:
         """
         if self._closed:
             return
-        print("AsyncTaskPool stopping...")
+        logger.info("AsyncTaskPool stopping")
         self._closed = True
         # Wait for queue to drain
         await self._queue.join()
         # Cancel workers and wait for them to finish
-        for w in self._workers:
+        workers = list(self._workers.values())
+        for w in workers:
             w.cancel()
-        await asyncio.gather(*self._workers, return_exceptions=True)
-        print("AsyncTaskPool stopped")
+        await asyncio.gather(*workers, return_exceptions=True)
+        logger.info("AsyncTaskPool stopped")
 
     # Async context manager convenience
     async def __aenter__(self) -> "AsyncTaskPool":
@@ -98,8 +345,16 @@ class AsyncTaskPool:
 
 def init_task_pool(app: FastAPI) -> CoroutineType:
     async def _init() -> None:
-        pool = AsyncTaskPool(1)
+        settings = app.state.settings.scheduler
+        pool = AsyncTaskPool(
+            settings.SLOTS,
+            max_queued=settings.MAX_QUEUED,
+            priority_weights=settings.PRIORITY_WEIGHTS,
+            tenant_weights=settings.TENANT_WEIGHTS,
+        )
         app.state.task_pool = pool
+        TASK_POOL_QUEUE_DEPTH.set_function(pool.qsize)
+        TASK_POOL_SIZE.set_function(lambda: pool.pool_size)
 
     return _init
 
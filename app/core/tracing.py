@@ -0,0 +1,289 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import secrets
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Coroutine, Dict, Iterator, Optional
+
+from fastapi import FastAPI, Request
+
+from app.core.settings import TracingSettings
+
+CoroutineType = Callable[[], Coroutine]
+
+TRACEPARENT_ENV = "TRACEPARENT"
+SPANS_FILE_ENV = "HIGHKICK_TRACE_SPANS_FILE"
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    trace_id: str
+    span_id: str
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @staticmethod
+    def from_traceparent(value: Optional[str]) -> Optional["SpanContext"]:
+        if not value:
+            return None
+        parts = value.strip().split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        return SpanContext(trace_id=parts[1], span_id=parts[2])
+
+
+@dataclass
+class Span:
+    name: str
+    context: SpanContext
+    parent_span_id: Optional[str] = None
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @staticmethod
+    def _attribute_value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def to_otel(self, service_name: str) -> Dict[str, Any]:
+        """One span in the OTLP/JSON shape, with its resource inlined."""
+        return {
+            "resource": {
+                "attributes": [{"key": "service.name", "value": {"stringValue": service_name}}],
+            },
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [
+                {"key": key, "value": self._attribute_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": (
+                {"code": "STATUS_CODE_ERROR", "message": self.error}
+                if self.error is not None
+                else {"code": "STATUS_CODE_OK"}
+            ),
+        }
+
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar(
+    "highkick_current_span", default=None
+)
+
+
+class Tracer:
+    """
+    Records spans and hands them to a background thread that appends them
+    to a rotating JSON-lines file. Recording never blocks on file I/O.
+    """
+    def __init__(self) -> None:
+        self.enabled = False
+        self._service_name = ""
+        self._logger = logging.getLogger("highkick.spans")
+        self._logger.propagate = False
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+    def configure(self, settings: TracingSettings, service_name: str) -> None:
+        self.shutdown()
+        if not settings.ENABLED:
+            return
+
+        Path(settings.FILE).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            settings.FILE,
+            maxBytes=settings.MAX_BYTES,
+            backupCount=settings.BACKUP_COUNT,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+
+        span_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._queue_handler = logging.handlers.QueueHandler(span_queue)
+        self._listener = logging.handlers.QueueListener(span_queue, file_handler)
+        self._listener.start()
+
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(self._queue_handler)
+        self._service_name = service_name
+        self.enabled = True
+
+    def shutdown(self) -> None:
+        self.enabled = False
+        if self._queue_handler is not None:
+            self._logger.removeHandler(self._queue_handler)
+            self._queue_handler = None
+        if self._listener is not None:
+            # Flushes the queue and joins the writer thread
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+    def export(self, span: Dict[str, Any]) -> None:
+        if self.enabled:
+            self._logger.info(json.dumps(span))
+
+    def finish(self, span: Span) -> None:
+        span.end_ns = span.end_ns or time.time_ns()
+        self.export(span.to_otel(self._service_name))
+
+    def new_span(self, name: str, parent: Optional[SpanContext], attributes: Optional[Dict[str, Any]] = None) -> Span:
+        trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        return Span(
+            name=name,
+            context=SpanContext(trace_id=trace_id, span_id=secrets.token_hex(8)),
+            parent_span_id=parent.span_id if parent is not None else None,
+            attributes=dict(attributes or {}),
+        )
+
+
+TRACER = Tracer()
+
+
+def current_span_context() -> Optional[SpanContext]:
+    return _current.get()
+
+
+@contextmanager
+def use_span_context(context: Optional[SpanContext]) -> Iterator[None]:
+    """Make `context` the parent of spans started inside the block."""
+    token = _current.set(context)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def start_span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    parent: Optional[SpanContext] = None,
+    start_ns: Optional[int] = None,
+) -> Iterator[Optional[Span]]:
+    """
+    Start a child of the current span (or of `parent`) for the duration of the block.
+    Yields None when tracing is disabled.
+    """
+    if not TRACER.enabled:
+        yield None
+        return
+
+    span = TRACER.new_span(name, parent or _current.get(), attributes)
+    if start_ns is not None:
+        span.start_ns = start_ns
+    token = _current.set(span.context)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _current.reset(token)
+        TRACER.finish(span)
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of start_span for sync and async functions."""
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def _async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with start_span(name):
+                    return await fn(*args, **kwargs)
+            return _async_wrapper
+
+        @functools.wraps(fn)
+        def _wrapper(*args: Any, **kwargs: Any) -> Any:
+            with start_span(name):
+                return fn(*args, **kwargs)
+        return _wrapper
+
+    return decorator
+
+
+def subprocess_env(spans_file: str) -> Dict[str, str]:
+    """
+    Environment for a job subprocess: the W3C traceparent of the current span
+    and a file where the script may append its own child spans (one OTLP/JSON span per line).
+    """
+    context = _current.get()
+    if not TRACER.enabled or context is None:
+        return {}
+    return {TRACEPARENT_ENV: context.traceparent, SPANS_FILE_ENV: spans_file}
+
+
+def ingest_spans_file(path: str) -> int:
+    """Export spans written by a job subprocess, then remove the file. Blocking."""
+    if not TRACER.enabled or not os.path.exists(path):
+        return 0
+    count = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(span, dict) and "traceId" in span and "spanId" in span:
+                span.setdefault("resource", {
+                    "attributes": [{"key": "service.name", "value": {"stringValue": "highkick-job"}}],
+                })
+                TRACER.export(span)
+                count += 1
+    os.remove(path)
+    return count
+
+
+async def tracing_middleware(request: Request, call_next: Callable) -> Any:
+    if not TRACER.enabled:
+        return await call_next(request)
+
+    parent = SpanContext.from_traceparent(request.headers.get("traceparent"))
+    with start_span(
+        f"{request.method} {request.url.path}",
+        attributes={"http.method": request.method, "http.target": request.url.path},
+        parent=parent,
+    ) as span:
+        response = await call_next(request)
+        span.set_attribute("http.status_code", response.status_code)
+        response.headers["traceparent"] = span.context.traceparent
+        return response
+
+
+def init_tracing(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        TRACER.configure(app.state.settings.tracing, app.state.settings.SERVICE_NAME)
+
+    return _init
+
+
+def close_tracing(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        TRACER.shutdown()
+
+    return _close
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, Response, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.core.dependencies import get_settings
+from app.core.metrics import REGISTRY
 from app.core.settings import GitSettings
 
 router = APIRouter()
@@ -19,3 +20,11 @@ async def health(
     return JSONResponse(
         content=response_content, status_code=status.HTTP_200_OK
     )
+
+
+@router.get("/metrics")
+async def metrics() -> Response:
+    return PlainTextResponse(
+        content=REGISTRY.render(),
+        media_type="text/plain; version=0.0.4",
+    )
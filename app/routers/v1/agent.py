@@ -1,7 +1,8 @@
 from subprocess import TimeoutExpired
 import uuid
 from datetime import datetime, timedelta, timezone
-from typing import List
+from pathlib import Path
+from typing import List, Literal, Optional
 import json
 import os
 import shutil
@@ -10,24 +11,31 @@ from fastapi import (
     APIRouter,
     status,
     Depends,
-    Body
+    Body,
+    Query
 )
-from fastapi.responses import StreamingResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi import APIRouter, Depends, status, HTTPException, Response
 from fastapi.concurrency import run_in_threadpool
 
 
-from app.core.task_pool import AsyncTaskPool
-from app.core.dependencies import get_settings, get_executor, get_auth_access, get_task_pool
+from app.clients.postgres import DatabasePools
+from app.clients.s3 import S3Client
+from app.core.dependencies import get_settings, get_executor, get_auth_access, get_job_scheduler, get_job_store, get_retention, get_artifact_s3_client, get_tenant, get_database_pools
 from app.core.agent_job import AgentJob
-from app.core.exceptions import NotFoundException
-from app.core.settings import AuthSettings
-from app.schemas.agent import JobProduceSchema, StatusSchema
+from app.core.job_store import DATA_FILE, ERROR_FILE, STD_OUTPUT_FILE, JobStore
+from app.core.exceptions import JobQueueFullException, NotFoundException, StorageFullException, UnknownDatabaseException
+from app.core.metrics import ARTIFACT_BYTES, ARTIFACT_REQUESTS, JOBS_REJECTED
+from app.core.tracing import traced
+from app.core.settings import AuthSettings, SchedulerSettings
+from app.core.task_pool import Flow, QueueFullError
+from app.core.job_costs import COST_LEDGER
+from app.schemas.agent import JobPriority, JobProduceSchema, JobState, JobSummarySchema, ScriptCostSchema, StatusSchema
 from app.schemas.error import ErrorSchema
+from app.schemas.page import PageProduceSchema
 from app.service.executor import ExecutorService
-
-import jwt
-from passlib.context import CryptContext
+from app.service.job_scheduler import JobScheduler
+from app.service.retention import RetentionEngine
 
 router = APIRouter()
 
@@ -41,55 +49,153 @@ router = APIRouter()
             "model": ErrorSchema,
             "description": "Unknown error",
         },
+        status.HTTP_429_TOO_MANY_REQUESTS: {
+            "model": ErrorSchema,
+            "description": "Job queue is full; retry after Retry-After seconds",
+        },
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "model": ErrorSchema,
+            "description": "Unknown database",
+        },
+        status.HTTP_507_INSUFFICIENT_STORAGE: {
+            "model": ErrorSchema,
+            "description": "Job output volume is full; retry after Retry-After seconds",
+        },
     },
 )
+@traced("start_job")
 async def start_job(
     script: str = Body(..., media_type="text/plain"),
+    profile: bool = Query(False, description="Run the script under the profiler"),
+    priority: JobPriority = Query("interactive", description="interactive jobs get a larger share of the pool"),
+    database: Optional[str] = Query(
+        None, description="Run the body as SQL on this database of the config instead of as a Python script"
+    ),
+    deadline_seconds: Optional[float] = Query(
+        None, gt=0, description="Drop the job if it has not started this many seconds after submission"
+    ),
+    scheduler_settings: SchedulerSettings = Depends(get_settings(SchedulerSettings)),
     executor: ExecutorService = Depends(get_executor),
-    task_pool: AsyncTaskPool = Depends(get_task_pool),
+    job_scheduler: JobScheduler = Depends(get_job_scheduler),
+    job_store: JobStore = Depends(get_job_store),
+    retention: Optional[RetentionEngine] = Depends(get_retention),
+    s3_client: Optional[S3Client] = Depends(get_artifact_s3_client),
+    tenant: str = Depends(get_tenant),
+    database_pools: Optional[DatabasePools] = Depends(get_database_pools),
     auth: dict = Depends(get_auth_access),
 ) -> JobProduceSchema:
     
-    job = AgentJob(base_dir=executor.get_output_dir(), id=str(uuid.uuid4()))
-    job.set_status(StatusSchema())
+    if database is not None and (database_pools is None or database not in database_pools):
+        raise UnknownDatabaseException(database)
+
+    if retention is not None and retention.over_quota():
+        JOBS_REJECTED.inc(reason="disk")
+        raise StorageFullException(retry_after=retention.retry_after_seconds)
 
-    task_pool.add_task(
-        run_job,
+    try:
+        await job_scheduler.admit()
+    except QueueFullError as e:
+        JOBS_REJECTED.inc(reason="queue_full")
+        raise JobQueueFullException(retry_after=e.retry_after)
+
+    submitted = datetime.now()
+    deadline_seconds = deadline_seconds or scheduler_settings.DEFAULT_DEADLINE_SECONDS
+    deadline = submitted + timedelta(seconds=deadline_seconds) if deadline_seconds else None
+
+    job = AgentJob(store=job_store, id=str(uuid.uuid4()))
+    await job.set_status(StatusSchema(time_submitted=submitted, deadline=deadline, priority=priority))
+
+    await job_scheduler.submit(
         job=job,
         executor=executor,
-        script=script
+        script=script,
+        s3_client=s3_client,
+        profile=profile,
+        flow=Flow(priority=priority, tenant=tenant),
+        database=database,
     )    
     
     return JobProduceSchema(id=job.get_id())
 
 
-async def run_job(job: AgentJob, executor: ExecutorService, script: str):
-    
-    configured_script = executor.configure_script(script=script, output_file_path=job.get_data_path_str())
+async def artifact_response(
+    job: AgentJob,
+    name: str,
+    media_type: str,
+    s3_client: Optional[S3Client],
+) -> Response:
+    label = Path(name).stem
 
-    status = StatusSchema()
-    status.time_started = datetime.now()
-    job.set_status(status)
+    if s3_client is not None:
+        job_status = await job.get_status()
+        if job_status is not None and job_status.artifacts_offloaded:
+            if await job.get_artifact_size(name) is None:
+                raise NotFoundException()
+            url = await s3_client.get_presigned_url(
+                key=s3_client.get_job_artifact_key(job.get_id(), name),
+                content_type=media_type,
+            )
+            ARTIFACT_REQUESTS.inc(artifact=label, mode="redirect")
+            return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
 
-    try:
-        std_out, err = await run_in_threadpool(
-            executor.execute_script,
-            script=configured_script["script"]
-        )
-    except TimeoutExpired as e:
-        std_out = ""
-        err = f"Timeout expired after {e.timeout} seconds"
+    artifact = await job.open_artifact(name)
+    if artifact is None:
+        raise NotFoundException()
 
-    finally:
-        pass
+    ARTIFACT_REQUESTS.inc(artifact=label, mode="local")
+    ARTIFACT_BYTES.inc(artifact.size, artifact=label)
+    return StreamingResponse(
+        artifact.chunks,
+        media_type=media_type,
+        headers={"Content-Length": str(artifact.size)},
+    )
 
-    status.time_completed = datetime.now()
-    status.error = not (not err or err.strip() == "")
 
-    job.set_std_output(std_out)
-    job.set_error(err)        
+@router.get(
+    "/jobs",
+    response_model=PageProduceSchema,
+    status_code=status.HTTP_200_OK,
+    name="List jobs",
+    responses={
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {
+            "model": ErrorSchema,
+            "description": "Unknown error",
+        },
+    },
+)
+async def list_jobs(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=1000),
+    state: Optional[JobState] = Query(None, description="Only jobs in this state"),
+    job_store: JobStore = Depends(get_job_store),
+    auth: dict = Depends(get_auth_access),
+) -> PageProduceSchema:
+    total, entries = await job_store.list_jobs(offset=offset, limit=limit, state=state)
+    return PageProduceSchema(
+        total=total,
+        offset=offset,
+        limit=limit,
+        items=[JobSummarySchema(**entry._asdict()) for entry in entries],
+    )
 
-    job.set_status(status)
+
+@router.get(
+    "/jobs/costs",
+    response_model=List[ScriptCostSchema],
+    status_code=status.HTTP_200_OK,
+    name="Get job cost report",
+    responses={
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {
+            "model": ErrorSchema,
+            "description": "Unknown error",
+        },
+    },
+)
+async def get_job_costs(
+    limit: int = 100,
+    auth: dict = Depends(get_auth_access),
+) -> List[ScriptCostSchema]:
+    return COST_LEDGER.report(limit=limit)
 
 
 @router.get(
@@ -106,13 +212,18 @@ async def run_job(job: AgentJob, executor: ExecutorService, script: str):
 )
 async def get_job_status(
     job_id: str,
-    executor: ExecutorService = Depends(get_executor),
+    job_store: JobStore = Depends(get_job_store),
+    job_scheduler: JobScheduler = Depends(get_job_scheduler),
     auth: dict = Depends(get_auth_access),
 ) -> StatusSchema:
-    job = AgentJob(base_dir=executor.get_output_dir(), id=job_id)
-    status = job.get_status()
+    job = AgentJob(store=job_store, id=job_id)
+    status = await job.get_status()
     if status is None:
         raise NotFoundException()
+    if status.time_started is None:
+        position = await job_scheduler.queue_position(job_id)
+        if position is not None:
+            status.queue_position, status.eta_seconds = position
     return status
 
 
@@ -129,16 +240,12 @@ async def get_job_status(
 )
 async def get_job_data(
     job_id: str,
-    executor: ExecutorService = Depends(get_executor),
+    job_store: JobStore = Depends(get_job_store),
+    s3_client: Optional[S3Client] = Depends(get_artifact_s3_client),
     auth: dict = Depends(get_auth_access),
-) -> StreamingResponse:
-    job = AgentJob(base_dir=executor.get_output_dir(), id=job_id)
-    path = job.get_data_path()
-    if path is None:
-        raise NotFoundException()
-    
-    file_stream = open(path, mode="rb")
-    return StreamingResponse(file_stream, media_type="application/json")
+) -> Response:
+    job = AgentJob(store=job_store, id=job_id)
+    return await artifact_response(job, DATA_FILE, "application/json", s3_client)
 
 
 
@@ -155,16 +262,12 @@ async def get_job_data(
 )
 async def get_std_output(
     job_id: str,
-    executor: ExecutorService = Depends(get_executor),
+    job_store: JobStore = Depends(get_job_store),
+    s3_client: Optional[S3Client] = Depends(get_artifact_s3_client),
     auth: dict = Depends(get_auth_access),
-) -> StreamingResponse:
-    job = AgentJob(base_dir=executor.get_output_dir(), id=job_id)
-    path = job.get_std_output_path()
-    if path is None:
-        raise NotFoundException()
-    
-    file_stream = open(path, mode="rb")
-    return StreamingResponse(file_stream, media_type="text/plain")
+) -> Response:
+    job = AgentJob(store=job_store, id=job_id)
+    return await artifact_response(job, STD_OUTPUT_FILE, "text/plain", s3_client)
     
 
 
@@ -181,14 +284,38 @@ async def get_std_output(
 )
 async def get_error(
     job_id: str,
-    executor: ExecutorService = Depends(get_executor),
+    job_store: JobStore = Depends(get_job_store),
+    s3_client: Optional[S3Client] = Depends(get_artifact_s3_client),
     auth: dict = Depends(get_auth_access),
-) -> StreamingResponse:
-    job = AgentJob(base_dir=executor.get_output_dir(), id=job_id)
-    path = job.get_error_path()
-    if path is None:
-        raise NotFoundException()
-    
-    file_stream = open(path, mode="rb")
-    return StreamingResponse(file_stream, media_type="text/plain")
-    
\ No newline at end of file
+) -> Response:
+    job = AgentJob(store=job_store, id=job_id)
+    return await artifact_response(job, ERROR_FILE, "text/plain", s3_client)
+
+
+
+PROFILE_MEDIA_TYPES = {
+    "pstats": "application/octet-stream",
+    "collapsed": "text/plain",
+}
+
+
+@router.get(
+    "/jobs/{job_id}/profile",
+    status_code=status.HTTP_200_OK,
+    name="Get profile",
+    responses={
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {
+            "model": ErrorSchema,
+            "description": "Unknown error",
+        },
+    },
+)
+async def get_profile(
+    job_id: str,
+    format: Literal["pstats", "collapsed"] = "collapsed",
+    job_store: JobStore = Depends(get_job_store),
+    s3_client: Optional[S3Client] = Depends(get_artifact_s3_client),
+    auth: dict = Depends(get_auth_access),
+) -> Response:
+    job = AgentJob(store=job_store, id=job_id)
+    return await artifact_response(job, AgentJob.PROFILE_FILES[format], PROFILE_MEDIA_TYPES[format], s3_client)
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import List, Optional
 
 from fastapi import (
     APIRouter,
@@ -9,16 +9,12 @@ from fastapi import (
 from fastapi import APIRouter, Depends, status, HTTPException, Response
 
 from app.core.dependencies import get_settings, get_config_yaml
+from app.core.metrics import AUTH_FAILURES
 from app.core.settings import AuthSettings
 from app.schemas.account import AccountConsumeSchema
 from app.schemas.auth import AccessToken, ServiceToken
 from app.schemas.error import ErrorSchema
 
-import jwt
-from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
-from core.crypto import Crypto
-
 router = APIRouter()
 
 
@@ -46,19 +42,25 @@ async def create_access_token(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    # cryptography and PyJWT are slow to import; most workers never mint tokens
+    from jwt.exceptions import InvalidTokenError
+    from core.crypto import Crypto
+
     try:
-        Crypto.validate_token(
+        claims = Crypto.validate_token(
             token=token.service_token,
             public_key=config_yaml["admin"]["public_key"]
         )
     except InvalidTokenError:
+        AUTH_FAILURES.inc(endpoint="token")
         raise credentials_exception
 
     token = AccessToken(
         access_token=create_token(
             secret=config_yaml["secrets"]["access"],
             algorithm=settings.ALGORITHM,
-            expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+            expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+            subject=claims.get("sub"),
         )
     )
     return token
@@ -67,14 +69,20 @@ async def create_access_token(
 def create_token(
         secret: str,
         algorithm: str,
-        expires_delta: timedelta
+        expires_delta: timedelta,
+        subject: Optional[str] = None,
 ) -> str:
     
+    import jwt
+
     expire = datetime.now(timezone.utc) + expires_delta
 
     to_encode = {
         "exp": expire
     }
+    # The service token's subject; jobs are queued fairly per subject
+    if subject is not None:
+        to_encode["sub"] = subject
 
     encoded_jwt = jwt.encode(to_encode, key=secret, algorithm=algorithm)
     return encoded_jwt
\ No newline at end of file
@@ -1,18 +1,81 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 from app.schemas.base import BaseSchema
 from pydantic import field_serializer
 
 
+class ResourceUsageSchema(BaseSchema):
+    user_cpu_seconds: float = 0
+    system_cpu_seconds: float = 0
+    max_rss_bytes: int = 0
+    block_input_ops: int = 0
+    block_output_ops: int = 0
+    voluntary_context_switches: int = 0
+    involuntary_context_switches: int = 0
+
+    @property
+    def cpu_seconds(self) -> float:
+        return self.user_cpu_seconds + self.system_cpu_seconds
+
+
+JobPriority = Literal["interactive", "batch"]
+
+
 class StatusSchema(BaseSchema):
+    time_submitted: Optional[datetime] = None
     time_started: Optional[datetime] = None
     time_completed: Optional[datetime] = None
+    # Latest start time; a job still queued by then is dropped and marked expired
+    deadline: Optional[datetime] = None
+    priority: Optional[JobPriority] = None
     error: bool = False
+    expired: bool = False
+    artifacts_offloaded: bool = False
+    profiled: bool = False
+    script_hash: Optional[str] = None
+    queue_wait_seconds: Optional[float] = None
+    run_seconds: Optional[float] = None
+    usage: Optional[ResourceUsageSchema] = None
+    # Filled in when the status is served for a queued job; never stored
+    queue_position: Optional[int] = None
+    eta_seconds: Optional[float] = None
 
-    @field_serializer("time_started", "time_completed")
+    @field_serializer("time_submitted", "time_started", "time_completed", "deadline")
     def serialize_dt(self, value: Optional[datetime], _info):
         return value.isoformat() if value else None
 
 
 class JobProduceSchema(BaseSchema):
     id: str
+
+
+JobState = Literal["queued", "running", "completed", "failed", "expired"]
+
+
+class JobSummarySchema(BaseSchema):
+    id: str
+    state: JobState
+    time_submitted: Optional[datetime] = None
+    time_started: Optional[datetime] = None
+    time_completed: Optional[datetime] = None
+    size_bytes: Optional[int] = None
+
+    @field_serializer("time_submitted", "time_started", "time_completed")
+    def serialize_dt(self, value: Optional[datetime], _info):
+        return value.isoformat() if value else None
+
+
+class ScriptCostSchema(BaseSchema):
+    script_hash: str
+    jobs: int = 0
+    errors: int = 0
+    total_cpu_seconds: float = 0
+    total_run_seconds: float = 0
+    total_queue_wait_seconds: float = 0
+    peak_rss_bytes: int = 0
+    total_block_input_ops: int = 0
+    total_block_output_ops: int = 0
+
+    @property
+    def avg_run_seconds(self) -> float:
+        return self.total_run_seconds / self.jobs if self.jobs else 0
@@ -1,5 +1,7 @@
 from typing import Literal, Optional, TypedDict
 
+from app.schemas.base import BaseSchema
+
 ServiceName = Literal["s3"]
 
 
@@ -7,3 +9,15 @@ class Credentials(TypedDict, total=False):
     service_name: str
     region_name: str
     endpoint_url: Optional[str]
+
+
+class S3PutItem(TypedDict, total=False):
+    key: str
+    data: str
+    content_type: Optional[str]
+
+
+class S3KeyResult(BaseSchema):
+    key: str
+    success: bool
+    error: Optional[str] = None
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import math
+import os
+import statistics
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from fastapi import FastAPI
+
+from app.core.metrics import JOB_CONCURRENCY, JOB_CONCURRENCY_CHANGES
+from app.core.settings import ConcurrencySettings
+from app.core.task_pool import CoroutineType
+
+if TYPE_CHECKING:
+    from app.service.job_scheduler import JobScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class SlowdownWindow:
+    """
+    Run time of recently finished jobs relative to the mean run time of the
+    same script, so a mix of short and long scripts still gives a signal.
+    """
+    def __init__(self) -> None:
+        self._ratios: List[float] = []
+
+    def record(self, run_seconds: Optional[float], usual_seconds: Optional[float]) -> None:
+        if run_seconds is not None and usual_seconds:
+            self._ratios.append(run_seconds / usual_seconds)
+
+    def drain(self) -> Optional[float]:
+        """Median ratio since the last call; None when no job finished."""
+        ratios, self._ratios = self._ratios, []
+        return statistics.median(ratios) if ratios else None
+
+
+JOB_SLOWDOWN = SlowdownWindow()
+
+
+def load_per_cpu() -> Optional[float]:
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        return None
+
+
+def memory_usage() -> Optional[float]:
+    """Fraction of memory not available to new processes; None off Linux."""
+    fields = {}
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                fields[name] = int(value.split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    if not fields.get("MemTotal") or "MemAvailable" not in fields:
+        return None
+    return 1 - fields["MemAvailable"] / fields["MemTotal"]
+
+
+class ConcurrencyController:
+    """
+    Grows and shrinks the job slots of a scheduler at runtime (AIMD).
+    Every interval:
+    - shrink to slots x DECREASE_FACTOR if jobs ran slower than usual for
+      their script, the load average per CPU or memory usage is over its limit;
+    - otherwise grow by INCREASE if jobs are waiting for a slot;
+    - always within [MIN_SLOTS, MAX_SLOTS].
+    When the slots are shared by the workers of the host, only the worker
+    holding the scheduler's concurrency lock adjusts them.
+    """
+    def __init__(self, scheduler: "JobScheduler", settings: ConcurrencySettings):
+        self._scheduler = scheduler
+        self._settings = settings
+        self._lock = scheduler.concurrency_lock()
+        self.floor = max(1, settings.MIN_SLOTS)
+        self.ceiling = max(self.floor, settings.MAX_SLOTS or 4 * (os.cpu_count() or 1))
+        self._task: Optional[asyncio.Task] = None
+
+    def _overload(self, slowdown: Optional[float]) -> Optional[str]:
+        settings = self._settings
+        if slowdown is not None and slowdown > settings.MAX_SLOWDOWN:
+            return "latency"
+        load = load_per_cpu()
+        if load is not None and load > settings.MAX_LOAD_PER_CPU:
+            return "load"
+        memory = memory_usage()
+        if memory is not None and memory > settings.MAX_MEMORY_USAGE:
+            return "memory"
+        return None
+
+    async def step(self) -> Tuple[int, Optional[str]]:
+        """One adjustment. Returns the new slot count and why it changed, if it did."""
+        current = self._scheduler.concurrency
+        reason = await asyncio.to_thread(self._overload, JOB_SLOWDOWN.drain())
+        if reason is not None:
+            target = min(current - 1, math.floor(current * self._settings.DECREASE_FACTOR))
+            direction = "down"
+        elif await self._scheduler.saturated():
+            target, reason, direction = current + self._settings.INCREASE, "queued", "up"
+        else:
+            target, direction = current, None
+        target = min(self.ceiling, max(self.floor, target))
+
+        if target == current:
+            return current, None
+        self._scheduler.set_concurrency(target)
+        JOB_CONCURRENCY_CHANGES.inc(direction=direction, reason=reason)
+        logger.info("Job concurrency changed", extra={"from": current, "to": target, "reason": reason})
+        return target, reason
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._settings.INTERVAL_SECONDS)
+            try:
+                if self._lock is not None and not await asyncio.to_thread(self._lock.try_acquire):
+                    continue
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Concurrency adjustment failed")
+
+    def start(self) -> None:
+        # Start inside the bounds even if SCHEDULER_SLOTS is outside them
+        current = self._scheduler.concurrency
+        if not self.floor <= current <= self.ceiling:
+            self._scheduler.set_concurrency(min(self.ceiling, max(self.floor, current)))
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._lock is not None:
+            await asyncio.to_thread(self._lock.release)
+
+
+def init_concurrency(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        scheduler = app.state.job_scheduler
+        JOB_CONCURRENCY.set_function(lambda: scheduler.concurrency)
+        settings: ConcurrencySettings = app.state.settings.concurrency
+        if not settings.ENABLED:
+            # Drop a slot count a controller left from an earlier run
+            scheduler.set_concurrency(app.state.settings.scheduler.SLOTS)
+            return
+        controller = ConcurrencyController(scheduler, settings)
+        controller.start()
+        app.state.concurrency = controller
+
+    return _init
+
+
+def close_concurrency(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        if getattr(app.state, "concurrency", None) is not None:
+            await app.state.concurrency.stop()
+
+    return _close
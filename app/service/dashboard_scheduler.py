@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI
+
+from app.clients.s3 import S3Client
+from app.core.agent_job import AgentJob
+from app.core.job_store import JobStore
+from app.core.leader import HostLock, Leadership, SharedLease
+from app.core.settings import DashboardRefreshSettings
+from app.core.task_pool import CoroutineType, Flow
+from app.schemas.agent import StatusSchema
+from app.service.executor import SCRIPT_TIMEOUT_SECONDS, ExecutorService
+
+from app.service.job_scheduler import JobScheduler, queue_directory
+
+logger = logging.getLogger(__name__)
+
+# Scheduler flow of the scheduled refreshes
+DASHBOARD_TENANT = "dashboards"
+# How often a refresh checks whether its job finished
+COMPLETION_POLL_SECONDS = 1.0
+# Beyond its queue deadline and the script timeout, for writing the final status
+COMPLETION_SLACK_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class ScheduledDashboard:
+    account_id: str
+    dashboard_id: str
+    interval_seconds: float
+
+    @property
+    def name(self) -> str:
+        return f"{self.account_id}/{self.dashboard_id}"
+
+
+class DashboardRefreshScheduler:
+    """
+    Periodically re-runs dashboard scripts through the job pipeline.
+    - Refreshes are submitted to the job scheduler as batch jobs of the
+      dashboards tenant, so in shared and cluster mode they take their turn in
+      the common queue and count against its slots.
+    - Each dashboard refreshes on its own interval, randomized by +/- `jitter_seconds`.
+      A refresh still queued when the next one is due is dropped.
+    - The result is hashed and data.json is only uploaded when the hash changed.
+    - Only the process holding `leadership` schedules; the others check every
+      `leader_check_seconds` and take over when it goes away.
+    """
+    def __init__(
+        self,
+        dashboards: List[ScheduledDashboard],
+        executor: ExecutorService,
+        store: JobStore,
+        job_scheduler: JobScheduler,
+        s3_client: S3Client,
+        jitter_seconds: float,
+        leadership: Leadership,
+        leader_check_seconds: float,
+    ):
+        self._dashboards = dashboards
+        self._executor = executor
+        self._store = store
+        self._job_scheduler = job_scheduler
+        self._s3_client = s3_client
+        self._jitter_seconds = jitter_seconds
+        self._hashes: Dict[str, Optional[str]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._leadership = leadership
+        self._leader_check_seconds = leader_check_seconds
+        self._leader_task: Optional[asyncio.Task] = None
+
+        self.uploads = 0
+        self.skipped = 0
+        self.failures = 0
+
+    @staticmethod
+    def hash_data(data: str) -> str:
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def start(self) -> None:
+        self._leader_task = asyncio.create_task(self._lead())
+
+    async def stop(self) -> None:
+        if self._leader_task is not None:
+            self._leader_task.cancel()
+            await asyncio.gather(self._leader_task, return_exceptions=True)
+            self._leader_task = None
+        await self._stop_loops()
+        await asyncio.to_thread(self._leadership.release)
+
+    async def _stop_loops(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _lead(self) -> None:
+        while True:
+            try:
+                if await asyncio.to_thread(self._leadership.try_acquire):
+                    if not self._tasks:
+                        logger.info("Scheduling dashboard refreshes", extra={"dashboards": len(self._dashboards)})
+                        self._tasks = [asyncio.create_task(self._loop(d)) for d in self._dashboards]
+                elif self._tasks:
+                    logger.warning("Another process took over dashboard refreshes")
+                    await self._stop_loops()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Dashboard refresh leadership check failed")
+            await asyncio.sleep(self._leader_check_seconds)
+
+    def _jitter(self) -> float:
+        return random.uniform(-self._jitter_seconds, self._jitter_seconds)
+
+    async def _loop(self, dashboard: ScheduledDashboard) -> None:
+        # Spread the first runs so a restart does not refresh everything at once
+        await asyncio.sleep(random.uniform(0, max(self._jitter_seconds, 0)))
+        while True:
+            try:
+                await self.refresh(dashboard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error("Failed to refresh dashboard", extra={"dashboard": dashboard.name, "error": str(e)})
+            await asyncio.sleep(max(dashboard.interval_seconds + self._jitter(), 0))
+
+    async def _last_hash(self, dashboard: ScheduledDashboard) -> Optional[str]:
+        if dashboard.name not in self._hashes:
+            # Seed from the published data so the first refresh after start can be skipped too
+            current = await self._s3_client.get_dashboard_data(
+                account_id=dashboard.account_id, dashboard_id=dashboard.dashboard_id
+            )
+            self._hashes[dashboard.name] = None if current is None else self.hash_data(current)
+        return self._hashes[dashboard.name]
+
+    @staticmethod
+    async def _wait_for(job: AgentJob, timeout: float) -> Optional[StatusSchema]:
+        """
+        The job's final status; None when it did not finish within `timeout`,
+        e.g. its worker died or it failed before completing its status.
+        """
+        # In shared mode any worker may run the job; its status in the store is what is shared
+        deadline = time.monotonic() + timeout
+        while True:
+            status = await job.get_status()
+            if status is None or status.time_completed is not None:
+                return status
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(COMPLETION_POLL_SECONDS)
+
+    async def refresh(self, dashboard: ScheduledDashboard) -> bool:
+        """Run the dashboard script once. Returns True when new data was uploaded."""
+        script = await self._s3_client.get_dashboard_script(
+            account_id=dashboard.account_id, dashboard_id=dashboard.dashboard_id
+        )
+        if script is None:
+            logger.warning("Dashboard has no script; skipping refresh", extra={"dashboard": dashboard.name})
+            return False
+
+        job = AgentJob(store=self._store, id=str(uuid.uuid4()))
+        submitted = datetime.now()
+        await job.set_status(
+            StatusSchema(
+                time_submitted=submitted,
+                deadline=submitted + timedelta(seconds=dashboard.interval_seconds),
+                priority="batch",
+            )
+        )
+        await self._job_scheduler.submit(
+            job=job,
+            executor=self._executor,
+            script=script,
+            # Background refreshes yield to jobs someone is waiting for
+            flow=Flow(priority="batch", tenant=DASHBOARD_TENANT),
+        )
+
+        # Started by its queue deadline at the latest, then bounded by the script timeout
+        status = await self._wait_for(
+            job, dashboard.interval_seconds + SCRIPT_TIMEOUT_SECONDS + COMPLETION_SLACK_SECONDS
+        )
+        if status is None:
+            self.failures += 1
+            logger.error(
+                "Dashboard refresh job did not finish", extra={"dashboard": dashboard.name, "job_id": job.get_id()}
+            )
+            return False
+        data = await job.get_data()
+        if status is None or status.error or data is None:
+            self.failures += 1
+            logger.error("Dashboard refresh job failed", extra={"dashboard": dashboard.name, "job_id": job.get_id()})
+            return False
+
+        digest = self.hash_data(data)
+        if digest == await self._last_hash(dashboard):
+            self.skipped += 1
+            return False
+
+        result = await self._s3_client.put_dashboard_data(
+            account_id=dashboard.account_id, dashboard_id=dashboard.dashboard_id, data=data
+        )
+        if not result.success:
+            self.failures += 1
+            return False
+
+        self._hashes[dashboard.name] = digest
+        self.uploads += 1
+        return True
+
+
+def init_dashboard_scheduler(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        settings: DashboardRefreshSettings = app.state.settings.dashboard_refresh
+        shared_s3 = getattr(app.state, "aws_clients", {}).get("s3")
+        if not settings.ENABLED or shared_s3 is None:
+            return
+
+        executor = ExecutorService(agent_config=app.state.settings.agent_config)
+        dashboards = [
+            ScheduledDashboard(
+                account_id=str(item["account_id"]),
+                dashboard_id=str(item["dashboard_id"]),
+                interval_seconds=float(item.get("interval_seconds", settings.DEFAULT_INTERVAL_SECONDS)),
+            )
+            for item in executor.get_dashboards()
+        ]
+
+        scheduler_settings = app.state.settings.scheduler
+        locks = [HostLock(settings.LOCK_FILE)]
+        check_seconds = settings.LEADER_CHECK_SECONDS
+        if scheduler_settings.MODE == "cluster":
+            directory = queue_directory(scheduler_settings, executor.get_output_dir())
+            locks.append(SharedLease(f"{directory}/dashboard-refresh.lease", scheduler_settings.LEASE_SECONDS))
+            # Renew well within the lease
+            check_seconds = min(check_seconds, scheduler_settings.LEASE_SECONDS / 3)
+
+        scheduler = DashboardRefreshScheduler(
+            dashboards=dashboards,
+            executor=executor,
+            store=app.state.job_store,
+            job_scheduler=app.state.job_scheduler,
+            s3_client=S3Client(
+                s3_client=await shared_s3.open(),
+                settings=app.state.settings.s3,
+                cache=getattr(app.state, "s3_cache", None),
+            ),
+            jitter_seconds=settings.JITTER_SECONDS,
+            leadership=Leadership(locks),
+            leader_check_seconds=check_seconds,
+        )
+        scheduler.start()
+        app.state.dashboard_scheduler = scheduler
+
+    return _init
+
+
+def close_dashboard_scheduler(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        if getattr(app.state, "dashboard_scheduler", None) is not None:
+            await app.state.dashboard_scheduler.stop()
+
+    return _close
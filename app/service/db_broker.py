@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI
+
+from app.clients.postgres import DatabasePools, json_default
+from app.core.metrics import DB_BROKER_REQUESTS
+from app.core.settings import DatabaseBrokerSettings
+from app.core.task_pool import CoroutineType
+
+logger = logging.getLogger(__name__)
+
+# Directory with the sockets, databases.json and highkick_db.py, for job scripts
+BROKER_DIR_ENV = "HIGHKICK_DB_BROKER_DIR"
+HELPER_SOURCE = Path(__file__).with_name("highkick_db.py")
+INDEX_FILE = "databases.json"
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+def socket_name(database: str) -> str:
+    return (re.sub(r"[^a-z0-9]+", "-", database.lower()).strip("-") or "db") + ".sock"
+
+
+class DatabaseBroker:
+    """
+    Serves the agent's database pools to job scripts, one Unix socket per
+    database, so scripts skip connection setup and the number of connections
+    to each database stays bounded by its pool.
+    - Newline-delimited JSON: the script sends {"sql", "args", "mode"}; the
+      broker answers {"columns"}, then {"rows"} batches and {"done"}, or
+      {"error"}. mode "query" reads rows through a server-side cursor,
+      "execute" returns the command status.
+    - Each statement runs in its own transaction on a pooled connection that
+      goes back to the pool as soon as the answer is sent.
+    - Sockets live in a per-process directory: a job talks to the broker of
+      the worker that runs it. The helper module for scripts is copied there.
+    """
+    def __init__(self, pools: DatabasePools, settings: DatabaseBrokerSettings):
+        self._pools = pools
+        self._settings = settings
+        self.directory = Path(settings.DIRECTORY) / str(os.getpid())
+        self._servers: List[asyncio.AbstractServer] = []
+
+    def env(self) -> Dict[str, str]:
+        """Environment for a job subprocess: the broker directory, importable."""
+        python_path = os.environ.get("PYTHONPATH")
+        return {
+            BROKER_DIR_ENV: str(self.directory),
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(self.directory), python_path])),
+        }
+
+    def _prepare_directory(self) -> Dict[str, str]:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True, mode=0o700)
+        shutil.copyfile(HELPER_SOURCE, self.directory / HELPER_SOURCE.name)
+        index = {name: socket_name(name) for name in self._pools.names()}
+        (self.directory / INDEX_FILE).write_text(json.dumps(index), encoding="utf-8")
+        return index
+
+    async def start(self) -> None:
+        index = await asyncio.to_thread(self._prepare_directory)
+        for name, filename in index.items():
+            path = str(self.directory / filename)
+            server = await asyncio.start_unix_server(
+                lambda reader, writer, name=name: self._serve(name, reader, writer),
+                path=path,
+                limit=MAX_REQUEST_BYTES,
+            )
+            os.chmod(path, 0o600)
+            self._servers.append(server)
+        logger.info("Database broker started", extra={"directory": str(self.directory), "databases": len(index)})
+
+    async def stop(self) -> None:
+        for server in self._servers:
+            server.close()
+        await asyncio.gather(*(server.wait_closed() for server in self._servers), return_exceptions=True)
+        self._servers = []
+        await asyncio.to_thread(shutil.rmtree, self.directory, True)
+
+    @staticmethod
+    def _send(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+        writer.write(json.dumps(message, default=json_default).encode("utf-8") + b"\n")
+
+    async def _serve(self, name: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                outcome = "success"
+                try:
+                    request = json.loads(line)
+                    await self._run(name, request, writer)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    outcome = "error"
+                    self._send(writer, {"error": f"{type(e).__name__}: {e}"})
+                DB_BROKER_REQUESTS.inc(database=name, outcome=outcome)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            # The script went away or sent an oversized line; its transaction is rolled back
+            pass
+        finally:
+            writer.close()
+
+    async def _run(self, name: str, request: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        sql, args = request["sql"], request.get("args") or []
+        async with self._pools.acquire(name, timeout=self._settings.ACQUIRE_TIMEOUT_SECONDS) as connection:
+            if request.get("mode") == "execute":
+                status = await connection.execute(sql, *args)
+                self._send(writer, {"done": status})
+                return
+
+            async with connection.transaction():
+                statement = await connection.prepare(sql)
+                self._send(writer, {"columns": [attribute.name for attribute in statement.get_attributes()]})
+                cursor = await statement.cursor(*args)
+                rows = 0
+                while True:
+                    batch = await cursor.fetch(self._pools.fetch_rows)
+                    if not batch:
+                        break
+                    self._send(writer, {"rows": [list(record.values()) for record in batch]})
+                    rows += len(batch)
+                    # Backpressure: fetch the next batch once the script has read this one
+                    await writer.drain()
+                self._send(writer, {"done": rows})
+
+
+_active: Optional[DatabaseBroker] = None
+
+
+def broker_env() -> Dict[str, str]:
+    """Environment for a job subprocess; empty when the broker is off."""
+    return _active.env() if _active is not None else {}
+
+
+def init_db_broker(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        global _active
+        settings: DatabaseBrokerSettings = app.state.settings.database_broker
+        if not settings.ENABLED:
+            return
+        broker = DatabaseBroker(app.state.database_pools, settings)
+        await broker.start()
+        app.state.db_broker = _active = broker
+
+    return _init
+
+
+def close_db_broker(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        global _active
+        if getattr(app.state, "db_broker", None) is not None:
+            _active = None
+            await app.state.db_broker.stop()
+
+    return _close
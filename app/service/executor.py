@@ -1,11 +1,124 @@
+import logging
 import uuid
 import yaml
 import subprocess
+import sys
 import tempfile
+import threading
+import time
 import os
-from typing import Tuple
+import signal
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.core.metrics import SCRIPT_EXECUTION_TIME
 from app.core.settings import AgentConfig
+from app.core.tracing import traced
+from app.schemas.agent import ResourceUsageSchema
+
+logger = logging.getLogger(__name__)
+
+PROFILER_BOOTSTRAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiler_bootstrap.py")
+PROFILER_SAMPLE_INTERVAL_SECONDS = 0.005
+
+
+SCRIPT_TIMEOUT_SECONDS = 60 * 10
+# How often a running script checks for its exit, its timeout and cancellation
+WATCH_INTERVAL_SECONDS = 0.1
+# Wait for the output pipes to close after the script exited
+PIPE_GRACE_SECONDS = 1.0
+
+
+class ScriptCancelledError(Exception):
+    """The script was killed because its job was cancelled."""
+
+
+def kill_process_group(process: subprocess.Popen) -> None:
+    # Scripts run in their own session (start_new_session), so this also
+    # stops whatever they started in the background
+    if not hasattr(os, "killpg"):
+        process.kill()
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def communicate_and_reap(
+    process: subprocess.Popen,
+    timeout: float,
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[str, str, Any]:
+    """
+    Like process.communicate(timeout), but the child is reaped here with
+    os.wait4() so its own resource usage is kept; Popen.wait() discards it and
+    RUSAGE_CHILDREN deltas would mix concurrent jobs.
+    Returns (stdout, stderr, rusage). Kills the child's process group and
+    raises subprocess.TimeoutExpired after `timeout` seconds, or
+    ScriptCancelledError once `cancel` is set; the child is reaped either way.
+    """
+    cancel = cancel or threading.Event()
+    output: Dict[str, List[str]] = {"stdout": [], "stderr": []}
+    readers = [
+        threading.Thread(target=lambda name=name: output[name].append(getattr(process, name).read()), daemon=True)
+        for name in output
+    ]
+    for reader in readers:
+        reader.start()
+
+    deadline = time.monotonic() + timeout
+    killed = None
+    while True:
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        if pid == process.pid:
+            break
+        if killed is None and (cancel.is_set() or time.monotonic() >= deadline):
+            killed = "cancel" if cancel.is_set() else "timeout"
+            kill_process_group(process)
+        # The pipes usually close when the child exits; wake up then
+        reading = [reader for reader in readers if reader.is_alive()]
+        if reading:
+            reading[0].join(WATCH_INTERVAL_SECONDS)
+        else:
+            time.sleep(0.01)
+    # Popen must not wait for (or signal) a child that is already reaped
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    grace = time.monotonic() + PIPE_GRACE_SECONDS
+    for reader in readers:
+        reader.join(max(0.0, grace - time.monotonic()))
+    if any(reader.is_alive() for reader in readers):
+        # Something the script left running still holds its output pipes
+        kill_process_group(process)
+        for reader in readers:
+            reader.join(PIPE_GRACE_SECONDS)
+    for name, reader in zip(output, readers):
+        if reader.is_alive():
+            # Closing a pipe another thread reads from would block; leave it to that thread
+            logger.warning("Script output pipe still open after exit", extra={"pipe": name})
+            setattr(process, name, None)
+
+    if killed == "cancel":
+        raise ScriptCancelledError()
+    if killed == "timeout":
+        raise subprocess.TimeoutExpired(process.args, timeout)
+    return "".join(output["stdout"]), "".join(output["stderr"]), rusage
+
+
+def to_resource_usage(rusage) -> Optional[ResourceUsageSchema]:
+    if rusage is None:
+        return None
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    rss_scale = 1 if sys.platform == "darwin" else 1024
+    return ResourceUsageSchema(
+        user_cpu_seconds=rusage.ru_utime,
+        system_cpu_seconds=rusage.ru_stime,
+        max_rss_bytes=rusage.ru_maxrss * rss_scale,
+        block_input_ops=rusage.ru_inblock,
+        block_output_ops=rusage.ru_oublock,
+        voluntary_context_switches=rusage.ru_nvcsw,
+        involuntary_context_switches=rusage.ru_nivcsw,
+    )
 
 
 class ExecutorService:
@@ -16,13 +129,13 @@ class ExecutorService:
     ) -> None:
         self._agent_config = agent_config
         self._config_yaml = self._load_config(self._agent_config.CONFIG_PATH)
-        print(self._config_yaml)
 
         self._python_env = self._config_yaml["python"]["env"]
-        print(self._python_env)
-
         self._output_dir = self._config_yaml["output"]["directory"]
-        print(self._output_dir)
+        logger.debug(
+            "Executor configured",
+            extra={"python_env": self._python_env, "output_dir": self._output_dir},
+        )
 
 
     def _load_config(self, path: str):
@@ -31,12 +144,12 @@ class ExecutorService:
         return config
 
 
+    @traced("configure_script")
     def configure_script(self, script: str, output_file_path: str) -> str:
         databases = self._config_yaml["databases"]
         result = script
         for db in databases:
             variables = db["vars"]
-            print(variables)
             for kv in variables:
                 key = next(iter(kv))
                 val = kv[key]
@@ -51,23 +164,75 @@ class ExecutorService:
         }
 
 
-    def execute_script(self, script: str) -> Tuple[str, str]:
+    def execute_script(
+        self,
+        script: str,
+        profile_paths: Optional[Tuple[str, str]] = None,
+        env: Optional[Dict[str, str]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Tuple[str, str, Optional[ResourceUsageSchema]]:
+        """
+        Run the script in the configured python env.
+        With `profile_paths` = (pstats_path, collapsed_path) the script runs under
+        the profiler bootstrap, which writes both profile formats.
+        `env` is added to the agent's environment (e.g. the trace context).
+        Setting `cancel` kills the script and raises ScriptCancelledError.
+        """
         python_bin = os.path.join(self._python_env, "bin", "python")
 
         with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as tmp_file:
             tmp_file.write(script)
             tmp_file_path = tmp_file.name
 
+        command = [python_bin, tmp_file_path]
+        if profile_paths is not None:
+            pstats_path, collapsed_path = profile_paths
+            command = [
+                python_bin,
+                PROFILER_BOOTSTRAP,
+                tmp_file_path,
+                pstats_path,
+                collapsed_path,
+                str(PROFILER_SAMPLE_INTERVAL_SECONDS),
+            ]
+
         try:
-            result = subprocess.run(
-                [python_bin, tmp_file_path],
-                capture_output=True,
-                text=True,
-                timeout=60 * 10
-            )
-            return result.stdout, result.stderr
+            with SCRIPT_EXECUTION_TIME.time():
+                with subprocess.Popen(
+                    command,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    env={**os.environ, **env} if env else None,
+                    start_new_session=True,
+                ) as process:
+                    if hasattr(os, "wait4"):
+                        stdout, stderr, rusage = communicate_and_reap(process, SCRIPT_TIMEOUT_SECONDS, cancel)
+                    else:
+                        rusage = None
+                        deadline = time.monotonic() + SCRIPT_TIMEOUT_SECONDS
+                        while True:
+                            try:
+                                stdout, stderr = process.communicate(timeout=WATCH_INTERVAL_SECONDS)
+                                break
+                            except subprocess.TimeoutExpired:
+                                cancelled = cancel is not None and cancel.is_set()
+                                if not cancelled and time.monotonic() < deadline:
+                                    continue
+                                kill_process_group(process)
+                                process.communicate()
+                                if cancelled:
+                                    raise ScriptCancelledError()
+                                raise subprocess.TimeoutExpired(process.args, SCRIPT_TIMEOUT_SECONDS)
+            return stdout, stderr, to_resource_usage(rusage)
         finally:
             os.remove(tmp_file_path)
 
     def get_output_dir(self) -> str:
         return self._output_dir
+
+    def get_dashboards(self) -> list:
+        return self._config_yaml.get("dashboards") or []
+
+    def get_databases(self) -> list:
+        return self._config_yaml.get("databases") or []
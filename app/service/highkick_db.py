@@ -0,0 +1,89 @@
+"""
+Database access for job scripts through the agent's connection broker.
+Executed by the aux venv python, so it must only depend on the standard
+library. The agent copies it next to the broker sockets and puts that
+directory on the job's PYTHONPATH.
+
+    import highkick_db
+
+    rows = highkick_db.query("Example DB", "select * from orders where id = $1", 42)
+    for row in highkick_db.iter_rows("Example DB", "select * from events"):
+        ...
+    highkick_db.execute("Example DB", "delete from staging")
+    highkick_db.query_to_file("Example DB", "select * from orders", "{{output_file}}")
+
+Connections are the agent's: already open, pooled, and shared with other jobs.
+Each call is one statement in its own transaction. Parameters are $1, $2, ...
+and must be JSON values; dates and decimals come back as ISO strings and floats.
+"""
+import json
+import os
+import socket
+
+BROKER_DIR_ENV = "HIGHKICK_DB_BROKER_DIR"
+
+
+class BrokerError(Exception):
+    pass
+
+
+def _socket_path(database):
+    directory = os.environ.get(BROKER_DIR_ENV)
+    if not directory:
+        raise BrokerError("The agent's database broker is not enabled (DATABASE_BROKER_ENABLED)")
+    with open(os.path.join(directory, "databases.json"), encoding="utf-8") as f:
+        sockets = json.load(f)
+    if database not in sockets:
+        raise BrokerError(f"Unknown database {database!r}; configured: {', '.join(sorted(sockets))}")
+    return os.path.join(directory, sockets[database])
+
+
+def _request(database, sql, args, mode):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(_socket_path(database))
+    try:
+        sock.sendall(json.dumps({"sql": sql, "args": list(args), "mode": mode}).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as answers:
+            for line in answers:
+                message = json.loads(line)
+                if "error" in message:
+                    raise BrokerError(message["error"])
+                yield message
+                if "done" in message:
+                    return
+        raise BrokerError("The database broker closed the connection")
+    finally:
+        sock.close()
+
+
+def iter_rows(database, sql, *args):
+    """Rows as dicts, streamed: the result is never held in memory at once."""
+    columns = []
+    for message in _request(database, sql, args, "query"):
+        if "columns" in message:
+            columns = message["columns"]
+        for values in message.get("rows", ()):
+            yield dict(zip(columns, values))
+
+
+def query(database, sql, *args):
+    return list(iter_rows(database, sql, *args))
+
+
+def execute(database, sql, *args):
+    """Run a statement that returns no rows. Returns the command status, e.g. "DELETE 3"."""
+    for message in _request(database, sql, args, "execute"):
+        if "done" in message:
+            return message["done"]
+
+
+def query_to_file(database, sql, path, *args):
+    """Write the rows to `path` as a JSON array of objects. Returns the number of rows."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for row in iter_rows(database, sql, *args):
+            f.write(("," if count else "") + "\n" + json.dumps(row))
+            count += 1
+        f.write("\n]\n")
+    return count
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from subprocess import TimeoutExpired
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.clients.s3 import S3Client
+from app.core.agent_job import AgentJob
+from app.core.job_costs import COST_LEDGER, get_script_hash
+from app.core.job_store import ARTIFACT_CONTENT_TYPES, DATA_FILE
+from app.core.metrics import JOB_OUTPUT_BYTES, JOB_RUN_TIME, JOBS
+from app.core.tracing import ingest_spans_file, start_span, subprocess_env, traced
+from app.schemas.agent import StatusSchema
+from app.service.concurrency import JOB_SLOWDOWN
+from app.service.db_broker import broker_env
+from app.service.executor import ExecutorService
+
+if TYPE_CHECKING:
+    from app.clients.postgres import DatabasePools
+
+logger = logging.getLogger(__name__)
+
+
+@traced("offload_artifacts")
+async def offload_artifacts(job: AgentJob, s3_client: S3Client) -> bool:
+    # Uploaded from the work directory, before the job store takes them over
+    paths = await asyncio.to_thread(job.get_local_artifact_paths)
+    results = await asyncio.gather(*[
+        s3_client.upload_file(
+            key=s3_client.get_job_artifact_key(job.get_id(), name),
+            path=str(path),
+            content_type=ARTIFACT_CONTENT_TYPES[name],
+        )
+        for name, path in paths.items()
+    ])
+    return all(result.success for result in results)
+
+
+@traced("run_sql")
+async def run_sql(job: AgentJob, pools: Optional["DatabasePools"], database: str, sql: str) -> Tuple[str, str, str]:
+    """Run a SQL job in the agent's event loop. Returns (std_out, err, outcome)."""
+    if pools is None:
+        return "", "SQL jobs are not available on this agent", "error"
+    try:
+        rows = await asyncio.wait_for(
+            pools.query_to_json(database, sql, job.get_data_path_str()),
+            timeout=pools.query_timeout_seconds,
+        )
+    except asyncio.TimeoutError:
+        return "", f"Timeout expired after {pools.query_timeout_seconds} seconds", "timeout"
+    except Exception as e:
+        return "", f"{type(e).__name__}: {e}", "error"
+    return f"{rows} rows\n", "", "success"
+
+
+async def fail_job(job: AgentJob, error: Exception) -> None:
+    """Mark a job that broke down before finishing as completed with an error."""
+    try:
+        status = await job.get_status() or StatusSchema()
+        if status.time_completed is not None:
+            # Failed after its final status was written
+            return
+        status.time_completed = datetime.now()
+        if status.time_started is not None:
+            status.run_seconds = (status.time_completed - status.time_started).total_seconds()
+        status.error = True
+        await job.set_error(f"{type(error).__name__}: {error}")
+        try:
+            await job.commit()
+        except Exception:
+            logger.exception("Failed to commit job artifacts", extra={"job_id": job.get_id()})
+        await job.set_status(status)
+        COST_LEDGER.record(status)
+    except Exception:
+        logger.exception("Failed to record job failure", extra={"job_id": job.get_id()})
+
+
+@traced("run_job")
+async def run_job(
+    job: AgentJob,
+    executor: ExecutorService,
+    script: str,
+    s3_client: Optional[S3Client] = None,
+    profile: bool = False,
+    database: Optional[str] = None,
+    database_pools: Optional["DatabasePools"] = None,
+):
+    """
+    Run a job to completion. With `database` the script is SQL, run on that
+    database of the config through `database_pools` instead of a subprocess.
+    When it fails on the way, the job is still completed, with an error.
+    """
+    started = time.perf_counter()
+    try:
+        await _run_job(job, executor, script, s3_client, profile, database, database_pools, started)
+    except Exception as e:
+        await fail_job(job, e)
+        JOBS.inc(outcome="error")
+        JOB_RUN_TIME.observe(time.perf_counter() - started)
+        raise
+
+
+async def _run_job(
+    job: AgentJob,
+    executor: ExecutorService,
+    script: str,
+    s3_client: Optional[S3Client],
+    profile: bool,
+    database: Optional[str],
+    database_pools: Optional["DatabasePools"],
+    started: float,
+) -> None:
+    outcome = "success"
+
+    if database is None:
+        configured_script = executor.configure_script(script=script, output_file_path=job.get_data_path_str())
+
+    await asyncio.to_thread(job.prepare_work_dir)
+
+    status = await job.get_status() or StatusSchema()
+    status.time_started = datetime.now()
+    status.script_hash = get_script_hash(script)
+    status.profiled = profile and database is None
+    if status.time_submitted is not None:
+        status.queue_wait_seconds = (status.time_started - status.time_submitted).total_seconds()
+
+    if status.deadline is not None and status.time_started > status.deadline:
+        # Too late to be of use to whoever submitted it; free the slot instead
+        status.expired = True
+        status.error = True
+        status.time_completed = status.time_started
+        status.run_seconds = 0.0
+        await job.set_error("Deadline passed before the job could start")
+        await job.commit()
+        await job.set_status(status)
+        JOBS.inc(outcome="expired")
+        JOB_RUN_TIME.observe(time.perf_counter() - started)
+        return
+
+    await job.set_status(status)
+
+    usage = None
+    if database is not None:
+        std_out, err, outcome = await run_sql(job, database_pools, database, script)
+    else:
+        with start_span("execute_script", attributes={"job.id": job.get_id(), "script.hash": status.script_hash}):
+            spans_file = job.get_spans_path_str()
+            cancel = threading.Event()
+            script_run = asyncio.ensure_future(run_in_threadpool(
+                executor.execute_script,
+                script=configured_script["script"],
+                profile_paths=job.get_profile_path_strs() if profile else None,
+                env={**subprocess_env(spans_file), **broker_env()},
+                cancel=cancel,
+            ))
+            try:
+                std_out, err, usage = await asyncio.shield(script_run)
+            except asyncio.CancelledError:
+                # Cancelling the await leaves the thread running: kill the script
+                # and wait until it is reaped, so the caller can reuse its slot
+                cancel.set()
+                await asyncio.gather(script_run, return_exceptions=True)
+                raise
+            except TimeoutExpired as e:
+                std_out = ""
+                err = f"Timeout expired after {e.timeout} seconds"
+                outcome = "timeout"
+
+            finally:
+                await asyncio.to_thread(ingest_spans_file, spans_file)
+
+    status.time_completed = datetime.now()
+    status.run_seconds = (status.time_completed - status.time_started).total_seconds()
+    status.error = not (not err or err.strip() == "")
+    status.usage = usage
+
+    await job.set_std_output(std_out)
+    await job.set_error(err)        
+
+    if status.error and outcome == "success":
+        outcome = "error"
+    local_paths = await asyncio.to_thread(job.get_local_artifact_paths)
+    JOB_OUTPUT_BYTES.inc(len(std_out.encode("utf-8")), artifact="std_output")
+    JOB_OUTPUT_BYTES.inc(len(err.encode("utf-8")), artifact="error")
+    if DATA_FILE in local_paths:
+        JOB_OUTPUT_BYTES.inc(local_paths[DATA_FILE].stat().st_size, artifact="data")
+
+    if s3_client is not None and not job.artifacts_in_s3:
+        status.artifacts_offloaded = await offload_artifacts(job, s3_client)
+
+    try:
+        await job.commit()
+        if s3_client is not None and job.artifacts_in_s3:
+            # The store put them where offloading would have
+            status.artifacts_offloaded = True
+    except Exception:
+        logger.exception("Failed to commit job artifacts", extra={"job_id": job.get_id()})
+        status.error = True
+        outcome = "error"
+
+    await job.set_status(status)
+    if outcome == "success":
+        JOB_SLOWDOWN.record(status.run_seconds, COST_LEDGER.mean_run_seconds(status.script_hash))
+    COST_LEDGER.record(status)
+
+    JOBS.inc(outcome=outcome)
+    JOB_RUN_TIME.observe(time.perf_counter() - started)
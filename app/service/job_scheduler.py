@@ -0,0 +1,453 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Dict, Optional, Set
+
+from fastapi import FastAPI
+
+from app.clients.s3 import S3Client
+from app.core.agent_job import AgentJob
+from app.core.file_queue import ClaimedEntry, FileJobQueue, LeasedFileJobQueue, SlotLease
+from app.core.job_store import JobStore
+from app.core.leader import HostLock
+from app.core.metrics import JOB_QUEUE_DEPTH, JOB_QUEUE_RECOVERED, JOB_QUEUE_RUNNING
+from app.core.settings import SchedulerSettings
+from app.core.task_pool import (
+    AsyncTaskPool,
+    CoroutineType,
+    DrainRate,
+    Flow,
+    QueueFullError,
+    QueuePosition,
+    flow_weight,
+)
+from app.core.tracing import SpanContext, current_span_context, use_span_context
+from app.service.executor import ExecutorService
+from app.service.job_runner import run_job
+
+if TYPE_CHECKING:
+    from app.clients.postgres import DatabasePools
+
+logger = logging.getLogger(__name__)
+
+# Shared queue: how far a job of weight 1 pushes back the next job of its flow
+VIRTUAL_SECONDS_PER_JOB = 1.0
+# Flow tags kept before idle flows are dropped
+MAX_TRACKED_FLOWS = 1024
+
+
+class JobScheduler(ABC):
+    async def admit(self) -> None:
+        """
+        Make sure a new job fits in the queue, waiting for room when the
+        overflow policy says so. Raises QueueFullError when it does not fit.
+        """
+
+    @abstractmethod
+    async def submit(
+        self,
+        job: AgentJob,
+        executor: ExecutorService,
+        script: str,
+        s3_client: Optional[S3Client] = None,
+        profile: bool = False,
+        flow: Flow = Flow(),
+        database: Optional[str] = None,
+    ) -> None:
+        pass
+
+    async def queue_position(self, job_id: str) -> Optional[QueuePosition]:
+        """Where a queued job stands; None once it started (or if unknown here)."""
+        return None
+
+    @property
+    @abstractmethod
+    def concurrency(self) -> int:
+        """Jobs allowed to run at once."""
+
+    @abstractmethod
+    def set_concurrency(self, slots: int) -> None:
+        pass
+
+    @abstractmethod
+    async def saturated(self) -> bool:
+        """True while jobs wait because every slot is taken."""
+
+    def concurrency_lock(self) -> Optional[HostLock]:
+        """Held by the one process allowed to change `concurrency`; None when it is per process."""
+        return None
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class LocalJobScheduler(JobScheduler):
+    """Runs jobs on this worker's task pool."""
+    def __init__(
+        self,
+        task_pool: AsyncTaskPool,
+        settings: SchedulerSettings,
+        database_pools: Optional["DatabasePools"] = None,
+    ):
+        self._task_pool = task_pool
+        self._settings = settings
+        self._database_pools = database_pools
+
+    async def admit(self) -> None:
+        if self._task_pool.has_room():
+            return
+        if self._settings.OVERFLOW == "block" and await self._task_pool.wait_for_room(self._settings.BLOCK_SECONDS):
+            return
+        raise QueueFullError(self._task_pool.retry_after())
+
+    async def submit(
+        self,
+        job: AgentJob,
+        executor: ExecutorService,
+        script: str,
+        s3_client: Optional[S3Client] = None,
+        profile: bool = False,
+        flow: Flow = Flow(),
+        database: Optional[str] = None,
+    ) -> None:
+        self._task_pool.enqueue(
+            run_job,
+            kwargs=dict(
+                job=job,
+                executor=executor,
+                script=script,
+                s3_client=s3_client,
+                profile=profile,
+                database=database,
+                database_pools=self._database_pools,
+            ),
+            flow=flow,
+            key=job.get_id(),
+        )
+
+    async def queue_position(self, job_id: str) -> Optional[QueuePosition]:
+        return self._task_pool.queue_position(job_id)
+
+    @property
+    def concurrency(self) -> int:
+        return self._task_pool.pool_size
+
+    def set_concurrency(self, slots: int) -> None:
+        self._task_pool.resize(slots)
+
+    async def saturated(self) -> bool:
+        # Idle workers take queued tasks right away
+        return self._task_pool.qsize() > 0
+
+
+class VirtualClock:
+    """
+    Ranks for the shared queue, which is claimed lowest rank first (Virtual
+    Clock): a job's rank is max(now, its flow's last rank) + VIRTUAL_SECONDS_PER_JOB
+    / weight, in nanoseconds, with weights as in FairQueue.
+    - A backlogged flow's ranks run ahead of the clock at 1 / weight per job,
+      so a new interactive job passes queued batch jobs, and one tenant's
+      backlog does not hold up the others.
+    - A flow that was idle starts from now and banks no credit; jobs that
+      waited long enough go first whatever their flow.
+    - Ranks are kept per worker: a flow submitting through several workers
+      gets up to that many times its share.
+    """
+    def __init__(self, priority_weights: Dict[str, float], tenant_weights: Dict[str, float]):
+        self._priority_weights = priority_weights
+        self._tenant_weights = tenant_weights
+        self._last_ranks: Dict[Flow, int] = {}
+
+    def rank(self, flow: Flow) -> int:
+        now = time.time_ns()
+        if len(self._last_ranks) >= MAX_TRACKED_FLOWS:
+            # Flows whose last rank has passed would start from now anyway
+            self._last_ranks = {f: r for f, r in self._last_ranks.items() if r > now}
+        weight = flow_weight(flow, self._priority_weights, self._tenant_weights)
+        rank = max(now, self._last_ranks.get(flow, 0)) + int(VIRTUAL_SECONDS_PER_JOB * 1e9 / weight)
+        self._last_ranks[flow] = rank
+        return rank
+
+
+class SharedJobScheduler(JobScheduler):
+    """
+    Runs jobs from a FileJobQueue shared by all workers on the host, or by all
+    hosts of a cluster (LeasedFileJobQueue on a shared directory).
+    - Every worker submits to and pulls from the same queue; idle workers
+      take whatever is queued, whichever node accepted it. Jobs are ranked by
+      priority and tenant (see VirtualClock), not taken in arrival order.
+    - A job only starts while its worker holds one of the queue's slots.
+    - Job state lives in the job store, shared by all workers, so any worker
+      answers for any job.
+    """
+    def __init__(
+        self,
+        queue: FileJobQueue,
+        executor: ExecutorService,
+        store: JobStore,
+        settings: SchedulerSettings,
+        app: FastAPI,
+    ):
+        self._queue = queue
+        self._executor = executor
+        self._store = store
+        self._settings = settings
+        self._app = app
+        self._clock = VirtualClock(settings.PRIORITY_WEIGHTS, settings.TENANT_WEIGHTS)
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        # Claims by this worker only; other workers drain the queue too, so
+        # Retry-After errs on the long side
+        self._drain_rate = DrainRate()
+
+    def _has_room(self, pending: int) -> bool:
+        return self._settings.MAX_QUEUED is None or pending < self._settings.MAX_QUEUED
+
+    async def admit(self) -> None:
+        if self._settings.MAX_QUEUED is None:
+            return
+        pending = await asyncio.to_thread(self._queue.pending_count)
+        if self._has_room(pending):
+            return
+        if self._settings.OVERFLOW == "block":
+            deadline = time.monotonic() + self._settings.BLOCK_SECONDS
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self._settings.POLL_INTERVAL_SECONDS)
+                pending = await asyncio.to_thread(self._queue.pending_count)
+                if self._has_room(pending):
+                    return
+        raise QueueFullError(self._drain_rate.retry_after(pending))
+
+    async def submit(
+        self,
+        job: AgentJob,
+        executor: ExecutorService,
+        script: str,
+        s3_client: Optional[S3Client] = None,
+        profile: bool = False,
+        flow: Flow = Flow(),
+        database: Optional[str] = None,
+    ) -> None:
+        span_context = current_span_context()
+        payload = {
+            "script": script,
+            "profile": profile,
+            "database": database,
+            # The worker that runs the job uploads with its own client
+            "offload": s3_client is not None,
+            "traceparent": span_context.traceparent if span_context is not None else None,
+            "priority": flow.priority,
+            "tenant": flow.tenant,
+        }
+        # Whichever worker claims the job owns its status from now on
+        await job.release()
+        await asyncio.to_thread(self._queue.enqueue, job.get_id(), payload, self._clock.rank(flow))
+        self._wakeup.set()
+
+    async def queue_position(self, job_id: str) -> Optional[QueuePosition]:
+        pending = await asyncio.to_thread(self._queue.pending)
+        position = next((i for i, name in enumerate(pending) if name.endswith(f"-{job_id}.json")), None)
+        if position is None:
+            return None
+        rate = self._drain_rate.per_second()
+        return QueuePosition(position, (position + 1) / rate if rate > 0 else None)
+
+    @property
+    def concurrency(self) -> int:
+        return self._queue.slots
+
+    def set_concurrency(self, slots: int) -> None:
+        # Persisted next to the slot files: every worker of the host uses the new count
+        self._queue.slots = slots
+        self._wakeup.set()
+
+    def concurrency_lock(self) -> Optional[HostLock]:
+        # The slot count is host-wide, so only one worker's controller may change it
+        return HostLock(str(self._queue.slots_directory / "concurrency.lock"))
+
+    async def saturated(self) -> bool:
+        pending = await asyncio.to_thread(self._queue.pending_count)
+        # Claims of other hosts (cluster mode) use their own slots, not this host's
+        return pending > 0 and await asyncio.to_thread(self._queue.busy_slots) >= self._queue.slots
+
+    def start(self) -> None:
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        """Stop claiming new jobs and wait for the ones this worker is running."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self._settings.POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _dispatch(self) -> None:
+        last_recover = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_recover > self._settings.RECOVER_INTERVAL_SECONDS:
+                    last_recover = time.monotonic()
+                    recovered = await asyncio.to_thread(self._queue.recover)
+                    if recovered:
+                        JOB_QUEUE_RECOVERED.inc(recovered)
+                        logger.warning("Requeued jobs left by a stopped worker", extra={"jobs": recovered})
+
+                slot = await asyncio.to_thread(self._queue.acquire_slot)
+                if slot is None:
+                    await self._wait()
+                    continue
+                entry = await asyncio.to_thread(self._queue.claim)
+                if entry is None:
+                    slot.release()
+                    await self._wait()
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job queue dispatch failed")
+                await self._wait()
+                continue
+
+            self._drain_rate.record()
+            task = asyncio.create_task(self._run(entry, slot))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _artifact_s3_client(self) -> Optional[S3Client]:
+        shared = getattr(self._app.state, "aws_clients", {}).get("s3")
+        if shared is None:
+            return None
+        return S3Client(
+            s3_client=await shared.open(),
+            settings=self._app.state.settings.s3,
+            cache=getattr(self._app.state, "s3_cache", None),
+        )
+
+    async def _heartbeat(self, entry: ClaimedEntry) -> bool:
+        """Renew the lease until cancelled. Returns False once the lease was lost."""
+        while True:
+            await asyncio.sleep(self._queue.lease_seconds / 3)
+            try:
+                renewed = await asyncio.to_thread(self._queue.heartbeat, entry)
+            except OSError:
+                # e.g. a stale NFS handle; the next beat may still make it within the lease
+                logger.warning(
+                    "Could not renew the lease of a running job", exc_info=True, extra={"job_id": entry.job_id}
+                )
+                continue
+            if not renewed:
+                logger.warning("Lease of a running job expired and was taken over", extra={"job_id": entry.job_id})
+                return False
+
+    async def _run_job(self, entry: ClaimedEntry) -> None:
+        payload = entry.payload
+        with use_span_context(SpanContext.from_traceparent(payload.get("traceparent"))):
+            await run_job(
+                job=AgentJob(store=self._store, id=entry.job_id),
+                executor=self._executor,
+                script=payload["script"],
+                s3_client=await self._artifact_s3_client() if payload.get("offload") else None,
+                profile=payload.get("profile", False),
+                database=payload.get("database"),
+                database_pools=getattr(self._app.state, "database_pools", None),
+            )
+
+    async def _run(self, entry: ClaimedEntry, slot: SlotLease) -> None:
+        run = asyncio.create_task(self._run_job(entry))
+        heartbeat = asyncio.create_task(self._heartbeat(entry)) if self._queue.lease_seconds else None
+        lease_lost = False
+        try:
+            if heartbeat is not None:
+                await asyncio.wait({run, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+                # The heartbeat only returns once another node took the job over:
+                # stop here so the job runs and writes its status on one node only.
+                # run_job kills the script and waits for it before it gives up
+                lease_lost = heartbeat.done() and not heartbeat.cancelled() and heartbeat.exception() is None
+                if lease_lost:
+                    run.cancel()
+            await asyncio.wait({run})
+            if not run.cancelled() and run.exception() is not None:
+                logger.error("Queued job failed", exc_info=run.exception(), extra={"job_id": entry.job_id})
+        finally:
+            run.cancel()
+            if heartbeat is not None:
+                heartbeat.cancel()
+            # The slot is only free once the script is gone
+            await asyncio.gather(run, return_exceptions=True)
+            try:
+                # After a lost lease the entry belongs to whichever node took it over
+                if not lease_lost:
+                    await asyncio.to_thread(self._queue.complete, entry)
+            except Exception:
+                logger.exception("Failed to complete a queued job", extra={"job_id": entry.job_id})
+            finally:
+                slot.release()
+                # A slot just freed up; look for the next job right away
+                self._wakeup.set()
+
+
+def is_shared_mode(settings: SchedulerSettings, number_of_workers: int) -> bool:
+    return settings.MODE in ("shared", "cluster") or (settings.MODE == "auto" and number_of_workers > 1)
+
+
+def queue_directory(settings: SchedulerSettings, output_dir: str) -> str:
+    return settings.DIRECTORY or f"{output_dir}/.scheduler"
+
+
+def make_job_queue(settings: SchedulerSettings, output_dir: str) -> FileJobQueue:
+    directory = queue_directory(settings, output_dir)
+    if settings.MODE == "cluster":
+        return LeasedFileJobQueue(
+            directory,
+            settings.SLOTS,
+            slots_directory=settings.SLOTS_DIRECTORY,
+            lease_seconds=settings.LEASE_SECONDS,
+        )
+    return FileJobQueue(directory, settings.SLOTS)
+
+
+def init_job_scheduler(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        settings: SchedulerSettings = app.state.settings.scheduler
+        if not is_shared_mode(settings, app.state.settings.NUMBER_OF_WORKERS):
+            app.state.job_scheduler = LocalJobScheduler(
+                app.state.task_pool, settings, database_pools=getattr(app.state, "database_pools", None)
+            )
+            return
+
+        executor = ExecutorService(agent_config=app.state.settings.agent_config)
+        queue = await asyncio.to_thread(make_job_queue, settings, executor.get_output_dir())
+        JOB_QUEUE_DEPTH.set_function(queue.pending_count)
+        JOB_QUEUE_RUNNING.set_function(queue.claimed_count)
+
+        scheduler = SharedJobScheduler(
+            queue=queue,
+            executor=executor,
+            store=app.state.job_store,
+            settings=settings,
+            app=app,
+        )
+        scheduler.start()
+        app.state.job_scheduler = scheduler
+
+    return _init
+
+
+def close_job_scheduler(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        if getattr(app.state, "job_scheduler", None) is not None:
+            await app.state.job_scheduler.stop()
+
+    return _close
@@ -0,0 +1,83 @@
+"""
+Runs a job script under the profilers. Executed by the aux venv python, so
+it must only depend on the standard library.
+
+    python profiler_bootstrap.py <script.py> <profile.pstats> <profile.collapsed.txt> [interval]
+
+- cProfile gives exact call counts and timings (pstats dump).
+- A sampling thread records the main thread stack every `interval` seconds
+  and writes it in collapsed-stack format ("a;b;c <samples>") for flame graphs.
+"""
+import cProfile
+import collections
+import os
+import runpy
+import sys
+import threading
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _sample(
+    thread_id: int, script_path: str, interval: float, stop: threading.Event, stacks: collections.Counter
+) -> None:
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+        # Drop the bootstrap and runpy frames below the script's own module frame
+        for i, f in enumerate(frames):
+            if f.f_code.co_filename == script_path:
+                frames = frames[i:]
+                break
+        else:
+            continue
+        stacks[";".join(_frame_name(f) for f in frames)] += 1
+
+
+def _write_collapsed(path: str, stacks: collections.Counter) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def main() -> None:
+    script, pstats_path, collapsed_path = sys.argv[1:4]
+    interval = float(sys.argv[4]) if len(sys.argv) > 4 else 0.005
+
+    # Make the script see the same argv/path as when it is run directly
+    script = os.path.abspath(script)
+    sys.argv = [script]
+    sys.path[0] = os.path.dirname(script)
+
+    stacks: collections.Counter = collections.Counter()
+    stop = threading.Event()
+    sampler = threading.Thread(
+        target=_sample,
+        args=(threading.get_ident(), script, interval, stop, stacks),
+        daemon=True,
+    )
+
+    profiler = cProfile.Profile()
+    sampler.start()
+    try:
+        profiler.enable()
+        try:
+            runpy.run_path(script, run_name="__main__")
+        finally:
+            profiler.disable()
+    finally:
+        stop.set()
+        sampler.join()
+        profiler.dump_stats(pstats_path)
+        _write_collapsed(collapsed_path, stacks)
+
+
+if __name__ == "__main__":
+    main()
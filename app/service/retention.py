@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import FastAPI
+
+from app.core.job_index import JobIndexEntry
+from app.core.job_store import JobStore
+from app.core.leader import HostLock
+from app.core.metrics import JOB_DISK_USAGE, JOB_RECLAIMED_BYTES, JOB_STORED_BYTES, JOBS_EVICTED
+from app.core.settings import RetentionSettings
+from app.core.task_pool import CoroutineType
+from app.service.executor import ExecutorService
+
+logger = logging.getLogger(__name__)
+
+# Disk usage is checked on every submission against a value measured this often
+DISK_USAGE_TTL_SECONDS = 1.0
+
+
+class RetentionEngine:
+    """
+    Deletes finished jobs, oldest completion first, while the output exceeds
+    a limit: age, total artifact bytes, number of jobs or disk usage.
+    - Queued and running jobs are never touched.
+    - Works from the job index: the totals and the oldest finished jobs are
+      read from it in batches, the job tree is never walked.
+    - One worker per host evicts at a time (flock on LOCK_FILE, a local path):
+      in cluster mode each host evicts the jobs of its own index.
+    - `over_quota()` tells the submit path to refuse new jobs; it reads the
+      disk usage measured in the background, never the volume itself.
+    """
+    def __init__(self, store: JobStore, settings: RetentionSettings, output_dir: str):
+        self._store = store
+        self._settings = settings
+        self._output_dir = Path(output_dir)
+        self._lock = HostLock(settings.LOCK_FILE)
+        self._tasks: List[asyncio.Task] = []
+        self._usage: float = 0.0
+
+    def disk_usage(self) -> float:
+        """Fraction of the output volume in use, as of the last measurement."""
+        return self._usage
+
+    def _record_usage(self, usage) -> None:
+        self._usage = usage.used / usage.total if usage.total else 0.0
+
+    async def measure_disk_usage(self) -> float:
+        self._record_usage(await asyncio.to_thread(shutil.disk_usage, self._output_dir))
+        return self._usage
+
+    @property
+    def retry_after_seconds(self) -> int:
+        # Space is freed by the next eviction pass at the earliest
+        return max(1, int(self._settings.INTERVAL_SECONDS))
+
+    def over_quota(self) -> bool:
+        limit = self._settings.REJECT_DISK_USAGE
+        return limit is not None and self.disk_usage() > limit
+
+    def _eviction_reason(
+        self, entry: JobIndexEntry, cutoff: Optional[str], excess_jobs: int, excess_bytes: int, excess_disk: int
+    ) -> Optional[str]:
+        if cutoff is not None and entry.time_completed < cutoff:
+            return "age"
+        if excess_jobs > 0:
+            return "jobs"
+        if excess_bytes > 0:
+            return "bytes"
+        if excess_disk > 0:
+            return "disk"
+        return None
+
+    async def run_once(self) -> int:
+        """One eviction pass. Returns the number of jobs deleted."""
+        index = self._store.index
+        if index is None:
+            return 0
+        settings = self._settings
+
+        jobs, stored_bytes = await asyncio.to_thread(index.totals)
+        usage = await asyncio.to_thread(shutil.disk_usage, self._output_dir)
+        self._record_usage(usage)
+        JOB_STORED_BYTES.set(stored_bytes)
+
+        cutoff = None
+        if settings.MAX_AGE_SECONDS is not None:
+            # Same format as the timestamps in the index
+            cutoff = (datetime.now() - timedelta(seconds=settings.MAX_AGE_SECONDS)).isoformat()
+        excess_jobs = jobs - settings.MAX_JOBS if settings.MAX_JOBS is not None else 0
+        excess_bytes = stored_bytes - settings.MAX_TOTAL_BYTES if settings.MAX_TOTAL_BYTES is not None else 0
+        # Deleting objects from S3 frees nothing on the local volume
+        evict_for_disk = settings.MAX_DISK_USAGE is not None and not self._store.artifacts_in_s3
+        excess_disk = int(usage.used - settings.MAX_DISK_USAGE * usage.total) if evict_for_disk else 0
+
+        evicted = 0
+        after: Optional[JobIndexEntry] = None
+        done = False
+        while not done:
+            batch = await asyncio.to_thread(index.oldest_finished, after, settings.BATCH_SIZE)
+            if not batch:
+                break
+            doomed = []
+            for entry in batch:
+                reason = self._eviction_reason(entry, cutoff, excess_jobs, excess_bytes, excess_disk)
+                if reason is None:
+                    done = True
+                    break
+                size = entry.size_bytes or 0
+                excess_jobs -= 1
+                excess_bytes -= size
+                excess_disk -= size
+                doomed.append((entry, reason))
+            if not doomed:
+                break
+
+            await self._store.delete([entry.id for entry, _ in doomed])
+            for entry, reason in doomed:
+                JOBS_EVICTED.inc(reason=reason)
+                JOB_RECLAIMED_BYTES.inc(entry.size_bytes or 0, reason=reason)
+            evicted += len(doomed)
+            stored_bytes -= sum(entry.size_bytes or 0 for entry, _ in doomed)
+            JOB_STORED_BYTES.set(stored_bytes)
+            after = doomed[-1][0]
+            if evict_for_disk:
+                # Sizes of jobs indexed before they were recorded are unknown; measure
+                used_before = usage.used
+                usage = await asyncio.to_thread(shutil.disk_usage, self._output_dir)
+                self._record_usage(usage)
+                excess_disk = int(usage.used - settings.MAX_DISK_USAGE * usage.total)
+                if usage.used >= used_before:
+                    # Something other than jobs fills the volume; deleting more jobs will not help
+                    logger.warning(
+                        "Evicting jobs freed no disk space; stopping disk eviction for this pass",
+                        extra={"disk_usage": round(usage.used / usage.total, 3)},
+                    )
+                    evict_for_disk, excess_disk = False, 0
+
+        if evicted:
+            logger.info("Evicted finished jobs", extra={"jobs": evicted})
+        return evicted
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if await asyncio.to_thread(self._lock.try_acquire):
+                    try:
+                        await self.run_once()
+                    finally:
+                        await asyncio.to_thread(self._lock.release)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Retention pass failed")
+            await asyncio.sleep(self._settings.INTERVAL_SECONDS)
+
+    async def _watch_disk_usage(self) -> None:
+        while True:
+            await asyncio.sleep(DISK_USAGE_TTL_SECONDS)
+            try:
+                await self.measure_disk_usage()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Measuring disk usage failed")
+
+    def start(self) -> None:
+        # Disk usage is measured even with retention off: it backs the gauge and REJECT_DISK_USAGE
+        self._tasks.append(asyncio.create_task(self._watch_disk_usage()))
+        if self._settings.ENABLED:
+            self._tasks.append(asyncio.create_task(self._loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def init_retention(app: FastAPI) -> CoroutineType:
+    async def _init() -> None:
+        executor = ExecutorService(agent_config=app.state.settings.agent_config)
+        engine = RetentionEngine(
+            store=app.state.job_store,
+            settings=app.state.settings.retention,
+            output_dir=executor.get_output_dir(),
+        )
+        await engine.measure_disk_usage()
+        JOB_DISK_USAGE.set_function(engine.disk_usage)
+        engine.start()
+        app.state.retention = engine
+
+    return _init
+
+
+def close_retention(app: FastAPI) -> CoroutineType:
+    async def _close() -> None:
+        if getattr(app.state, "retention", None) is not None:
+            await app.state.retention.stop()
+
+    return _close
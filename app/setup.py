@@ -1,11 +1,23 @@
 from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.clients.aws import close_aws_clients, init_aws_clients
+from app.clients.llm_cache import init_llm_cache
+from app.clients.postgres import close_database_pools, init_database_pools
+from app.clients.s3_cache import init_s3_cache
+from app.core.job_store import close_job_store, init_job_store
 from app.core.task_pool import AsyncTaskPool, close_task_pool, init_task_pool
+from app.core.log import close_logging, init_logging
 from app.core.settings import Settings
+from app.core.tracing import close_tracing, init_tracing, tracing_middleware
 from app.routers import system
 from app.routers.v1 import provide_api_v1_router
 from app.schemas.error import ErrorSchema
+from app.service.concurrency import close_concurrency, init_concurrency
+from app.service.db_broker import close_db_broker, init_db_broker
+from app.service.dashboard_scheduler import close_dashboard_scheduler, init_dashboard_scheduler
+from app.service.job_scheduler import close_job_scheduler, init_job_scheduler
+from app.service.retention import close_retention, init_retention
 
 
 def provide_app(settings: Settings) -> FastAPI:
@@ -26,8 +38,34 @@ def provide_app(settings: Settings) -> FastAPI:
         allow_headers=["*"],
     )
 
+    # BaseHTTPMiddleware costs every request; only pay for it when spans are written
+    if settings.tracing.ENABLED:
+        app.middleware("http")(tracing_middleware)
+
+    app.add_event_handler("startup", init_logging(app))
+    app.add_event_handler("startup", init_tracing(app))
     app.add_event_handler("startup", init_task_pool(app))
+    app.add_event_handler("startup", init_llm_cache(app))
+    app.add_event_handler("startup", init_aws_clients(app))
+    app.add_event_handler("startup", init_s3_cache(app))
+    app.add_event_handler("startup", init_job_store(app))
+    app.add_event_handler("startup", init_retention(app))
+    app.add_event_handler("startup", init_database_pools(app))
+    app.add_event_handler("startup", init_db_broker(app))
+    app.add_event_handler("startup", init_job_scheduler(app))
+    app.add_event_handler("startup", init_concurrency(app))
+    app.add_event_handler("startup", init_dashboard_scheduler(app))
+    app.add_event_handler("shutdown", close_dashboard_scheduler(app))
+    app.add_event_handler("shutdown", close_concurrency(app))
+    app.add_event_handler("shutdown", close_job_scheduler(app))
     app.add_event_handler("shutdown", close_task_pool(app))
+    app.add_event_handler("shutdown", close_db_broker(app))
+    app.add_event_handler("shutdown", close_database_pools(app))
+    app.add_event_handler("shutdown", close_retention(app))
+    app.add_event_handler("shutdown", close_job_store(app))
+    app.add_event_handler("shutdown", close_aws_clients(app))
+    app.add_event_handler("shutdown", close_tracing(app))
+    app.add_event_handler("shutdown", close_logging(app))
     
     app.state.settings = settings
 
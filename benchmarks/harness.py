@@ -0,0 +1,206 @@
+"""
+Shared helpers for the benchmark scripts: booting the agent against a
+throw-away config, sampling its memory and storing comparable results.
+"""
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+JOB_SCRIPT = """
+import json
+
+with open("{{output_file}}", "w") as f:
+    json.dump({"rows": [{"id": i, "value": i * i} for i in range(%(rows)d)]}, f)
+print("ok")
+"""
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process (Linux /proc only)."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def make_stub_python_env(directory: Path) -> Path:
+    """A python env whose bin/python is the interpreter running the benchmark."""
+    bin_dir = directory / "bin"
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    (bin_dir / "python").symlink_to(sys.executable)
+    return directory
+
+
+def latency_summary(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+
+    def _percentile(p: float) -> Optional[float]:
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else None,
+        "p50_ms": _percentile(50),
+        "p99_ms": _percentile(99),
+    }
+
+
+class AgentProcess:
+    """A running agent plus the credentials needed to call it."""
+    def __init__(self, process: subprocess.Popen, base_url: str, work_dir: Path, private_key_pem: str):
+        self.process = process
+        self.base_url = base_url
+        self.work_dir = work_dir
+        self.private_key_pem = private_key_pem
+        self.rss_samples: List[int] = []
+        self.startup_seconds: Optional[float] = None
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def service_token(self) -> str:
+        from app.core.crypto import Crypto
+
+        return Crypto.create_token(self.private_key_pem, subject="benchmark", expires_in_seconds=3600)
+
+    def sample_rss(self) -> Optional[int]:
+        rss = read_rss_bytes(self.pid)
+        if rss is not None:
+            self.rss_samples.append(rss)
+        return rss
+
+
+def write_config(work_dir: Path) -> Dict[str, str]:
+    from app.core.crypto import Crypto
+
+    key_pair = Crypto.create_key_pair(Crypto.generate_random_string(32))
+    output_dir = work_dir / "output"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    config = {
+        "python": {"env": str(make_stub_python_env(work_dir / "python-env"))},
+        "output": {"directory": str(output_dir)},
+        "secrets": {"access": Crypto.generate_random_string(32)},
+        "admin": {"public_key": key_pair.public_key_b64},
+        "databases": [
+            {
+                "name": "Benchmark DB",
+                "tech": "PostgreSQL",
+                "vars": [{"bench_db_host": "localhost"}, {"bench_db_port": 5432}],
+            }
+        ],
+    }
+    config_path = work_dir / "config.yaml"
+    config_path.write_text(yaml.safe_dump(config), encoding="utf-8")
+    return {"config_path": str(config_path), "private_key_pem": key_pair.private_key_pem}
+
+
+@contextmanager
+def run_agent(
+    workers: int = 1,
+    env: Optional[Dict[str, str]] = None,
+    startup_timeout: float = 60,
+) -> Iterator[AgentProcess]:
+    """Boot app.setup:app with uvicorn on a free port and a temporary config."""
+    with tempfile.TemporaryDirectory(prefix="highkick-bench-") as tmp:
+        work_dir = Path(tmp)
+        config = write_config(work_dir)
+        port = free_port()
+        process_env = {**app_env(config["config_path"]), **(env or {})}
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.setup:app",
+                "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning",
+            ],
+            cwd=REPO_ROOT,
+            env=process_env,
+        )
+        agent = AgentProcess(process, f"http://127.0.0.1:{port}", work_dir, config["private_key_pem"])
+        try:
+            agent.startup_seconds = wait_for_health(agent, startup_timeout)
+            yield agent
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def app_env(config_path: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "CONFIG_PATH": config_path,
+        # Mirrors `make run-python`: repo root plus app/ for the short imports
+        "PYTHONPATH": os.pathsep.join([str(REPO_ROOT), str(REPO_ROOT / "app")]),
+    }
+
+
+def wait_for_health(agent: AgentProcess, timeout: float) -> float:
+    """Poll /health until it answers 200; returns seconds waited."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if agent.process.poll() is not None:
+            raise RuntimeError(f"Agent exited with code {agent.process.returncode} during startup")
+        try:
+            if requests.get(f"{agent.base_url}/health", timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"Agent did not become healthy within {timeout} seconds")
+
+
+def save_results(results: Dict[str, Any], path: str) -> None:
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        **results,
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
@@ -0,0 +1,248 @@
+"""
+Load test for the agent HTTP API.
+
+Boots the app against a temporary config and a stub python env (the
+interpreter running this script), then drives each endpoint group at the
+requested concurrency and records throughput, p50/p99 latency and agent RSS.
+
+    PYTHONPATH=./ python benchmarks/load_test.py --concurrency 16 --jobs 200 \
+        --output benchmarks/results/latest.json --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from benchmarks.harness import (
+    JOB_SCRIPT,
+    AgentProcess,
+    latency_summary,
+    load_results,
+    run_agent,
+    save_results,
+)
+
+API = "/api/v1"
+
+# Lower is better for these; throughput is compared the other way round
+LATENCY_KEYS = ("p50_ms", "p99_ms")
+
+
+class Scenario:
+    """Runs `call` `total` times over `concurrency` threads, one requests.Session per thread."""
+    def __init__(self, name: str, call: Callable[[requests.Session, int], None]):
+        self.name = name
+        self.call = call
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def run(self, total: int, concurrency: int) -> Dict[str, Any]:
+        latencies: List[float] = []
+        errors = 0
+        lock = threading.Lock()
+
+        def _one(index: int) -> None:
+            nonlocal errors
+            started = time.perf_counter()
+            try:
+                self.call(self._session(), index)
+            except Exception:
+                with lock:
+                    errors += 1
+                return
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(_one, range(total)))
+        return latency_summary(latencies, errors, time.perf_counter() - started)
+
+
+def get_access_token(session: requests.Session, agent: AgentProcess, service_token: str) -> str:
+    response = session.post(f"{agent.base_url}{API}/auth/token", json={"service_token": service_token}, timeout=30)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def run_load_test(
+    agent: AgentProcess,
+    jobs: int,
+    concurrency: int,
+    rows: int,
+    poll_interval: float,
+    job_timeout: float,
+) -> Dict[str, Any]:
+    service_token = agent.service_token()
+    access_token = get_access_token(requests.Session(), agent, service_token)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    script = JOB_SCRIPT % {"rows": rows}
+    job_ids: List[Optional[str]] = [None] * jobs
+
+    def _auth(session: requests.Session, index: int) -> None:
+        get_access_token(session, agent, service_token)
+
+    def _submit(session: requests.Session, index: int) -> None:
+        response = session.post(
+            f"{agent.base_url}{API}/agent/jobs",
+            data=script,
+            headers={**headers, "Content-Type": "text/plain"},
+            timeout=30,
+        )
+        response.raise_for_status()
+        job_ids[index] = response.json()["id"]
+
+    def _wait(session: requests.Session, index: int) -> None:
+        """Time from the first status poll until the job reports completion."""
+        deadline = time.perf_counter() + job_timeout
+        while time.perf_counter() < deadline:
+            response = session.get(f"{agent.base_url}{API}/agent/jobs/{job_ids[index]}/status", headers=headers, timeout=30)
+            response.raise_for_status()
+            status = response.json()
+            if status.get("time_completed"):
+                if status.get("error"):
+                    raise RuntimeError(f"Job {job_ids[index]} failed")
+                return
+            time.sleep(poll_interval)
+        raise TimeoutError(f"Job {job_ids[index]} did not complete")
+
+    def _status(session: requests.Session, index: int) -> None:
+        response = session.get(f"{agent.base_url}{API}/agent/jobs/{job_ids[index % jobs]}/status", headers=headers, timeout=30)
+        response.raise_for_status()
+
+    def _download(artifact: str) -> Callable[[requests.Session, int], None]:
+        def _call(session: requests.Session, index: int) -> None:
+            response = session.get(
+                f"{agent.base_url}{API}/agent/jobs/{job_ids[index % jobs]}/{artifact}", headers=headers, timeout=30
+            )
+            response.raise_for_status()
+            # Make sure the whole body is transferred
+            len(response.content)
+        return _call
+
+    scenarios = [
+        (Scenario("auth_token", _auth), jobs),
+        (Scenario("submit_job", _submit), jobs),
+        (Scenario("job_completion", _wait), jobs),
+        (Scenario("job_status", _status), jobs * 4),
+        (Scenario("download_data", _download("data")), jobs),
+        (Scenario("download_std_output", _download("std-output")), jobs),
+    ]
+
+    agent.sample_rss()
+    sampling = threading.Event()
+
+    def _sample_rss() -> None:
+        while not sampling.wait(0.1):
+            agent.sample_rss()
+
+    sampler = threading.Thread(target=_sample_rss, daemon=True)
+    sampler.start()
+
+    results: Dict[str, Any] = {}
+    try:
+        for scenario, total in scenarios:
+            results[scenario.name] = scenario.run(total, concurrency)
+            print(f"{scenario.name:<22} {format_summary(results[scenario.name])}")
+    finally:
+        sampling.set()
+        sampler.join()
+
+    samples = agent.rss_samples
+    return {
+        "scenarios": results,
+        "rss": {
+            "start_bytes": samples[0] if samples else None,
+            "peak_bytes": max(samples) if samples else None,
+            "end_bytes": samples[-1] if samples else None,
+        },
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    return (
+        f"{summary['requests']:>6} req  {summary['errors']:>4} err  "
+        f"{summary['throughput_rps'] or 0:>9.1f} req/s  "
+        f"p50 {summary['p50_ms'] or 0:>8.2f} ms  p99 {summary['p99_ms'] or 0:>8.2f} ms"
+    )
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Human readable regressions beyond `max_regression` (fraction) against the baseline."""
+    regressions = []
+    for name, summary in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        for key in LATENCY_KEYS:
+            if base.get(key) and summary.get(key) and summary[key] > base[key] * (1 + max_regression):
+                regressions.append(f"{name}.{key}: {base[key]} -> {summary[key]}")
+        if base.get("throughput_rps") and summary.get("throughput_rps") and (
+            summary["throughput_rps"] < base["throughput_rps"] * (1 - max_regression)
+        ):
+            regressions.append(f"{name}.throughput_rps: {base['throughput_rps']} -> {summary['throughput_rps']}")
+        if summary["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}.errors: {base.get('errors', 0)} -> {summary['errors']}")
+
+    base_rss = baseline.get("rss", {}).get("peak_bytes")
+    rss = current["rss"]["peak_bytes"]
+    if base_rss and rss and rss > base_rss * (1 + max_regression):
+        regressions.append(f"rss.peak_bytes: {base_rss} -> {rss}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=100, help="Jobs submitted (and requests per scenario)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=1000, help="Rows written to data.json by each job")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--job-timeout", type=float, default=300)
+    parser.add_argument("--output", default="benchmarks/results/load_test.json")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed slowdown as a fraction")
+    args = parser.parse_args()
+
+    with run_agent(workers=args.workers) as agent:
+        results = run_load_test(
+            agent,
+            jobs=args.jobs,
+            concurrency=args.concurrency,
+            rows=args.rows,
+            poll_interval=args.poll_interval,
+            job_timeout=args.job_timeout,
+        )
+
+    rss = results["rss"]
+    if rss["peak_bytes"] is not None:
+        print(f"agent rss: start {rss['start_bytes'] / 2**20:.1f} MiB, peak {rss['peak_bytes'] / 2**20:.1f} MiB")
+
+    results["config"] = {
+        "jobs": args.jobs,
+        "concurrency": args.concurrency,
+        "rows": args.rows,
+        "workers": args.workers,
+    }
+    save_results(results, args.output)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
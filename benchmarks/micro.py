@@ -0,0 +1,263 @@
+"""
+Microbenchmarks for the per-request and per-job hot functions.
+
+    PYTHONPATH=./:./app python benchmarks/micro.py                  # run and print
+    PYTHONPATH=./:./app python benchmarks/micro.py --save-baseline  # store the baseline
+    PYTHONPATH=./:./app python benchmarks/micro.py --check          # fail on regressions
+
+Each benchmark reports the best per-operation time over several repeats,
+which is the figure least disturbed by other load on the machine.
+"""
+import argparse
+import asyncio
+import fnmatch
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+import yaml
+
+from benchmarks.harness import load_results, save_results
+
+DEFAULT_BASELINE = "benchmarks/micro_baseline.json"
+
+# setup(work_dir) -> (callable to time, operations per call)
+Setup = Callable[[Path], Tuple[Callable[[], Any], int]]
+BENCHMARKS: Dict[str, Setup] = {}
+
+
+def benchmark(name: str) -> Callable[[Setup], Setup]:
+    def decorator(setup: Setup) -> Setup:
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def write_agent_config(work_dir: Path, databases: int, vars_per_database: int) -> str:
+    from app.core.crypto import Crypto
+
+    config = {
+        "python": {"env": sys.prefix},
+        "output": {"directory": str(work_dir / "output")},
+        "secrets": {"access": Crypto.generate_random_string(32)},
+        "admin": {"public_key": Crypto.create_key_pair("benchmark").public_key_b64},
+        "databases": [
+            {
+                "name": f"db{d}",
+                "vars": [{f"db{d}_var{v}": f"value-{d}-{v}"} for v in range(vars_per_database)],
+            }
+            for d in range(databases)
+        ],
+    }
+    path = work_dir / "config.yaml"
+    path.write_text(yaml.safe_dump(config), encoding="utf-8")
+    return str(path)
+
+
+@benchmark("executor.configure_script")
+def bench_configure_script(work_dir: Path):
+    from app.core.settings import AgentConfig
+    from app.service.executor import ExecutorService
+
+    executor = ExecutorService(AgentConfig(CONFIG_PATH=write_agent_config(work_dir, databases=50, vars_per_database=8)))
+    # ~200KB script referencing a fraction of the variables
+    lines = [f'conn_{i} = "{{{{db{i % 50}_var{i % 8}}}}}"  # padding {"x" * 40}' for i in range(2000)]
+    lines.append('open("{{output_file}}", "w").write("[]")')
+    script = "\n".join(lines)
+    return (lambda: executor.configure_script(script, "/tmp/output.json")), 1
+
+
+@benchmark("dependencies.get_auth_access")
+def bench_get_auth_access(work_dir: Path):
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from app.core.dependencies import get_auth_access
+    from app.core.settings import AgentConfig, AuthSettings
+    from app.routers.v1.auth import create_token
+
+    config_path = write_agent_config(work_dir, databases=10, vars_per_database=4)
+    secret = yaml.safe_load(Path(config_path).read_text())["secrets"]["access"]
+    settings = AuthSettings()
+    credentials = HTTPAuthorizationCredentials(
+        scheme="Bearer",
+        credentials=create_token(secret=secret, algorithm=settings.ALGORITHM, expires_delta=timedelta(hours=1)),
+    )
+    agent_config = AgentConfig(CONFIG_PATH=config_path)
+    loop = asyncio.new_event_loop()
+
+    def _call() -> None:
+        loop.run_until_complete(get_auth_access(token=credentials, settings=settings, agent_config=agent_config))
+
+    return _call, 1
+
+
+@benchmark("crypto.create_token")
+def bench_create_token(work_dir: Path):
+    from app.core.crypto import Crypto
+
+    key_pair = Crypto.create_key_pair("benchmark")
+    return (lambda: Crypto.create_token(key_pair.private_key_pem, subject="benchmark")), 1
+
+
+@benchmark("crypto.validate_token")
+def bench_validate_token(work_dir: Path):
+    from app.core.crypto import Crypto
+
+    key_pair = Crypto.create_key_pair("benchmark")
+    token = Crypto.create_token(key_pair.private_key_pem, subject="benchmark")
+    return (lambda: Crypto.validate_token(token, key_pair.public_key_b64)), 1
+
+
+def make_agent_job(work_dir: Path):
+    from app.core.agent_job import AgentJob
+    from app.core.job_store import FilesystemJobStore
+
+    # No writer thread started: statuses are written inline, as the worst case
+    return AgentJob(store=FilesystemJobStore(root=str(work_dir / "jobs"), chunk_size=1024 * 1024), id="benchmark")
+
+
+@benchmark("agent_job.set_status")
+def bench_set_status(work_dir: Path):
+    from app.schemas.agent import StatusSchema
+
+    job = make_agent_job(work_dir)
+    status = StatusSchema(time_submitted=datetime.now(), time_started=datetime.now(), script_hash="0" * 16)
+    loop = asyncio.new_event_loop()
+    return (lambda: loop.run_until_complete(job.set_status(status))), 1
+
+
+@benchmark("agent_job.get_status")
+def bench_get_status(work_dir: Path):
+    from app.schemas.agent import StatusSchema
+
+    job = make_agent_job(work_dir)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(
+        job.set_status(StatusSchema(time_submitted=datetime.now(), time_started=datetime.now(), script_hash="0" * 16))
+    )
+    return (lambda: loop.run_until_complete(job.get_status())), 1
+
+
+@benchmark("job_store.open_artifact")
+def bench_open_artifact(work_dir: Path):
+    job = make_agent_job(work_dir)
+    loop = asyncio.new_event_loop()
+    # 8MB data.json streamed in 1MB chunks
+    loop.run_until_complete(job.set_data("[" + ",".join(['{"value": 1234567890}'] * 380_000) + "]"))
+
+    async def _read() -> int:
+        artifact = await job.open_artifact("data.json")
+        return sum([len(chunk) async for chunk in artifact.chunks])
+
+    return (lambda: loop.run_until_complete(_read())), 1
+
+
+@benchmark("bedrock.format_retrieval_response")
+def bench_format_retrieval_response(work_dir: Path):
+    from app.clients.bedrock import BedrockClient
+
+    # format_retrieval_response uses no client state, so skip building the AWS clients
+    client = BedrockClient.__new__(BedrockClient)
+    response = {
+        "retrievalResults": [
+            {"content": {"text": f"CREATE TABLE t{i} (id bigint primary key, name text, value numeric);" * 4}}
+            for i in range(500)
+        ]
+    }
+    return (lambda: client.format_retrieval_response(response, "schema")), 1
+
+
+@benchmark("task_pool.throughput")
+def bench_task_pool(work_dir: Path):
+    from app.core.task_pool import AsyncTaskPool
+
+    tasks = 1000
+    loop = asyncio.new_event_loop()
+
+    async def _noop() -> None:
+        return None
+
+    async def _run() -> None:
+        pool = AsyncTaskPool(4)
+        await asyncio.gather(*(pool.add_task(_noop) for _ in range(tasks)))
+        await pool.aclose()
+
+    return (lambda: loop.run_until_complete(_run())), tasks
+
+
+def measure(fn: Callable[[], Any], ops: int, repeat: int, min_time: float) -> Dict[str, Any]:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    # autorange targets 0.2s; scale up for noisier, faster functions
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return {"ns_per_op": round(best / number / ops * 1e9, 1), "calls": number, "repeat": repeat}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, float]:
+    """Benchmarks slower than the baseline by more than `threshold` (fraction), with their ratio."""
+    regressions = {}
+    for name, result in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = result["ns_per_op"] / base["ns_per_op"]
+        if ratio > 1 + threshold:
+            regressions[name] = round(ratio, 2)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", "--filter", default="*", help="Glob over benchmark names")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per repeat")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero when a benchmark regressed")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown as a fraction")
+    parser.add_argument("--output", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    baseline = {}
+    if Path(args.baseline).exists():
+        baseline = load_results(args.baseline).get("benchmarks", {})
+
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="highkick-micro-") as tmp:
+        for name, setup in BENCHMARKS.items():
+            if not fnmatch.fnmatch(name, args.filter):
+                continue
+            work_dir = Path(tmp) / name
+            work_dir.mkdir()
+            fn, ops = setup(work_dir)
+            results[name] = measure(fn, ops, args.repeat, args.min_time)
+
+            base = baseline.get(name)
+            delta = f"{results[name]['ns_per_op'] / base['ns_per_op'] - 1:+7.1%}" if base else ""
+            print(f"{name:<36} {results[name]['ns_per_op']:>14,.1f} ns/op  {delta}")
+
+    payload = {"benchmarks": results, "python": sys.version.split()[0]}
+    if args.output:
+        save_results(payload, args.output)
+    if args.save_baseline:
+        save_results(payload, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if args.check:
+        if not baseline:
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            return 1
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions.items():
+            print(f"REGRESSION {name}: {ratio}x baseline (threshold {1 + args.threshold:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
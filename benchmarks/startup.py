@@ -0,0 +1,135 @@
+"""
+Startup-time report and budget check for the agent process.
+
+    PYTHONPATH=./ python benchmarks/startup.py                   # report
+    PYTHONPATH=./ python benchmarks/startup.py --budget 2.5      # fail above 2.5s to /health
+    PYTHONPATH=./ python benchmarks/startup.py --baseline benchmarks/results/startup.json
+
+- Import time of `app.setup`, per module, from `python -X importtime`.
+- Modules that must stay lazy (AWS SDK, crypto, ORM) are reported if
+  importing the app loads them.
+- Cold start: wall time from spawning uvicorn until /health answers 200,
+  best of several runs.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.harness import REPO_ROOT, app_env, load_results, run_agent, save_results
+
+# Loaded on first use only; importing app.setup must not pull these in
+LAZY_MODULES = (
+    "boto3",
+    "aioboto3",
+    "aiobotocore",
+    "botocore",
+    "passlib",
+    "bcrypt",
+    "cryptography",
+    "jwt",
+    "sqlalchemy",
+    "asyncpg",
+)
+
+
+def import_times(config_path: str) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Total import seconds and (module, self us, cumulative us) for `import app.setup`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.setup"],
+        cwd=REPO_ROOT,
+        env=app_env(config_path),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports keep their indentation
+        modules.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return sum(m[1] for m in modules) / 1e6, modules
+
+
+def loaded_lazy_modules(config_path: str) -> List[str]:
+    script = "import sys, json, app.setup; print(json.dumps(sorted(sys.modules)))"
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=REPO_ROOT,
+        env=app_env(config_path),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    loaded = set(json.loads(output.strip().splitlines()[-1]))
+    return [name for name in LAZY_MODULES if name in loaded]
+
+
+def cold_start_seconds(runs: int) -> List[float]:
+    times = []
+    for _ in range(runs):
+        with run_agent() as agent:
+            times.append(agent.startup_seconds)
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to measure")
+    parser.add_argument("--top", type=int, default=20, help="Slowest modules to list")
+    parser.add_argument("--budget", type=float, help="Maximum cold start to /health in seconds")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown as a fraction")
+    parser.add_argument("--output", default="benchmarks/results/startup.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="highkick-startup-") as tmp:
+        # Importing the app does not read the agent config; any path will do
+        config_path = str(Path(tmp) / "config.yaml")
+        import_seconds, modules = import_times(config_path)
+        lazy_loaded = loaded_lazy_modules(config_path)
+
+    # Top-level imports by cumulative time
+    top_level = sorted((m for m in modules if not m[0].startswith(" ")), key=lambda m: m[2], reverse=True)
+    print(f"import app.setup: {import_seconds:.3f}s over {len(modules)} modules")
+    for name, _, cumulative_us in top_level[:args.top]:
+        print(f"  {cumulative_us / 1000:>9.1f} ms  {name}")
+
+    times = cold_start_seconds(args.runs)
+    best = min(times)
+    print(f"cold start to /health: best {best:.3f}s, worst {max(times):.3f}s over {len(times)} runs")
+
+    results: Dict[str, Any] = {
+        "import_seconds": round(import_seconds, 4),
+        "cold_start_seconds": round(best, 4),
+        "cold_start_runs": [round(t, 4) for t in times],
+        "lazy_modules_loaded": lazy_loaded,
+        "slowest_imports": [
+            {"module": name.strip(), "cumulative_ms": round(cumulative_us / 1000, 1)}
+            for name, _, cumulative_us in top_level[:args.top]
+        ],
+    }
+    save_results(results, args.output)
+    print(f"Results written to {args.output}")
+
+    failures = []
+    if lazy_loaded:
+        failures.append(f"importing app.setup loaded {', '.join(lazy_loaded)}")
+    if args.budget is not None and best > args.budget:
+        failures.append(f"cold start {best:.3f}s exceeds the {args.budget:.3f}s budget")
+    if args.baseline:
+        base = load_results(args.baseline).get("cold_start_seconds")
+        if base and best > base * (1 + args.threshold):
+            failures.append(f"cold start {best:.3f}s regressed from {base:.3f}s")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import asyncio
+from datetime import datetime
+
+from app.schemas.agent import StatusSchema
+from app.service import dashboard_scheduler
+from app.service.dashboard_scheduler import DashboardRefreshScheduler
+
+
+class StuckJob:
+    """A job whose runner went away: its status says running forever."""
+    def __init__(self):
+        self.polls = 0
+
+    async def get_status(self):
+        self.polls += 1
+        return StatusSchema(time_submitted=datetime.now(), time_started=datetime.now())
+
+
+def test_wait_for_a_stuck_job_gives_up(monkeypatch):
+    monkeypatch.setattr(dashboard_scheduler, "COMPLETION_POLL_SECONDS", 0.01)
+    job = StuckJob()
+    assert asyncio.run(DashboardRefreshScheduler._wait_for(job, timeout=0.1)) is None
+    assert job.polls > 1
+
+
+def test_wait_for_returns_the_final_status():
+    class DoneJob:
+        async def get_status(self):
+            return StatusSchema(time_completed=datetime.now())
+
+    assert asyncio.run(DashboardRefreshScheduler._wait_for(DoneJob(), timeout=10)).time_completed is not None
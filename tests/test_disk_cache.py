@@ -0,0 +1,40 @@
+import os
+
+from app.core.disk_cache import DiskLRUCache
+
+# Each entry below takes 3 bytes of metadata ("{}\n") plus a 10-byte value
+VALUE = b"0123456789"
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=30)
+    cache.set("a", VALUE)
+    cache.set("b", VALUE)
+    assert cache.get("a") == (VALUE, {})
+    cache.set("c", VALUE)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_and_recency_survive_a_restart(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=100)
+    cache.set("a", VALUE)
+    cache.set("b", VALUE)
+    # "a" was read last; recency is kept in the file mtime
+    os.utime(cache._path(cache._digest("b")), (1, 1))
+
+    reopened = DiskLRUCache(str(tmp_path), max_bytes=13)
+    assert reopened.get("a") == (VALUE, {})
+    assert reopened.get("b") is None
+
+
+def test_oversized_value_replaces_nothing(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=20)
+    cache.set("a", VALUE)
+    cache.set("a", VALUE * 3)
+
+    # The stale value of the key is dropped; nothing else is flushed
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 0
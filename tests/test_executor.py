@@ -0,0 +1,60 @@
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from app.service.executor import ScriptCancelledError, communicate_and_reap
+
+
+def popen(code):
+    return subprocess.Popen(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    )
+
+
+def test_output_exit_code_and_usage():
+    with popen("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)") as process:
+        stdout, stderr, rusage = communicate_and_reap(process, timeout=10)
+    assert (stdout, stderr, process.returncode) == ("out\n", "err\n", 3)
+    assert rusage.ru_maxrss > 0
+
+
+def test_timeout_kills_the_script():
+    started = time.monotonic()
+    with popen("import time; time.sleep(30)") as process:
+        with pytest.raises(subprocess.TimeoutExpired):
+            communicate_and_reap(process, timeout=0.5)
+    assert process.returncode < 0
+    assert time.monotonic() - started < 5
+
+
+def test_background_child_holding_the_pipes_does_not_hang():
+    # The script exits at once, but the process it started keeps stdout open
+    code = (
+        "import subprocess, sys; "
+        "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); print('done')"
+    )
+    started = time.monotonic()
+    with popen(code) as process:
+        stdout, _, _ = communicate_and_reap(process, timeout=10)
+    assert stdout == "done\n"
+    assert process.returncode == 0
+    assert time.monotonic() - started < 5
+
+
+def test_cancel_kills_the_script():
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    started = time.monotonic()
+    with popen("import time; time.sleep(30)") as process:
+        with pytest.raises(ScriptCancelledError):
+            communicate_and_reap(process, timeout=10, cancel=cancel)
+    assert process.returncode == -signal.SIGKILL
+    assert time.monotonic() - started < 5
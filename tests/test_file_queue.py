@@ -0,0 +1,102 @@
+import os
+import time
+
+import pytest
+
+from app.core.file_queue import LeasedFileJobQueue
+
+LEASE_SECONDS = 30
+
+
+@pytest.fixture
+def shared_dir(tmp_path):
+    return tmp_path / "queue"
+
+
+def node(shared_dir, tmp_path, name):
+    return LeasedFileJobQueue(
+        str(shared_dir), slots=1, slots_directory=str(tmp_path / name / "slots"), lease_seconds=LEASE_SECONDS
+    )
+
+
+def expire(queue):
+    expired = time.time() - 2 * LEASE_SECONDS
+    for name in os.listdir(queue.directory / "claimed"):
+        os.utime(queue.directory / "claimed" / name, (expired, expired))
+
+
+def test_claim_heartbeat_complete(shared_dir, tmp_path):
+    queue = node(shared_dir, tmp_path, "a")
+    queue.enqueue("job-1", {"script": "print(1)"})
+
+    entry = queue.claim()
+    assert entry.job_id == "job-1"
+    assert entry.payload == {"script": "print(1)"}
+    assert queue.claim() is None
+    assert queue.heartbeat(entry)
+    assert queue.recover() == 0
+
+    queue.complete(entry)
+    assert queue.claimed_count() == 0
+    assert not queue.heartbeat(entry)
+
+
+def test_expired_lease_is_taken_over(shared_dir, tmp_path):
+    first, second = node(shared_dir, tmp_path, "a"), node(shared_dir, tmp_path, "b")
+    first.enqueue("job-1", {"script": "print(1)"})
+    stale = first.claim()
+
+    expire(first)
+    assert second.recover() == 1
+    assert second.pending_count() == 1
+    owner = second.claim()
+    assert owner.job_id == "job-1"
+    assert owner.rank_ns == stale.rank_ns
+
+    # The old owner finds out at its next heartbeat, and cannot end the new claim
+    assert not first.heartbeat(stale)
+    first.complete(stale)
+    assert second.claimed_count() == 1
+    assert second.heartbeat(owner)
+
+    second.complete(owner)
+    assert second.claimed_count() == 0
+
+
+def test_recover_keeps_place_in_line(shared_dir, tmp_path):
+    queue = node(shared_dir, tmp_path, "a")
+    queue.enqueue("job-1", {})
+    queue.claim()
+    queue.enqueue("job-2", {})
+
+    expire(queue)
+    assert queue.recover() == 1
+    assert [queue.claim().job_id, queue.claim().job_id] == ["job-1", "job-2"]
+
+
+def test_claims_follow_rank(shared_dir, tmp_path):
+    queue = node(shared_dir, tmp_path, "a")
+    now = time.time_ns()
+    queue.enqueue("batch", {}, rank_ns=now + 10**9)
+    queue.enqueue("interactive", {}, rank_ns=now + 10**9 // 8)
+    queue.enqueue("fifo", {})
+
+    assert [queue.claim().job_id for _ in range(3)] == ["fifo", "interactive", "batch"]
+
+
+def test_slot_count_and_busy_slots_are_per_host(shared_dir, tmp_path):
+    worker = node(shared_dir, tmp_path, "a")
+    other_worker = LeasedFileJobQueue(
+        str(shared_dir), slots=1, slots_directory=str(tmp_path / "a" / "slots"), lease_seconds=LEASE_SECONDS
+    )
+    other_host = node(shared_dir, tmp_path, "b")
+
+    worker.slots = 2
+    assert other_worker.slots == 2
+    assert other_host.slots == 1
+
+    slot = other_worker.acquire_slot()
+    assert other_host.acquire_slot() is not None
+    assert worker.busy_slots() == 1
+    slot.release()
+    assert worker.busy_slots() == 0
@@ -0,0 +1,61 @@
+import threading
+from datetime import datetime
+
+from app.core import job_registry
+from app.core.job_registry import JobRegistry
+from app.schemas.agent import StatusSchema
+
+
+class FlakyDisk:
+    """Fails the first `failures` writes, like a full disk that gets cleaned up."""
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.written = {}
+        self.done = threading.Event()
+
+    def persist(self, key: str, content: str) -> None:
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("No space left on device")
+        self.written[key] = content
+        self.done.set()
+
+
+def test_failed_write_is_retried(monkeypatch):
+    monkeypatch.setattr(job_registry, "RETRY_SECONDS", 0.01)
+    disk = FlakyDisk(failures=2)
+    registry = JobRegistry(disk.persist)
+    registry.start()
+    try:
+        registry.set("job-1", StatusSchema(time_submitted=datetime.now()))
+        assert disk.done.wait(5)
+    finally:
+        registry.stop()
+    assert StatusSchema.model_validate_json(disk.written["job-1"]).time_submitted is not None
+
+
+def test_newer_status_replaces_a_failed_write(monkeypatch):
+    monkeypatch.setattr(job_registry, "RETRY_SECONDS", 0.01)
+    written = []
+    first_failed = threading.Event()
+    retry = threading.Event()
+
+    def persist(key: str, content: str) -> None:
+        status = StatusSchema.model_validate_json(content)
+        if status.time_completed is None and not first_failed.is_set():
+            first_failed.set()
+            # Hold the writer until the newer status is queued
+            retry.wait(5)
+            raise OSError("No space left on device")
+        written.append(status)
+
+    registry = JobRegistry(persist)
+    registry.start()
+    try:
+        registry.set("job-1", StatusSchema(time_submitted=datetime.now()))
+        assert first_failed.wait(5)
+        registry.set("job-1", StatusSchema(time_submitted=datetime.now(), time_completed=datetime.now()))
+        retry.set()
+    finally:
+        registry.stop()
+    assert [status.time_completed is not None for status in written] == [True]
@@ -0,0 +1,33 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.core.agent_job import AgentJob
+from app.core.job_store import FilesystemJobStore
+from app.schemas.agent import StatusSchema
+from app.service.job_runner import run_job
+
+
+class BrokenExecutor:
+    def configure_script(self, script, output_file_path):
+        return {"script": script, "output_file": output_file_path}
+
+    def execute_script(self, **kwargs):
+        raise OSError("No such file or directory: 'python'")
+
+
+def test_failed_run_completes_the_job_with_an_error(tmp_path):
+    job = AgentJob(store=FilesystemJobStore(str(tmp_path), chunk_size=1024), id="job-1")
+
+    async def scenario():
+        await job.set_status(StatusSchema(time_submitted=datetime.now()))
+        with pytest.raises(OSError):
+            await run_job(job=job, executor=BrokenExecutor(), script="print(1)")
+        return await job.get_status(), await job.get_error()
+
+    status, error = asyncio.run(scenario())
+    assert status.error
+    assert status.time_completed is not None
+    assert status.run_seconds is not None
+    assert error == "OSError: No such file or directory: 'python'"
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.core.agent_job import AgentJob
+from app.core.file_queue import LeasedFileJobQueue
+from app.core.job_store import FilesystemJobStore
+from app.core.settings import AgentConfig, SchedulerSettings
+from app.schemas.agent import StatusSchema
+from app.service.executor import ExecutorService
+from app.service.job_scheduler import SharedJobScheduler
+
+
+def make_executor(tmp_path):
+    config = tmp_path / "config.yaml"
+    config.write_text(
+        f"python:\n  env: {sys.prefix}\noutput:\n  directory: {tmp_path / 'output'}\ndatabases: []\n",
+        encoding="utf-8",
+    )
+    return ExecutorService(agent_config=AgentConfig(CONFIG_PATH=str(config)))
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+async def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.05)
+
+
+def test_lost_lease_kills_the_script_before_freeing_the_slot(tmp_path):
+    queue = LeasedFileJobQueue(
+        str(tmp_path / "queue"), slots=1, slots_directory=str(tmp_path / "slots"), lease_seconds=0.3
+    )
+    store = FilesystemJobStore(str(tmp_path / "output"), chunk_size=1024)
+    scheduler = SharedJobScheduler(
+        queue=queue,
+        executor=make_executor(tmp_path),
+        store=store,
+        settings=SchedulerSettings(POLL_INTERVAL_SECONDS=0.05),
+        app=SimpleNamespace(state=SimpleNamespace()),
+    )
+    pid_file = tmp_path / "script.pid"
+    script = f"import os, time\nopen({str(pid_file)!r}, 'w').write(str(os.getpid()))\ntime.sleep(60)\n"
+
+    async def scenario():
+        job = AgentJob(store=store, id="job-1")
+        await job.set_status(StatusSchema(time_submitted=datetime.now()))
+        await scheduler.submit(job=job, executor=make_executor(tmp_path), script=script)
+        scheduler.start()
+        try:
+            await wait_until(lambda: pid_file.exists() and pid_file.read_text())
+            pid = int(pid_file.read_text())
+
+            # Another node takes the job over: the claim gets its token
+            claimed = queue.directory / "claimed"
+            (name,) = os.listdir(claimed)
+            os.rename(claimed / name, claimed / f"{name.rpartition('.')[0]}.othernode")
+
+            await wait_until(lambda: not alive(pid))
+            await wait_until(lambda: not scheduler._running)
+            slot = queue.acquire_slot()
+            assert slot is not None
+            slot.release()
+            # The new owner's claim is left alone, and the job is not completed here
+            assert queue.claimed_count() == 1
+            assert (await job.get_status()).time_completed is None
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,25 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.core.job_index import JobIndex
+from app.core.job_store import FilesystemJobStore
+from app.schemas.agent import StatusSchema
+
+
+@pytest.mark.parametrize("index_per_node, indexed", [(False, 1), (True, 0)])
+def test_handed_over_job_leaves_a_node_local_index(tmp_path, index_per_node, indexed):
+    index = JobIndex(str(tmp_path / "jobs.sqlite3"))
+    store = FilesystemJobStore(str(tmp_path / "output"), chunk_size=1024, index=index)
+    store.index_per_node = index_per_node
+
+    async def scenario():
+        await store.set_status("job-1", StatusSchema(time_submitted=datetime.now()))
+        # What SharedJobScheduler.submit does before queueing the job
+        await store.forget("job-1")
+
+    asyncio.run(scenario())
+    assert store.index.totals() == (indexed, 0)
+    # The status itself stays readable from the shared job tree
+    assert asyncio.run(store.get_status("job-1")).time_submitted is not None
@@ -0,0 +1,48 @@
+import os
+import time
+
+from app.core.leader import HostLock, Leadership, SharedLease
+
+
+def test_host_lock_is_held_by_one_holder(tmp_path):
+    first, second = HostLock(str(tmp_path / "a.lock")), HostLock(str(tmp_path / "a.lock"))
+    assert first.try_acquire()
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_expired_shared_lease_is_taken_over(tmp_path):
+    path = str(tmp_path / "shared" / "leader.lease")
+    first, second = SharedLease(path, lease_seconds=30), SharedLease(path, lease_seconds=30)
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert first.try_acquire()
+
+    expired = time.time() - 60
+    os.utime(path, (expired, expired))
+    assert second.try_acquire()
+    # The old holder finds out at its next renewal and cannot release the new lease
+    assert not first.try_acquire()
+    first.release()
+    assert second.try_acquire()
+
+
+def test_leadership_lets_go_of_everything_on_a_miss(tmp_path):
+    lease_path = str(tmp_path / "leader.lease")
+    other_node = SharedLease(lease_path, lease_seconds=30)
+    assert other_node.try_acquire()
+
+    host_lock = HostLock(str(tmp_path / "host.lock"))
+    leadership = Leadership([host_lock, SharedLease(lease_path, lease_seconds=30)])
+    assert not leadership.try_acquire()
+    # Another worker of this host may try next
+    other_worker = HostLock(str(tmp_path / "host.lock"))
+    assert other_worker.try_acquire()
+    other_worker.release()
+
+    other_node.release()
+    assert leadership.try_acquire()
+    leadership.release()
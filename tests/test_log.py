@@ -0,0 +1,40 @@
+import logging
+
+import pytest
+
+from app.core.log import REDACTED, SECRET_KEY_PATTERN, RedactionFilter
+
+
+@pytest.mark.parametrize("key", [
+    "password", "db_passwd", "DB_PASSWORD", "secret", "aws_secret_key", "secret-key", "token", "access_token",
+    "private_key", "credentials", "api_key", "apikey", "ACCESS_KEY",
+])
+def test_secret_keys_match(key):
+    assert SECRET_KEY_PATTERN.search(key)
+
+
+@pytest.mark.parametrize("key", [
+    "input_tokens", "passed", "bypass", "tokenizer", "secretary", "key", "access_key_id", "credential_source",
+])
+def test_other_keys_do_not_match(key):
+    assert not SECRET_KEY_PATTERN.search(key)
+
+
+def test_filter_masks_secret_fields_and_values():
+    redaction = RedactionFilter()
+    redaction.add_secrets(["hunter2-password", "abc"])
+    record = logging.makeLogRecord({
+        "msg": "connecting with %s",
+        "args": ("hunter2-password",),
+        "api_key": "sk-123",
+        "config": {"user": "agent", "db": {"password": "x", "host": "db"}},
+        "input_tokens": 12,
+    })
+
+    assert redaction.filter(record)
+    assert record.getMessage() == f"connecting with {REDACTED}"
+    assert record.api_key == REDACTED
+    assert record.config == {"user": "agent", "db": {"password": REDACTED, "host": "db"}}
+    assert record.input_tokens == 12
+    # Too short to be masked inside other text
+    assert redaction.redact("abcdef") == "abcdef"
@@ -0,0 +1,26 @@
+import gc
+import threading
+
+from app.core.metrics import Counter, Histogram
+
+
+def test_shards_of_finished_threads_are_folded_into_the_totals():
+    counter = Counter("test_counter_total", "Test counter", ["kind"])
+    histogram = Histogram("test_duration_seconds", "Test histogram", buckets=(1.0,))
+
+    def record():
+        counter.inc(kind="a")
+        histogram.observe(0.5)
+
+    for _ in range(20):
+        thread = threading.Thread(target=record)
+        thread.start()
+        thread.join()
+    gc.collect()
+    counter.inc(kind="a")
+
+    # The base shard and the shard of the running thread
+    assert len(counter._shards) == 2
+    assert len(histogram._shards) == 1
+    assert counter.value(kind="a") == 21
+    assert 'test_duration_seconds_bucket{le="1"} 20' in histogram.render()
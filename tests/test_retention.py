@@ -0,0 +1,61 @@
+import asyncio
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from app.core.exceptions import StorageFullException
+from app.core.job_index import JobIndex
+from app.core.job_store import FilesystemJobStore
+from app.core.settings import RetentionSettings
+from app.schemas.agent import StatusSchema
+from app.service import retention
+from app.service.retention import RetentionEngine
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+def make_engine(tmp_path, **settings):
+    index = JobIndex(str(tmp_path / "jobs.sqlite3"))
+    store = FilesystemJobStore(str(tmp_path / "output"), chunk_size=1024, index=index)
+    settings = RetentionSettings(LOCK_FILE=str(tmp_path / "retention.lock"), **settings)
+    return store, RetentionEngine(store, settings, str(tmp_path / "output"))
+
+
+def finish_job(store, job_id, days_ago):
+    completed = datetime.now() - timedelta(days=days_ago)
+    status = StatusSchema(time_submitted=completed, time_started=completed, time_completed=completed)
+    asyncio.run(store.set_status(job_id, status))
+
+
+def test_nothing_is_evicted_unless_enabled(tmp_path):
+    store, engine = make_engine(tmp_path, MAX_AGE_SECONDS=60, INTERVAL_SECONDS=0.01)
+    finish_job(store, "old", days_ago=30)
+
+    async def scenario():
+        engine.start()
+        await asyncio.sleep(0.1)
+        await engine.stop()
+
+    asyncio.run(scenario())
+    assert store.index.totals()[0] == 1
+
+    store, engine = make_engine(tmp_path, ENABLED=True, MAX_AGE_SECONDS=60, INTERVAL_SECONDS=0.01)
+    asyncio.run(scenario())
+    assert store.index.totals()[0] == 0
+
+
+def test_submissions_are_refused_only_above_the_reject_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention.shutil, "disk_usage", lambda path: DiskUsage(total=100, used=97, free=3))
+    _, default = make_engine(tmp_path)
+    _, rejecting = make_engine(tmp_path, REJECT_DISK_USAGE=0.95)
+
+    async def measure():
+        await default.measure_disk_usage()
+        await rejecting.measure_disk_usage()
+
+    asyncio.run(measure())
+    assert not default.over_quota()
+    assert rejecting.over_quota()
+
+    error = StorageFullException(retry_after=rejecting.retry_after_seconds)
+    assert error.status_code == 507
+    assert error.headers == {"Retry-After": "60"}
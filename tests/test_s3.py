@@ -0,0 +1,97 @@
+import asyncio
+
+from botocore.exceptions import ClientError
+
+from app.clients.s3 import S3Client
+from app.clients.s3_cache import S3ObjectCache
+from app.core.disk_cache import DiskLRUCache
+from app.core.settings import S3Settings
+
+CHUNK_SIZE = 1024
+
+
+class FailingMultipartBoto:
+    """Part 1 fails at once; the other parts would take a while to upload."""
+    def __init__(self):
+        self.calls = []
+        self.parts_in_flight = 0
+
+    async def create_multipart_upload(self, **kwargs):
+        self.calls.append("create")
+        return {"UploadId": "upload-1"}
+
+    async def upload_part(self, PartNumber, **kwargs):
+        if PartNumber == 1:
+            raise RuntimeError("part 1 failed")
+        self.parts_in_flight += 1
+        try:
+            await asyncio.sleep(10)
+        finally:
+            self.parts_in_flight -= 1
+        return {"ETag": f'"{PartNumber}"'}
+
+    async def abort_multipart_upload(self, **kwargs):
+        self.calls.append(("abort", self.parts_in_flight))
+
+
+def test_failed_part_cancels_the_others_before_the_abort(tmp_path):
+    path = tmp_path / "artifact.bin"
+    path.write_bytes(b"x" * CHUNK_SIZE * 4)
+    boto = FailingMultipartBoto()
+    settings = S3Settings(S3_MULTIPART_THRESHOLD=CHUNK_SIZE, S3_MULTIPART_CHUNK_SIZE=CHUNK_SIZE)
+    client = S3Client(boto, settings)
+
+    result = asyncio.run(asyncio.wait_for(client.upload_file("jobs/job-1/artifact.bin", str(path)), 5))
+
+    assert not result.success
+    assert "part 1 failed" in result.error
+    assert boto.calls == ["create", ("abort", 0)]
+
+
+class Body:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self):
+        return self._data
+
+
+class VersionedBoto:
+    """get_object with ETag conditions, like S3."""
+    def __init__(self):
+        self.data, self.etag = b"v1", '"1"'
+        self.requests = []
+
+    async def get_object(self, Key, IfNoneMatch=None, **kwargs):
+        self.requests.append(IfNoneMatch)
+        if IfNoneMatch == self.etag:
+            raise ClientError({"Error": {"Code": "304"}, "ResponseMetadata": {"HTTPStatusCode": 304}}, "GetObject")
+        return {"Body": Body(self.data), "ETag": self.etag}
+
+
+def test_cached_object_is_revalidated_by_etag(tmp_path):
+    boto = VersionedBoto()
+    cache = S3ObjectCache(DiskLRUCache(str(tmp_path), max_bytes=1024), memory_max_bytes=1024, freshness_seconds=0)
+    client = S3Client(boto, S3Settings(), cache=cache)
+
+    async def scenario():
+        first = await client.get_text("dashboards/a/b/data.json")
+        unchanged = await client.get_text("dashboards/a/b/data.json")
+        boto.data, boto.etag = b"v2", '"2"'
+        changed = await client.get_text("dashboards/a/b/data.json")
+        return first, unchanged, changed
+
+    assert asyncio.run(scenario()) == ("v1", "v1", "v2")
+    assert boto.requests == [None, '"1"', '"1"']
+    # Another process starts from the disk tier and still revalidates
+    reopened = S3ObjectCache(
+        DiskLRUCache(str(tmp_path), max_bytes=1024), memory_max_bytes=1024, freshness_seconds=60
+    )
+    assert asyncio.run(S3Client(boto, S3Settings(), cache=reopened).get_text("dashboards/a/b/data.json")) == "v2"
+    assert boto.requests[-1] == '"2"'
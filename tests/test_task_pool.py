@@ -0,0 +1,76 @@
+import asyncio
+
+from app.core.task_pool import AsyncTaskPool, FairQueue, Flow, QueuedTask
+
+BATCH = Flow(priority="batch")
+INTERACTIVE = Flow(priority="interactive")
+
+
+def queued(flow, key):
+    return QueuedTask(
+        fn=None, args=(), kwargs={}, future=None, enqueued_at=0.0, enqueued_ns=0, span_context=None, flow=flow, key=key
+    )
+
+
+def test_fair_queue_serves_flows_by_weight():
+    async def scenario():
+        queue = FairQueue(priority_weights={"interactive": 4.0, "batch": 1.0})
+        for i in range(4):
+            queue.put_nowait(queued(BATCH, f"batch-{i}"))
+        for i in range(4):
+            queue.put_nowait(queued(INTERACTIVE, f"interactive-{i}"))
+        assert queue.position("batch-1") == 5
+        return [queue.get_nowait().key for _ in range(8)]
+
+    order = asyncio.run(scenario())
+    # Interactive tasks get 4 turns per batch turn; each flow keeps its arrival order
+    assert order == [
+        "interactive-0", "interactive-1", "interactive-2", "batch-0",
+        "interactive-3", "batch-1", "batch-2", "batch-3",
+    ]
+
+
+def test_idle_flow_does_not_bank_credit():
+    async def scenario():
+        queue = FairQueue(priority_weights={"interactive": 1.0, "batch": 1.0})
+        for i in range(3):
+            queue.put_nowait(queued(BATCH, f"batch-{i}"))
+        for _ in range(2):
+            queue.get_nowait()
+        # Arrives after batch was served alone; starts from the virtual time, not from 0
+        queue.put_nowait(queued(INTERACTIVE, "interactive-0"))
+        return [queue.get_nowait().key for _ in range(2)]
+
+    assert asyncio.run(scenario()) == ["batch-2", "interactive-0"]
+
+
+def test_resize_changes_how_many_tasks_run_at_once():
+    async def scenario():
+        pool = AsyncTaskPool(1)
+        running = 0
+        peak = []
+        release = asyncio.Event()
+
+        async def task():
+            nonlocal running
+            running += 1
+            peak.append(running)
+            await release.wait()
+            running -= 1
+
+        futures = [pool.add_task(task) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        assert running == 1
+        pool.resize(3)
+        await asyncio.sleep(0.01)
+        assert running == 3
+
+        release.set()
+        await asyncio.gather(*futures)
+        pool.resize(1)
+        await asyncio.sleep(0.01)
+        assert len(pool._workers) == 1
+        await pool.aclose()
+        return max(peak)
+
+    assert asyncio.run(scenario()) == 3